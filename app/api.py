@@ -0,0 +1,30 @@
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from app.utils import metrics, response_cache
+from app.utils.state_size import state_size_report
+
+
+async def get_metrics(request: Request) -> JSONResponse:
+    """Return the process-wide performance counters."""
+    return JSONResponse(metrics.snapshot())
+
+
+async def get_response_cache_stats(request: Request) -> JSONResponse:
+    """Return the model response cache's hit rate, savings and size."""
+    return JSONResponse(response_cache.stats())
+
+
+async def get_state_size(request: Request) -> JSONResponse:
+    """Return the default per-session size of each state."""
+    return JSONResponse(state_size_report())
+
+
+api = Starlette(
+    routes=[
+        Route("/api/metrics", get_metrics),
+        Route("/api/state-size", get_state_size),
+        Route("/api/response-cache", get_response_cache_stats),
+    ]
+)
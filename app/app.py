@@ -1,10 +1,14 @@
 import reflex as rx
+from app.api import api
+from app.utils.llm import client_lifespan
+from app.utils.tokens import encoder_lifespan
 from app.pages.home import home_page
 from app.pages.generator import generator_page
 from app.pages.optimizer import optimizer_page
 from app.pages.settings import settings_page
 
 app = rx.App(
+    api_transformer=api,
     theme=rx.theme(appearance="light", accent_color="teal", radius="large"),
     stylesheets=["/styles.css"],
     head_components=[
@@ -16,6 +20,8 @@ app = rx.App(
         ),
     ],
 )
+app.register_lifespan_task(client_lifespan)
+app.register_lifespan_task(encoder_lifespan)
 app.add_page(home_page, route="/", title="Dashboard | PromptMaster")
 app.add_page(generator_page, route="/generator", title="Generator | PromptMaster")
 app.add_page(optimizer_page, route="/optimizer", title="Optimizer | PromptMaster")
@@ -1,8 +1,6 @@
 import reflex as rx
 from app.states.base import BaseState
-from app.states.history import HistoryState, HistoryItem
-from app.states.generator import GeneratorState
-from app.states.optimizer import OptimizerState
+from app.states.history import HISTORY_ITEM_HEIGHT, HistoryState, HistoryItem
 
 
 def history_item_card(item: HistoryItem) -> rx.Component:
@@ -30,17 +28,27 @@ def history_item_card(item: HistoryItem) -> rx.Component:
             ),
             rx.el.p(item.formatted_date, class_name="text-xs text-gray-600"),
             class_name="flex-1 cursor-pointer",
-            on_click=rx.cond(
-                item.type == "generated",
-                GeneratorState.load_from_history(item.metadata, item.content),
-                OptimizerState.load_from_history(item.metadata, item.content),
-            ),
+            on_click=HistoryState.open_item(item.id),
         ),
         class_name="p-3 rounded-lg bg-[#1A1D24] border border-gray-800 hover:border-gray-700 transition-all group",
     )
 
 
+def history_item_row(item: HistoryItem) -> rx.Component:
+    """Wrap a card in a fixed-height row so the scroll offset maps to an index."""
+    return rx.el.div(
+        history_item_card(item),
+        style={"height": f"{HISTORY_ITEM_HEIGHT}px"},
+        class_name="pb-3 overflow-hidden",
+    )
+
+
 def history_sidebar() -> rx.Component:
+    window_top = HistoryState.history_window_start * HISTORY_ITEM_HEIGHT
+    rendered = HistoryState.visible_history.length()
+    window_bottom = (
+        HistoryState.history_count - HistoryState.history_window_start - rendered
+    ) * HISTORY_ITEM_HEIGHT
     return rx.el.div(
         rx.el.div(
             rx.el.div(
@@ -56,8 +64,14 @@ def history_sidebar() -> rx.Component:
                 rx.cond(
                     HistoryState.has_history,
                     rx.el.div(
-                        rx.foreach(HistoryState.recent_history, history_item_card),
-                        class_name="space-y-3 p-4 overflow-y-auto flex-1 custom-scrollbar",
+                        rx.el.div(style={"height": f"{window_top}px"}),
+                        rx.foreach(HistoryState.visible_history, history_item_row),
+                        rx.el.div(style={"height": f"{window_bottom}px"}),
+                        id="history-list",
+                        on_scroll=HistoryState.scroll_history(
+                            rx.Var("document.getElementById('history-list')?.scrollTop ?? 0")
+                        ).throttle(100),
+                        class_name="p-4 overflow-y-auto flex-1 custom-scrollbar",
                     ),
                     rx.el.div(
                         rx.icon("history", class_name="w-12 h-12 text-gray-800 mb-3"),
@@ -79,6 +93,7 @@ def history_sidebar() -> rx.Component:
                 ),
             ),
             class_name="flex flex-col h-full bg-[#0F1115]",
+            on_mount=HistoryState.load_history_page,
         ),
         class_name=rx.cond(
             BaseState.show_history,
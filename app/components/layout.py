@@ -3,6 +3,7 @@ from app.components.sidebar import sidebar
 from app.components.navbar import navbar
 from app.components.history_sidebar import history_sidebar
 from app.components.shortcuts_modal import shortcuts_modal
+from app.components.search_modal import search_modal
 from app.states.base import BaseState
 import reflex as rx
 
@@ -38,6 +39,7 @@ def layout(content: rx.Component) -> rx.Component:
         sidebar(),
         history_sidebar(),
         shortcuts_modal(),
+        search_modal(),
         rx.el.div(
             navbar(),
             rx.el.main(
@@ -0,0 +1,76 @@
+import reflex as rx
+from app.states.base import BaseState
+from app.states.history import HistoryState, HistoryItem
+
+
+def search_result(item: HistoryItem) -> rx.Component:
+    return rx.el.button(
+        rx.el.div(
+            rx.el.span(
+                item.type,
+                class_name=rx.cond(
+                    item.type == "generated",
+                    "text-[10px] uppercase tracking-wider font-bold text-teal-400 bg-teal-900/30 px-2 py-0.5 rounded",
+                    "text-[10px] uppercase tracking-wider font-bold text-purple-400 bg-purple-900/30 px-2 py-0.5 rounded",
+                ),
+            ),
+            rx.el.span(item.formatted_date, class_name="text-xs text-gray-600"),
+            class_name="flex justify-between items-center mb-1",
+        ),
+        rx.el.p(
+            item.title,
+            class_name="text-sm font-medium text-gray-200 line-clamp-2 leading-snug text-left",
+        ),
+        on_click=HistoryState.open_item(item.id),
+        class_name="w-full p-3 rounded-lg bg-[#1A1D24] border border-gray-800 hover:border-gray-700 transition-all",
+    )
+
+
+def search_modal() -> rx.Component:
+    return rx.cond(
+        BaseState.show_search,
+        rx.el.div(
+            rx.el.div(
+                class_name="absolute inset-0 bg-black/60 backdrop-blur-sm",
+                on_click=BaseState.toggle_search,
+            ),
+            rx.el.div(
+                rx.el.div(
+                    rx.icon("search", class_name="w-5 h-5 text-gray-500"),
+                    rx.debounce_input(
+                        rx.el.input(
+                            value=HistoryState.search_query,
+                            on_change=HistoryState.search_history,
+                            placeholder="Search history...",
+                            auto_focus=True,
+                            class_name="flex-1 bg-transparent text-white placeholder-gray-600 outline-none",
+                        ),
+                        debounce_timeout=150,
+                    ),
+                    rx.el.button(
+                        rx.icon("x", class_name="w-5 h-5"),
+                        on_click=BaseState.toggle_search,
+                        class_name="text-gray-400 hover:text-white",
+                    ),
+                    class_name="flex items-center gap-3 pb-4 border-b border-gray-800",
+                ),
+                rx.cond(
+                    HistoryState.search_results.length() > 0,
+                    rx.el.div(
+                        rx.foreach(HistoryState.search_results, search_result),
+                        class_name="space-y-2 pt-4 max-h-[60vh] overflow-y-auto custom-scrollbar",
+                    ),
+                    rx.el.p(
+                        rx.cond(
+                            HistoryState.search_query == "",
+                            "Search titles, prompts, topics and tones.",
+                            "No matching history",
+                        ),
+                        class_name="text-gray-500 text-sm text-center pt-6 pb-2",
+                    ),
+                ),
+                class_name="relative w-full max-w-lg bg-[#13151A] border border-gray-800 rounded-2xl p-6 shadow-2xl transform transition-all",
+            ),
+            class_name="fixed inset-0 z-50 flex items-start justify-center p-4 pt-[15vh] animate-fade-in",
+        ),
+    )
@@ -1,5 +1,6 @@
 import reflex as rx
 from app.states.base import BaseState, NavItem
+from app.constants import NAV_ITEMS
 
 
 def sidebar_item(item: NavItem) -> rx.Component:
@@ -46,7 +47,7 @@ def sidebar() -> rx.Component:
             class_name="h-16 flex items-center border-b border-gray-800 mb-6",
         ),
         rx.el.nav(
-            rx.foreach(BaseState.nav_items, sidebar_item),
+            *[sidebar_item(item) for item in NAV_ITEMS],
             class_name="flex-1 overflow-y-auto space-y-1",
         ),
         rx.el.div(
@@ -0,0 +1,120 @@
+import reflex as rx
+from reflex.experimental.client_state import ClientStateVar
+from reflex.vars import VarData
+
+COUNT_INPUT_JS = """(e) => {
+    const counts = (window.__textSyncEvents ??= {});
+    counts[%(field)s] = (counts[%(field)s] ?? 0) + 1;%(draft)s
+}"""
+
+# Record what was typed, and the server value it was typed over.
+DRAFT_JS = """
+    %(set_draft)s([%(server)s, e.target.value]);"""
+
+# The typed value wins while the server holds the value it was typed over,
+# or one of the values synced since; any other server value replaced it.
+LIVE_JS = """((field, server, draft) => (
+    draft[0] === server || (window.__textSync?.[field] ?? []).includes(server) ? draft[1] : server
+))(%(field)s, %(server)s, %(draft)s)"""
+
+PATCH_JS = """((field, server, value) => {
+    const sync = (window.__textSync ??= {});
+    const counts = (window.__textSyncEvents ??= {});
+    const pending = sync[field] ?? [];
+    const sent = pending.includes(server) ? pending.slice(pending.indexOf(server)) : [server];
+    const base = sent[sent.length - 1];
+    // Diff by code point, as the server indexes Python strings, not UTF-16.
+    const b = Array.from(base);
+    const v = Array.from(value);
+    const limit = Math.min(b.length, v.length);
+    let start = 0;
+    while (start < limit && b[start] === v[start]) start++;
+    let tail = 0;
+    while (tail < limit - start && b[b.length - 1 - tail] === v[v.length - 1 - tail]) tail++;
+    const events = Math.max(counts[field] ?? 0, 1);
+    counts[field] = 0;
+    sync[field] = [...sent, value].slice(-8);
+    return [b.length, start, b.length - tail, v.slice(start, v.length - tail).join(""), events];
+})(%(field)s, %(server)s, %(value)s)"""
+
+
+def _patch(field: str, server: rx.Var, value: rx.Var) -> rx.Var:
+    """Diff the new value against the last synced one in the browser."""
+    return rx.Var(
+        PATCH_JS % {"field": repr(field), "server": server, "value": value},
+        _var_data=server._get_all_var_data(),
+    ).to(list)
+
+
+_drafts: dict[tuple[str, str], ClientStateVar] = {}
+
+
+def _draft(state: type[rx.State], field: str) -> ClientStateVar:
+    """The browser-side ``[server value, typed value]`` of a live field."""
+    key = (state.get_full_name(), field)
+    if key not in _drafts:
+        _drafts[key] = ClientStateVar.create(
+            f"draft_{state.__name__}_{field}", default=["", ""]
+        )
+    return _drafts[key]
+
+
+def live_value(state: type[rx.State], field: str) -> rx.Var:
+    """A synced field's value as typed in the browser, ahead of the server.
+
+    Only textareas created with ``live=True`` keep it up to date.
+    """
+    server = getattr(state, field)
+    draft = _draft(state, field).value
+    return rx.Var(
+        LIVE_JS % {"field": repr(field), "server": server, "draft": draft},
+        _var_data=VarData.merge(server._get_all_var_data(), draft._get_all_var_data()),
+    ).to(str)
+
+
+def synced_textarea(
+    state: type[rx.State],
+    field: str,
+    mode: str = "debounce",
+    debounce_timeout: int = 400,
+    live: bool = False,
+    **props,
+) -> rx.Component:
+    """A textarea that syncs edits to the server as patches.
+
+    In "debounce" mode edits are sent after the user pauses typing, and
+    in "blur" mode only when the textarea loses focus. Either way only
+    the edited span is transferred, see ``TextSyncState.sync_text``.
+    With ``live``, every keystroke also updates ``live_value`` in the
+    browser, for previews that must not wait for the sync.
+    """
+    server = getattr(state, field)
+    handler = lambda value: state.sync_text(field, _patch(field, server, value))
+    custom_attrs = props.pop("custom_attrs", {})
+    draft = ""
+    var_data = None
+    if live:
+        set_draft = _draft(state, field).set
+        draft = DRAFT_JS % {"set_draft": set_draft, "server": server}
+        var_data = VarData.merge(server._get_all_var_data(), set_draft._get_all_var_data())
+    custom_attrs["on_input"] = rx.Var(
+        COUNT_INPUT_JS % {"field": repr(field), "draft": draft}, _var_data=var_data
+    )
+    props.setdefault("id", f"sync-{field}")
+    if mode == "blur":
+        return rx.el.textarea(
+            default_value=server,
+            on_blur=handler,
+            custom_attrs=custom_attrs,
+            **props,
+        )
+    return rx.debounce_input(
+        rx.el.textarea(
+            value=server,
+            on_change=handler,
+            custom_attrs=custom_attrs,
+            **props,
+        ),
+        debounce_timeout=debounce_timeout,
+        force_notify_on_blur=True,
+    )
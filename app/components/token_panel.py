@@ -0,0 +1,70 @@
+import reflex as rx
+from app.utils.tokens import DEFAULT_OUTPUT_TOKENS, CostChange, TokenEstimate
+
+
+def _table(headers: list[str], rows: rx.Component, note: str) -> rx.Component:
+    return rx.el.div(
+        rx.el.table(
+            rx.el.thead(
+                rx.el.tr(
+                    *[
+                        rx.el.th(header, class_name="text-left font-medium pb-2 pr-4")
+                        for header in headers
+                    ],
+                    class_name="text-gray-500",
+                )
+            ),
+            rx.el.tbody(rows),
+            class_name="w-full text-xs",
+        ),
+        rx.el.p(note, class_name="text-[11px] text-gray-600 mt-2"),
+        class_name="mt-4 p-3 rounded-xl bg-[#1A1D24]/50 border border-gray-800/50 overflow-x-auto",
+    )
+
+
+def _cell(*children, class_name: str = "text-gray-300") -> rx.Component:
+    return rx.el.td(*children, class_name=f"py-1 pr-4 whitespace-nowrap {class_name}")
+
+
+def estimate_row(estimate: TokenEstimate) -> rx.Component:
+    """A model's token count, cost and latency for one prompt."""
+    return rx.el.tr(
+        _cell(estimate.model, class_name="text-gray-400"),
+        _cell(estimate.prompt_tokens),
+        _cell(estimate.output_tokens),
+        _cell(estimate.cost),
+        _cell(estimate.latency),
+    )
+
+
+def estimate_table(estimates: list[TokenEstimate]) -> rx.Component:
+    """Token counts and cost and latency estimates of a prompt, per model."""
+    return _table(
+        ["Model", "Prompt tokens", "Output tokens", "Cost", "Latency"],
+        rx.foreach(estimates, estimate_row),
+        "Output tokens follow the selected length. Prices and speeds are estimates.",
+    )
+
+
+def cost_change_row(change: CostChange) -> rx.Component:
+    """A model's token count and cost before and after a rewrite."""
+    return rx.el.tr(
+        _cell(change.model, class_name="text-gray-400"),
+        _cell(change.before_tokens, " → ", change.after_tokens),
+        _cell(
+            change.change,
+            class_name=rx.cond(
+                change.change.contains("+"), "text-amber-400", "text-teal-400"
+            ),
+        ),
+        _cell(change.before_cost, " → ", change.after_cost),
+    )
+
+
+def cost_change_table(changes: list[CostChange]) -> rx.Component:
+    """Token counts and costs of the original and optimized prompt, per model."""
+    return _table(
+        ["Model", "Tokens", "Change", "Cost"],
+        rx.foreach(changes, cost_change_row),
+        f"Original → optimized. Costs assume {DEFAULT_OUTPUT_TOKENS} output tokens per call.",
+    )
@@ -0,0 +1,124 @@
+"""Static catalogs shared by every session and compiled into the frontend.
+
+These never change at runtime, so they are kept out of state vars to avoid
+storing and shipping a copy per session.
+"""
+
+from app.states.base import NavItem
+
+NAV_ITEMS: list[NavItem] = [
+    NavItem(label="Home", path="/", icon="layout-dashboard"),
+    NavItem(label="Generator", path="/generator", icon="wand-sparkles"),
+    NavItem(label="Optimizer", path="/optimizer", icon="gauge"),
+    NavItem(label="Settings", path="/settings", icon="settings"),
+]
+
+PURPOSES: list[str] = [
+    "Code",
+    "Email",
+    "Blog",
+    "Social Post",
+    "Script",
+    "Creative",
+    "Analysis",
+    "Other",
+]
+PURPOSE_ICONS: dict[str, str] = {
+    "Code": "code",
+    "Email": "mail",
+    "Blog": "pen-tool",
+    "Social Post": "share-2",
+    "Script": "file-text",
+    "Creative": "feather",
+    "Analysis": "bar-chart-2",
+    "Other": "more-horizontal",
+}
+TONE_PRESETS: list[str] = ["Technical", "Friendly", "Formal"]
+AUTO_CONSTRAINTS: dict[str, str] = {
+    "Code": "Return only code. No conversational filler. Include comments.",
+    "Email": "Use professional email structure. Be concise and polite.",
+    "Blog": "Engaging and SEO-friendly. Use headings and short paragraphs.",
+    "Social Post": "Catchy hook, emojis where appropriate, include hashtags.",
+    "Script": "Natural dialogue flow. Include scene directions.",
+    "Creative": "Show, don't tell. Vivid imagery and emotional resonance.",
+    "Analysis": "Data-driven, objective, bullet points for key insights.",
+    "Other": "Clear and direct response.",
+}
+TONES: list[str] = [
+    "Professional",
+    "Casual",
+    "Enthusiastic",
+    "Authoritative",
+    "Empathetic",
+    "Humorous",
+    "Academic",
+    "Persuasive",
+    "Technical",
+    "Friendly",
+    "Formal",
+]
+FORMATS: list[str] = [
+    "Paragraph",
+    "Bullet Points",
+    "Markdown",
+    "HTML Code",
+    "JSON",
+    "Python Script",
+    "Email Format",
+    "Essay",
+    "Step-by-Step Guide",
+    "Code",
+    "Script",
+    "Social Media Post",
+]
+LENGTHS: list[str] = [
+    "Short (< 100 words)",
+    "Medium (100-300 words)",
+    "Long (300-1000 words)",
+    "Detailed (> 1000 words)",
+]
+PURPOSE_EXAMPLES: dict[str, list[str]] = {
+    "Code": [
+        "Python script to scrape a website",
+        "React component for a login form",
+        "SQL query for monthly churn",
+    ],
+    "Email": [
+        "Cold outreach to potential client",
+        "Follow-up after interview",
+        "Out of office reply",
+    ],
+    "Blog": [
+        "Benefits of remote work",
+        "Guide to personal finance",
+        "Review of iPhone 15",
+    ],
+    "Social Post": [
+        "Launch announcement for new product",
+        "Motivational quote for Monday",
+        "Poll about AI trends",
+    ],
+    "Script": [
+        "Podcast intro about tech news",
+        "YouTube video opener",
+        "Sales call script",
+    ],
+    "Creative": [
+        "Sci-fi story about Mars colony",
+        "Poem about the ocean",
+        "Character description for a hero",
+    ],
+    "Analysis": [
+        "Summarize sales data trends",
+        "Compare two marketing strategies",
+        "SWOT analysis for a startup",
+    ],
+    "Other": [
+        "Study plan for exams",
+        "Birthday party ideas",
+        "Explain quantum physics",
+    ],
+}
+
+GOAL_OPTIONS: list[str] = ["Clarity", "Conciseness", "Structure", "Depth"]
+LEVEL_OPTIONS: list[str] = ["Light", "Moderate", "Aggressive"]
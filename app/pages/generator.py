@@ -1,7 +1,33 @@
 import reflex as rx
 from app.components.layout import layout
-from app.components.skeleton import loading_card
+from app.components.synced_textarea import live_value, synced_textarea
+from app.components.token_panel import estimate_table
 from app.states.generator import GeneratorState
+from app.states.settings import SettingsState
+from app.utils.templates import FIELDS, preview_var
+from app.constants import (
+    FORMATS,
+    LENGTHS,
+    PURPOSE_EXAMPLES,
+    PURPOSE_ICONS,
+    PURPOSES,
+    TONE_PRESETS,
+)
+
+
+def form_value(name: str) -> rx.Var:
+    """A form field's value, as typed for the fields synced on debounce."""
+    if name in GeneratorState.synced_fields:
+        return live_value(GeneratorState, name)
+    return getattr(GeneratorState, name)
+
+
+def prompt_preview() -> rx.Var:
+    """The prompt rendered in the browser from the current form values."""
+    return preview_var(
+        {name: form_value(name) for name in FIELDS},
+        SettingsState.template_team,
+    )
 
 
 def preset_button(label: str, tooltip: str) -> rx.Component:
@@ -25,7 +51,7 @@ def purpose_item(purpose: str) -> rx.Component:
     active = GeneratorState.purpose == purpose
     return rx.el.button(
         rx.icon(
-            GeneratorState.purpose_icons[purpose],
+            PURPOSE_ICONS[purpose],
             class_name=rx.cond(
                 active,
                 "w-5 h-5 text-teal-400 mb-1",
@@ -100,10 +126,7 @@ def advanced_accordion() -> rx.Component:
                             class_name="block text-xs text-gray-500 font-medium mb-1.5",
                         ),
                         rx.el.select(
-                            rx.foreach(
-                                GeneratorState.formats,
-                                lambda f: rx.el.option(f, value=f),
-                            ),
+                            *[rx.el.option(f, value=f) for f in FORMATS],
                             value=GeneratorState.format,
                             on_change=GeneratorState.set_format,
                             class_name="w-full bg-[#13151A] border border-gray-800 rounded-lg px-3 py-2 text-sm text-white focus:border-teal-500 outline-none",
@@ -115,10 +138,7 @@ def advanced_accordion() -> rx.Component:
                             class_name="block text-xs text-gray-500 font-medium mb-1.5",
                         ),
                         rx.el.select(
-                            rx.foreach(
-                                GeneratorState.lengths,
-                                lambda l: rx.el.option(l, value=l),
-                            ),
+                            *[rx.el.option(l, value=l) for l in LENGTHS],
                             value=GeneratorState.length,
                             on_change=GeneratorState.set_length,
                             class_name="w-full bg-[#13151A] border border-gray-800 rounded-lg px-3 py-2 text-sm text-white focus:border-teal-500 outline-none",
@@ -131,11 +151,12 @@ def advanced_accordion() -> rx.Component:
                         "Constraints (Optional)",
                         class_name="block text-xs text-gray-500 font-medium mb-1.5",
                     ),
-                    rx.el.textarea(
+                    synced_textarea(
+                        GeneratorState,
+                        "constraints",
+                        live=True,
                         placeholder="e.g. No markdown, strict tone...",
-                        on_change=GeneratorState.set_constraints,
                         class_name="w-full bg-[#13151A] border border-gray-800 rounded-lg px-3 py-2 text-sm text-white focus:border-teal-500 outline-none min-h-[80px]",
-                        default_value=GeneratorState.constraints,
                     ),
                     class_name="mb-4",
                 ),
@@ -146,6 +167,11 @@ def advanced_accordion() -> rx.Component:
 
 
 def generator_page() -> rx.Component:
+    preview = prompt_preview()
+    describe = form_value("describe")
+    # A model's expansion of the draft replaces it until the form changes.
+    refined = GeneratorState.refined_from == preview
+    shown = rx.cond(refined, GeneratorState.generated_prompt, preview)
     return layout(
         rx.el.div(
             rx.el.div(
@@ -173,7 +199,7 @@ def generator_page() -> rx.Component:
                             class_name="block text-sm font-bold text-gray-300 mb-3",
                         ),
                         rx.el.div(
-                            rx.foreach(GeneratorState.purposes, purpose_item),
+                            *[purpose_item(purpose) for purpose in PURPOSES],
                             class_name="grid grid-cols-4 gap-2 mb-6",
                         ),
                     ),
@@ -182,11 +208,12 @@ def generator_page() -> rx.Component:
                             "Describe your need",
                             class_name="block text-sm font-bold text-gray-300 mb-2",
                         ),
-                        rx.el.textarea(
+                        synced_textarea(
+                            GeneratorState,
+                            "describe",
+                            live=True,
                             placeholder="e.g. convert CSV to JSON without pandas",
-                            on_change=GeneratorState.set_describe,
                             class_name="w-full bg-[#1A1D24] border border-gray-800 rounded-xl px-4 py-4 text-white text-lg placeholder-gray-600 focus:border-teal-500 focus:outline-none focus:ring-1 focus:ring-teal-500 transition-all resize-none shadow-sm min-h-[120px]",
-                            default_value=GeneratorState.describe,
                         ),
                         rx.el.div(
                             rx.el.span(
@@ -194,8 +221,8 @@ def generator_page() -> rx.Component:
                                 class_name="text-xs text-gray-500",
                             ),
                             rx.cond(
-                                (GeneratorState.describe.length() > 0)
-                                & (GeneratorState.describe.split(" ").length() < 5),
+                                (describe.length() > 0)
+                                & (describe.split(" ").length() < 5),
                                 rx.el.span(
                                     " — Try adding more details like expected output.",
                                     class_name="text-xs text-teal-500 font-medium",
@@ -210,7 +237,9 @@ def generator_page() -> rx.Component:
                             ),
                             rx.el.div(
                                 rx.foreach(
-                                    GeneratorState.current_purpose_examples,
+                                    rx.Var.create(PURPOSE_EXAMPLES)[
+                                        GeneratorState.purpose
+                                    ].to(list[str]),
                                     example_pill,
                                 ),
                                 class_name="flex gap-2 overflow-x-auto no-scrollbar py-1",
@@ -224,7 +253,7 @@ def generator_page() -> rx.Component:
                             class_name="block text-sm font-bold text-gray-300 mb-3",
                         ),
                         rx.el.div(
-                            rx.foreach(GeneratorState.tone_presets, tone_pill),
+                            *[tone_pill(tone) for tone in TONE_PRESETS],
                             class_name="flex flex-wrap gap-2",
                         ),
                         class_name="mb-4",
@@ -252,22 +281,41 @@ def generator_page() -> rx.Component:
                     rx.el.div(
                         rx.el.div(
                             rx.el.h3(
-                                "Generated Result",
+                                rx.cond(
+                                    refined,
+                                    "Model Result",
+                                    rx.cond(
+                                        GeneratorState.generated_prompt == preview,
+                                        "Generated Result",
+                                        "Live Preview",
+                                    ),
+                                ),
                                 class_name="text-sm font-bold text-gray-400 uppercase tracking-wider",
                             ),
                             rx.el.div(
                                 rx.el.button(
                                     rx.icon("disc_2", class_name="w-4 h-4"),
                                     "Optimize",
-                                    on_click=GeneratorState.send_to_optimizer,
-                                    disabled=GeneratorState.generated_prompt == "",
+                                    on_click=GeneratorState.send_to_optimizer(shown),
+                                    disabled=describe == "",
                                     class_name="text-xs font-medium text-gray-400 hover:text-white flex items-center gap-2 px-3 py-1.5 rounded-lg hover:bg-gray-800 transition-all disabled:opacity-0",
                                 ),
                                 rx.el.button(
                                     rx.icon("copy", class_name="w-4 h-4"),
                                     "Copy",
-                                    on_click=GeneratorState.copy_to_clipboard,
-                                    disabled=GeneratorState.generated_prompt == "",
+                                    on_click=[
+                                        rx.set_clipboard(shown),
+                                        rx.toast(
+                                            "Copied to clipboard!",
+                                            position="bottom-right",
+                                            style={
+                                                "background-color": "#dcfce7",
+                                                "color": "#166534",
+                                                "border": "1px solid #4ade80",
+                                            },
+                                        ),
+                                    ],
+                                    disabled=describe == "",
                                     class_name="text-xs font-medium text-teal-400 hover:text-teal-300 flex items-center gap-2 px-3 py-1.5 rounded-lg hover:bg-teal-900/20 transition-all ml-2 disabled:opacity-0",
                                 ),
                                 class_name="flex items-center",
@@ -275,28 +323,31 @@ def generator_page() -> rx.Component:
                             class_name="flex items-center justify-between mb-4",
                         ),
                         rx.cond(
-                            GeneratorState.is_generating,
-                            rx.el.div(loading_card(), class_name="opacity-50"),
-                            rx.cond(
-                                GeneratorState.generated_prompt,
+                            describe,
+                            rx.el.div(
                                 rx.el.div(
                                     rx.el.pre(
-                                        GeneratorState.generated_prompt,
+                                        shown,
                                         class_name="text-gray-300 whitespace-pre-wrap font-mono text-sm leading-relaxed",
                                     ),
                                     class_name="min-h-[400px] max-h-[700px] overflow-y-auto custom-scrollbar",
                                 ),
-                                rx.el.div(
-                                    rx.icon(
-                                        "sparkles",
-                                        class_name="w-12 h-12 text-gray-800 mb-4",
-                                    ),
-                                    rx.el.p(
-                                        "No prompt yet — write one line and hit Generate.",
-                                        class_name="text-gray-500 text-center max-w-[200px] leading-relaxed",
-                                    ),
-                                    class_name="flex flex-col items-center justify-center h-[400px] border-2 border-dashed border-gray-800/50 rounded-xl bg-[#13151A]/30",
+                                # Estimates are for the generated prompt, once it is shown.
+                                rx.cond(
+                                    refined | (GeneratorState.generated_prompt == preview),
+                                    estimate_table(GeneratorState.token_estimates),
+                                ),
+                            ),
+                            rx.el.div(
+                                rx.icon(
+                                    "sparkles",
+                                    class_name="w-12 h-12 text-gray-800 mb-4",
+                                ),
+                                rx.el.p(
+                                    "No prompt yet — write one line and hit Generate.",
+                                    class_name="text-gray-500 text-center max-w-[200px] leading-relaxed",
                                 ),
+                                class_name="flex flex-col items-center justify-center h-[400px] border-2 border-dashed border-gray-800/50 rounded-xl bg-[#13151A]/30",
                             ),
                         ),
                         class_name="bg-[#13151A] border border-gray-800 rounded-2xl p-6 shadow-xl h-full min-h-[500px]",
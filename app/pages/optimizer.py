@@ -1,7 +1,13 @@
 import reflex as rx
 from app.components.layout import layout
+from app.components.synced_textarea import synced_textarea
 from app.components.skeleton import loading_card
+from app.components.token_panel import cost_change_table
+from app.states.compare import CompareState
 from app.states.optimizer import OptimizerState
+from app.utils.compare import CompareColumn
+from app.utils.diff import DiffSegment
+from app.constants import GOAL_OPTIONS, LEVEL_OPTIONS
 
 
 def score_bar(label: str, score: int, color: str) -> rx.Component:
@@ -22,6 +28,148 @@ def score_bar(label: str, score: int, color: str) -> rx.Component:
     )
 
 
+def live_score(label: str, score: int) -> rx.Component:
+    """A compact score shown while the original prompt is edited."""
+    return rx.el.span(
+        rx.el.span(label, class_name="text-gray-500"),
+        rx.el.span(score, class_name="ml-1 font-semibold text-gray-300"),
+        class_name="text-xs",
+    )
+
+
+def diff_segment(segment: DiffSegment) -> rx.Component:
+    """A run of text in the before/after diff, highlighted by kind."""
+    return rx.el.span(
+        segment.text,
+        class_name=rx.match(
+            segment.kind,
+            ("insert", "bg-teal-900/60 text-teal-200"),
+            ("delete", "bg-red-900/40 text-red-300 line-through"),
+            "text-gray-400",
+        ),
+    )
+
+
+def compare_column(column: CompareColumn, index: int) -> rx.Component:
+    """One backend's answer in compare mode, with its latency and token usage."""
+    return rx.el.div(
+        rx.el.div(
+            rx.el.div(
+                rx.el.span(column.name, class_name="text-sm font-semibold text-white"),
+                rx.el.span(column.model, class_name="ml-2 text-xs text-gray-500"),
+            ),
+            rx.el.span(
+                column.status,
+                class_name=rx.match(
+                    column.status,
+                    ("done", "text-xs px-2 py-0.5 rounded-full bg-teal-900/40 text-teal-300"),
+                    ("streaming", "text-xs px-2 py-0.5 rounded-full bg-blue-900/40 text-blue-300"),
+                    ("timeout", "text-xs px-2 py-0.5 rounded-full bg-amber-900/40 text-amber-300"),
+                    ("error", "text-xs px-2 py-0.5 rounded-full bg-red-900/40 text-red-300"),
+                    "text-xs px-2 py-0.5 rounded-full bg-gray-800 text-gray-400",
+                ),
+            ),
+            class_name="flex items-center justify-between mb-2",
+        ),
+        rx.el.div(
+            rx.el.span("First token ", column.first_token_ms, " ms"),
+            rx.el.span("Total ", column.total_ms, " ms"),
+            rx.el.span(column.prompt_tokens, " + ", column.completion_tokens, " tokens"),
+            class_name="flex flex-wrap gap-3 text-xs text-gray-500 mb-3",
+        ),
+        rx.cond(
+            column.error,
+            rx.el.p(column.error, class_name="text-xs text-red-400 mb-2"),
+        ),
+        rx.el.pre(
+            column.text,
+            class_name="flex-1 min-h-[120px] max-h-[400px] overflow-y-auto text-gray-300 whitespace-pre-wrap font-mono text-xs leading-relaxed custom-scrollbar",
+        ),
+        rx.el.button(
+            rx.cond(column.winner, "Hedged winner", "Use this"),
+            on_click=CompareState.use_column(index),
+            disabled=column.status != "done",
+            class_name="mt-3 text-xs font-medium text-teal-400 hover:text-teal-300 px-3 py-1.5 rounded-lg hover:bg-teal-900/20 transition-all disabled:opacity-40 disabled:cursor-not-allowed self-end",
+        ),
+        class_name=rx.cond(
+            column.winner,
+            "flex flex-col bg-[#1A1D24] border border-teal-600 rounded-xl p-4",
+            "flex flex-col bg-[#1A1D24] border border-gray-800 rounded-xl p-4",
+        ),
+    )
+
+
+def compare_panel() -> rx.Component:
+    """Run the prompt against every configured model backend side by side."""
+    return rx.el.div(
+        rx.el.div(
+            rx.el.button(
+                rx.icon("columns-3", class_name="w-4 h-4"),
+                "Compare backends",
+                rx.icon(
+                    rx.cond(CompareState.show_compare, "chevron-up", "chevron-down"),
+                    class_name="w-4 h-4",
+                ),
+                on_click=CompareState.toggle_compare,
+                class_name="text-sm font-medium text-gray-400 hover:text-white flex items-center gap-2",
+            ),
+            rx.cond(
+                CompareState.show_compare,
+                rx.el.div(
+                    rx.el.label(
+                        rx.el.input(
+                            type="checkbox",
+                            checked=CompareState.hedged,
+                            on_change=CompareState.set_hedged,
+                            class_name="w-4 h-4 rounded border-gray-700 bg-[#1A1D24] text-teal-600 focus:ring-teal-500 focus:ring-offset-0",
+                        ),
+                        rx.el.span(
+                            "Hedged: take the first good answer",
+                            class_name="ml-2 text-sm text-gray-300",
+                        ),
+                        class_name="flex items-center cursor-pointer select-none",
+                    ),
+                    rx.el.select(
+                        *[
+                            rx.el.option(f"{seconds} s deadline", value=str(seconds))
+                            for seconds in (5, 15, 30, 60)
+                        ],
+                        value=CompareState.deadline_seconds,
+                        on_change=CompareState.set_deadline_seconds,
+                        class_name="bg-[#13151A] border border-gray-800 rounded-lg px-3 py-1.5 text-sm text-white focus:border-teal-500 outline-none",
+                    ),
+                    rx.el.button(
+                        rx.cond(
+                            CompareState.is_comparing,
+                            rx.el.span(
+                                rx.icon(
+                                    "loader",
+                                    class_name="animate-spin mr-2 inline-block w-4 h-4",
+                                ),
+                                "Comparing...",
+                            ),
+                            "Run comparison",
+                        ),
+                        on_click=CompareState.run_compare,
+                        disabled=CompareState.is_comparing,
+                        class_name="px-4 py-1.5 rounded-lg bg-teal-600 text-white text-sm font-semibold hover:bg-teal-500 transition-all disabled:opacity-50 disabled:cursor-not-allowed flex items-center",
+                    ),
+                    class_name="flex flex-wrap items-center gap-4",
+                ),
+            ),
+            class_name="flex flex-wrap items-center justify-between gap-4",
+        ),
+        rx.cond(
+            CompareState.show_compare & (CompareState.columns.length() > 0),
+            rx.el.div(
+                rx.foreach(CompareState.columns, compare_column),
+                class_name="grid grid-cols-1 md:grid-cols-2 xl:grid-cols-3 gap-4 mt-6",
+            ),
+        ),
+        class_name="mt-8 bg-[#13151A] border border-gray-800 rounded-2xl p-6",
+    )
+
+
 def checkbox_option(label: str) -> rx.Component:
     """A checkbox option for optimization goals."""
     is_checked = OptimizerState.selected_goals.contains(label)
@@ -69,15 +217,66 @@ def optimizer_page() -> rx.Component:
             rx.el.div(
                 rx.el.div(
                     rx.el.div(
-                        rx.el.label(
-                            "Original Prompt",
-                            class_name="block text-sm font-medium text-gray-400 mb-2",
+                        rx.el.div(
+                            rx.el.label(
+                                "Original Prompt",
+                                class_name="block text-sm font-medium text-gray-400",
+                            ),
+                            rx.upload.root(
+                                rx.el.button(
+                                    rx.icon("upload", class_name="w-4 h-4"),
+                                    "Upload file",
+                                    class_name="text-xs text-gray-400 hover:text-white flex items-center gap-1.5 px-2 py-1 rounded-lg hover:bg-[#1A1D24] transition-all",
+                                ),
+                                id="original-upload",
+                                accept={"text/plain": [".txt", ".md"]},
+                                multiple=False,
+                                max_files=1,
+                                on_drop=OptimizerState.upload_original(
+                                    rx.upload_files(upload_id="original-upload")
+                                ),
+                            ),
+                            class_name="flex items-center justify-between mb-2",
                         ),
-                        rx.el.textarea(
-                            placeholder="Paste your prompt here...",
-                            on_change=OptimizerState.set_original_prompt,
-                            class_name="w-full h-64 bg-[#1A1D24] border border-gray-800 rounded-xl px-4 py-3 text-white placeholder-gray-600 focus:border-teal-500 focus:outline-none focus:ring-1 focus:ring-teal-500 transition-colors resize-none",
-                            default_value=OptimizerState.original_prompt,
+                        rx.cond(
+                            OptimizerState.original_ref,
+                            rx.el.div(
+                                rx.el.div(
+                                    rx.icon("file-text", class_name="w-4 h-4 mr-2"),
+                                    f"Large prompt ({OptimizerState.original_length} characters). "
+                                    "The full text is kept on the server; the start is shown below.",
+                                    class_name="flex items-center text-xs text-amber-400 mb-2",
+                                ),
+                                rx.el.pre(
+                                    OptimizerState.original_prompt,
+                                    class_name="w-full h-64 overflow-y-auto bg-[#1A1D24] border border-gray-800 rounded-xl px-4 py-3 text-gray-400 whitespace-pre-wrap font-mono text-sm",
+                                ),
+                            ),
+                            synced_textarea(
+                                OptimizerState,
+                                "original_prompt",
+                                placeholder="Paste your prompt here...",
+                                class_name="w-full h-64 bg-[#1A1D24] border border-gray-800 rounded-xl px-4 py-3 text-white placeholder-gray-600 focus:border-teal-500 focus:outline-none focus:ring-1 focus:ring-teal-500 transition-colors resize-none",
+                            ),
+                        ),
+                        rx.cond(
+                            OptimizerState.original_prompt,
+                            rx.el.div(
+                                live_score("Overall", OptimizerState.live_scores.overall),
+                                live_score("Clarity", OptimizerState.live_scores.clarity),
+                                live_score(
+                                    "Conciseness", OptimizerState.live_scores.conciseness
+                                ),
+                                live_score(
+                                    "Structure", OptimizerState.live_scores.structure
+                                ),
+                                live_score("Depth", OptimizerState.live_scores.depth),
+                                class_name="flex flex-wrap gap-4 mt-2",
+                            ),
+                        ),
+                        rx.cond(
+                            OptimizerState.cost_changes.length() > 0,
+                            cost_change_table(OptimizerState.cost_changes),
                         ),
                         class_name="mb-6",
                     ),
@@ -88,9 +287,7 @@ def optimizer_page() -> rx.Component:
                                 class_name="block text-xs font-semibold text-gray-500 uppercase tracking-wider mb-3",
                             ),
                             rx.el.div(
-                                rx.foreach(
-                                    OptimizerState.goal_options, checkbox_option
-                                ),
+                                *[checkbox_option(goal) for goal in GOAL_OPTIONS],
                                 class_name="grid grid-cols-2 gap-2",
                             ),
                             class_name="flex-1",
@@ -101,12 +298,33 @@ def optimizer_page() -> rx.Component:
                                 class_name="block text-xs font-semibold text-gray-500 uppercase tracking-wider mb-3",
                             ),
                             rx.el.div(
-                                rx.foreach(OptimizerState.level_options, radio_option),
+                                *[radio_option(level) for level in LEVEL_OPTIONS],
                                 class_name="space-y-1",
                             ),
                             class_name="flex-1",
                         ),
-                        class_name="grid grid-cols-1 md:grid-cols-2 gap-6 mb-8",
+                        class_name="grid grid-cols-1 md:grid-cols-2 gap-6 mb-6",
+                    ),
+                    rx.el.div(
+                        rx.el.label(
+                            "Token Budget",
+                            class_name="block text-xs font-semibold text-gray-500 uppercase tracking-wider mb-3",
+                        ),
+                        rx.el.input(
+                            input_mode="numeric",
+                            placeholder="No budget",
+                            value=OptimizerState.token_budget,
+                            on_change=OptimizerState.set_token_budget,
+                            on_blur=OptimizerState.apply_token_budget,
+                            class_name="w-40 bg-[#1A1D24] border border-gray-800 rounded-lg px-3 py-2 text-sm text-white placeholder-gray-600 focus:border-teal-500 outline-none",
+                        ),
+                        rx.el.p(
+                            "Compress the result to fit this many tokens, dropping the least "
+                            "informative sentences and words first. Headings, constraints and "
+                            "code blocks are kept.",
+                            class_name="text-xs text-gray-600 mt-2",
+                        ),
+                        class_name="mb-8",
                     ),
                     rx.el.div(
                         rx.el.button(
@@ -141,7 +359,8 @@ def optimizer_page() -> rx.Component:
                 ),
                 rx.el.div(
                     rx.cond(
-                        OptimizerState.is_optimizing,
+                        OptimizerState.is_optimizing
+                        & (OptimizerState.optimized_prompt == ""),
                         loading_card(),
                         rx.cond(
                             OptimizerState.optimized_prompt,
@@ -152,18 +371,57 @@ def optimizer_page() -> rx.Component:
                                             "Optimized Result",
                                             class_name="text-sm font-semibold text-gray-400 uppercase tracking-wider",
                                         ),
-                                        rx.el.button(
-                                            rx.icon("copy", class_name="w-4 h-4"),
-                                            "Copy",
-                                            on_click=OptimizerState.copy_result,
-                                            class_name="text-sm text-teal-400 hover:text-teal-300 flex items-center gap-2 px-3 py-1.5 rounded-lg hover:bg-teal-900/20 transition-all",
+                                        rx.el.div(
+                                            rx.cond(
+                                                OptimizerState.original_ref
+                                                | OptimizerState.result_ref,
+                                                rx.el.span(
+                                                    "Preview of a large result",
+                                                    class_name="text-xs text-amber-400",
+                                                ),
+                                                rx.el.button(
+                                                    rx.icon("git-compare", class_name="w-4 h-4"),
+                                                    rx.cond(
+                                                        OptimizerState.show_diff,
+                                                        "Result",
+                                                        "Changes",
+                                                    ),
+                                                    on_click=OptimizerState.toggle_diff,
+                                                    class_name="text-sm text-gray-400 hover:text-white flex items-center gap-2 px-3 py-1.5 rounded-lg hover:bg-[#1A1D24] transition-all",
+                                                ),
+                                            ),
+                                            rx.el.button(
+                                                rx.icon("copy", class_name="w-4 h-4"),
+                                                "Copy",
+                                                on_click=OptimizerState.copy_result,
+                                                class_name="text-sm text-teal-400 hover:text-teal-300 flex items-center gap-2 px-3 py-1.5 rounded-lg hover:bg-teal-900/20 transition-all",
+                                            ),
+                                            class_name="flex items-center gap-2",
                                         ),
                                         class_name="flex items-center justify-between mb-4",
                                     ),
                                     rx.el.div(
-                                        rx.el.pre(
-                                            OptimizerState.optimized_prompt,
-                                            class_name="text-gray-300 whitespace-pre-wrap font-mono text-sm leading-relaxed",
+                                        rx.cond(
+                                            OptimizerState.show_diff
+                                            & ~(OptimizerState.original_ref | OptimizerState.result_ref),
+                                            rx.cond(
+                                                OptimizerState.diff_segments,
+                                                rx.el.pre(
+                                                    rx.foreach(
+                                                        OptimizerState.diff_segments,
+                                                        diff_segment,
+                                                    ),
+                                                    class_name="whitespace-pre-wrap font-mono text-sm leading-relaxed",
+                                                ),
+                                                rx.el.p(
+                                                    "Comparing...",
+                                                    class_name="text-gray-500 text-sm animate-pulse",
+                                                ),
+                                            ),
+                                            rx.el.pre(
+                                                OptimizerState.optimized_prompt,
+                                                class_name="text-gray-300 whitespace-pre-wrap font-mono text-sm leading-relaxed",
+                                            ),
                                         ),
                                         class_name="bg-[#0F1115] border border-gray-800 rounded-xl p-4 min-h-[200px] overflow-y-auto max-h-[400px] mb-6",
                                     ),
@@ -262,5 +520,6 @@ def optimizer_page() -> rx.Component:
                 ),
                 class_name="grid grid-cols-1 lg:grid-cols-[1.2fr_1fr] gap-8",
             ),
+            compare_panel(),
         )
     )
\ No newline at end of file
@@ -2,7 +2,7 @@ import reflex as rx
 from app.components.layout import layout
 from app.components.layout import layout
 from app.states.settings import SettingsState
-from app.states.generator import GeneratorState
+from app.constants import FORMATS, TONES
 
 
 def setting_section(
@@ -49,7 +49,7 @@ def settings_page() -> rx.Component:
                         default_value=SettingsState.api_key,
                     ),
                     rx.el.p(
-                        "Your key is stored locally in your browser and never sent to our servers.",
+                        "Your key is stored locally in your browser. It is only sent with optimize and generate requests, to call the model provider.",
                         class_name="text-xs text-gray-500",
                     ),
                 ),
@@ -64,9 +64,7 @@ def settings_page() -> rx.Component:
                             class_name="block text-sm font-medium text-gray-400 mb-2",
                         ),
                         rx.el.select(
-                            rx.foreach(
-                                GeneratorState.tones, lambda t: rx.el.option(t, value=t)
-                            ),
+                            *[rx.el.option(t, value=t) for t in TONES],
                             value=SettingsState.default_tone,
                             on_change=SettingsState.set_default_tone,
                             class_name="w-full bg-[#1A1D24] border border-gray-800 rounded-xl px-4 py-2.5 text-white focus:border-teal-500 outline-none",
@@ -79,16 +77,30 @@ def settings_page() -> rx.Component:
                             class_name="block text-sm font-medium text-gray-400 mb-2",
                         ),
                         rx.el.select(
-                            rx.foreach(
-                                GeneratorState.formats,
-                                lambda f: rx.el.option(f, value=f),
-                            ),
+                            *[rx.el.option(f, value=f) for f in FORMATS],
                             value=SettingsState.default_format,
                             on_change=SettingsState.set_default_format,
                             class_name="w-full bg-[#1A1D24] border border-gray-800 rounded-xl px-4 py-2.5 text-white focus:border-teal-500 outline-none",
                         ),
                         class_name="mb-4",
                     ),
+                    rx.el.div(
+                        rx.el.label(
+                            "Template Team",
+                            class_name="block text-sm font-medium text-gray-400 mb-2",
+                        ),
+                        rx.el.input(
+                            on_change=SettingsState.set_template_team,
+                            placeholder="default",
+                            class_name="w-full bg-[#1A1D24] border border-gray-800 rounded-xl px-4 py-2.5 text-white focus:border-teal-500 focus:ring-1 focus:ring-teal-500 outline-none transition-all mb-2",
+                            default_value=SettingsState.template_team,
+                        ),
+                        rx.el.p(
+                            "Uses your team's prompt templates when one is registered.",
+                            class_name="text-xs text-gray-500",
+                        ),
+                        class_name="mb-4",
+                    ),
                     rx.el.button(
                         "Reset to Defaults",
                         on_click=SettingsState.reset_defaults,
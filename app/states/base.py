@@ -11,12 +11,6 @@ class BaseState(rx.State):
     """The base state for the application."""
 
     is_sidebar_open: bool = False
-    nav_items: list[NavItem] = [
-        NavItem(label="Home", path="/", icon="layout-dashboard"),
-        NavItem(label="Generator", path="/generator", icon="wand-sparkles"),
-        NavItem(label="Optimizer", path="/optimizer", icon="gauge"),
-        NavItem(label="Settings", path="/settings", icon="settings"),
-    ]
 
     @rx.var
     def current_path(self) -> str:
@@ -43,6 +37,7 @@ class BaseState(rx.State):
 
     show_history: bool = False
     show_shortcuts: bool = False
+    show_search: bool = False
 
     @rx.event
     def toggle_history(self):
@@ -52,13 +47,17 @@ class BaseState(rx.State):
     def toggle_shortcuts(self):
         self.show_shortcuts = not self.show_shortcuts
 
+    @rx.event
+    def toggle_search(self):
+        self.show_search = not self.show_search
+
     @rx.event
     def handle_keyboard(self, key: str, modifiers: list[str]):
         """Handle global keyboard shortcuts."""
         is_cmd = "Meta" in modifiers or "Control" in modifiers
         key = key.lower()
         if is_cmd and key == "k":
-            yield rx.toast("Search not implemented yet", icon="search")
+            self.show_search = not self.show_search
         elif is_cmd and key == "g":
             yield rx.redirect("/generator")
         elif is_cmd and key == "o":
@@ -0,0 +1,199 @@
+import reflex as rx
+import asyncio
+import contextlib
+import logging
+import time
+from app.utils import scoring
+from app.utils.compare import (
+    DEFAULT_DEADLINE_SECONDS,
+    DONE,
+    FINISHED,
+    MAX_BACKENDS,
+    CompareColumn,
+    Comparison,
+)
+from app.utils.llm import STREAM_FLUSH_SECONDS, get_backends, optimization_messages
+from app.utils.runs import RunTracker
+
+_compare_runs = RunTracker("compare")
+
+
+def parse_deadline(value: str) -> float:
+    """Read a deadline in seconds from its input; 0 if it is not a positive number."""
+    try:
+        deadline = float(value)
+    except ValueError:
+        return 0.0
+    return deadline if 0 < deadline < float("inf") else 0.0
+
+
+class CompareState(rx.State):
+    """State for comparing model backends on the optimizer page."""
+
+    show_compare: bool = False
+    hedged: bool = False
+    deadline_seconds: str = str(DEFAULT_DEADLINE_SECONDS)
+    columns: list[CompareColumn] = []
+    is_comparing: bool = False
+    # The optimizer inputs the shown columns answer.
+    _compared: tuple[str, str, list[str]] = ("", "", [])
+
+    @rx.event
+    def toggle_compare(self):
+        self.show_compare = not self.show_compare
+
+    @rx.event
+    def set_hedged(self, value: bool):
+        self.hedged = value
+
+    @rx.event
+    def set_deadline_seconds(self, value: str):
+        self.deadline_seconds = value
+
+    async def _use(self, column: CompareColumn, summary: str):
+        """Show a column's answer as the optimizer result and add it to history.
+
+        Must be called with the state lock held.
+        """
+        from app.states.optimizer import OptimizerState
+
+        original, level, goals = self._compared
+        optimizer = await self.get_state(OptimizerState)
+        await optimizer._publish(
+            original, "", level, goals, column.text, "",
+            [
+                f"{summary} {column.name} ({column.model}) answered in {column.total_ms} ms "
+                f"with {column.prompt_tokens} prompt and {column.completion_tokens} "
+                "completion tokens."
+            ],
+            scoring.score_prompt(column.text),
+            record=True, model=column.model,
+        )
+
+    @rx.event(background=True)
+    async def run_compare(self):
+        """Send the optimizer's prompt to every configured backend at once.
+
+        Each column streams on its own and stops at the deadline (see
+        app/utils/compare.py). In hedged mode the first acceptable answer
+        wins, the other backends are cancelled, and the winner becomes the
+        optimizer result.
+        """
+        from app.states.optimizer import OptimizerState
+        from app.states.settings import SettingsState
+
+        started = time.perf_counter()
+        async with self:
+            token = self.router.session.client_token
+            optimizer = await self.get_state(OptimizerState)
+            original = optimizer.original_prompt
+            original_ref = optimizer.original_ref
+            level = optimizer.optimization_level
+            goals = list(optimizer.selected_goals)
+            settings = await self.get_state(SettingsState)
+            api_key = settings.api_key
+            hedged = self.hedged
+            deadline = parse_deadline(self.deadline_seconds)
+        backends = get_backends(api_key)[:MAX_BACKENDS]
+        problem = None
+        if not original:
+            problem = "Please enter a prompt to compare."
+        elif not deadline:
+            problem = "The deadline must be a positive number of seconds."
+        elif original_ref:
+            problem = "Large prompts cannot be compared; use Optimize instead."
+        elif not backends:
+            problem = "Configure model backends in backends.json to compare them."
+        if problem:
+            yield rx.toast(
+                problem,
+                title="Validation Error",
+                position="bottom-right",
+                style={
+                    "background-color": "#fee2e2",
+                    "color": "#991b1b",
+                    "border": "1px solid #f87171",
+                },
+            )
+            return
+        run_id = _compare_runs.begin(token)
+        try:
+            comparison = Comparison(
+                backends, optimization_messages(original, level, goals), deadline, hedged
+            )
+            async with self:
+                self.columns = [column.copy() for column in comparison.columns]
+                self._compared = (original, level, goals)
+                self.is_comparing = True
+            flushed = time.perf_counter()
+            async with contextlib.aclosing(comparison.updates()) as updates:
+                async for i in updates:
+                    now = time.perf_counter()
+                    if (
+                        comparison.columns[i].status not in FINISHED
+                        and now - flushed < STREAM_FLUSH_SECONDS
+                    ):
+                        continue
+                    flushed = now
+                    async with self:
+                        self.columns = [column.copy() for column in comparison.columns]
+            if not _compare_runs.publishing(token, run_id):
+                _compare_runs.drop(started)
+                return
+            async with self:
+                self.columns = [column.copy() for column in comparison.columns]
+                self.is_comparing = False
+                if comparison.winner is not None:
+                    await self._use(comparison.columns[comparison.winner], "Fastest acceptable answer in a hedged comparison:")
+        except asyncio.CancelledError:
+            _compare_runs.drop(started, cancelled=True)
+            raise
+        except Exception as e:
+            logging.exception(f"Comparing backends failed: {e}")
+            if _compare_runs.fail(token, run_id, started):
+                async with self:
+                    self.is_comparing = False
+            yield rx.toast(
+                "The comparison failed. Please try again.",
+                title="Error",
+                position="bottom-right",
+                style={
+                    "background-color": "#fee2e2",
+                    "color": "#991b1b",
+                    "border": "1px solid #f87171",
+                },
+            )
+            return
+        _compare_runs.end(token, run_id)
+        if comparison.winner is not None:
+            yield OptimizerState.load_diff
+        elif hedged:
+            yield rx.toast(
+                "No backend gave an acceptable answer before the deadline.",
+                title="Model Error",
+                position="bottom-right",
+                style={
+                    "background-color": "#fee2e2",
+                    "color": "#991b1b",
+                    "border": "1px solid #f87171",
+                },
+            )
+
+    @rx.event
+    async def use_column(self, index: int):
+        """Make a finished column's answer the optimizer result."""
+        from app.states.optimizer import OptimizerState
+
+        if not 0 <= index < len(self.columns) or self.columns[index].status != DONE:
+            return
+        await self._use(self.columns[index], "Chosen in a comparison:")
+        yield OptimizerState.load_diff
+        yield rx.toast(
+            f"Using the answer of {self.columns[index].name}.",
+            position="bottom-right",
+            style={
+                "background-color": "#dcfce7",
+                "color": "#166534",
+                "border": "1px solid #4ade80",
+            },
+        )
@@ -1,6 +1,20 @@
 import reflex as rx
 import asyncio
+import logging
+import time
+from typing import ClassVar
 from pydantic import BaseModel
+from app.constants import AUTO_CONSTRAINTS
+from app.states.history import GeneratedMetadata
+from app.states.sync import TextSyncState
+from app.utils.large_input import LARGE_INPUT_CHARS
+from app.utils.llm import BackendError, accumulate, generation_messages, get_backend
+from app.utils.response_cache import cached
+from app.utils.runs import RunTracker
+from app.utils.templates import render_prompt
+from app.utils.tokens import TokenEstimate, estimate_all, expected_output_tokens
+
+_compose_runs = RunTracker("compose")
 
 
 class ExampleTemplate(BaseModel):
@@ -14,9 +28,13 @@ class ExampleTemplate(BaseModel):
     examples: str
 
 
-class GeneratorState(rx.State):
+class GeneratorState(TextSyncState, rx.State):
     """State for the prompt generator page."""
 
+    synced_fields: ClassVar[tuple[str, ...]] = ("describe", "constraints")
+    # The generator has no large-input mode, so its fields stay small.
+    max_text_chars: ClassVar[int] = LARGE_INPUT_CHARS
+
     purpose: str = "Code"
     describe: str = ""
     tone: str = "Technical"
@@ -26,114 +44,18 @@ class GeneratorState(rx.State):
     constraints: str = ""
     examples: str = ""
     generated_prompt: str = ""
+    # The rendered draft a model expanded into generated_prompt; the page
+    # shows the model's version while the form still renders this draft.
+    refined_from: str = ""
     is_generating: bool = False
     show_advanced: bool = False
-    purposes: list[str] = [
-        "Code",
-        "Email",
-        "Blog",
-        "Social Post",
-        "Script",
-        "Creative",
-        "Analysis",
-        "Other",
-    ]
-    purpose_icons: dict[str, str] = {
-        "Code": "code",
-        "Email": "mail",
-        "Blog": "pen-tool",
-        "Social Post": "share-2",
-        "Script": "file-text",
-        "Creative": "feather",
-        "Analysis": "bar-chart-2",
-        "Other": "more-horizontal",
-    }
-    tone_presets: list[str] = ["Technical", "Friendly", "Formal"]
-    auto_constraints: dict[str, str] = {
-        "Code": "Return only code. No conversational filler. Include comments.",
-        "Email": "Use professional email structure. Be concise and polite.",
-        "Blog": "Engaging and SEO-friendly. Use headings and short paragraphs.",
-        "Social Post": "Catchy hook, emojis where appropriate, include hashtags.",
-        "Script": "Natural dialogue flow. Include scene directions.",
-        "Creative": "Show, don't tell. Vivid imagery and emotional resonance.",
-        "Analysis": "Data-driven, objective, bullet points for key insights.",
-        "Other": "Clear and direct response.",
-    }
-    tones: list[str] = [
-        "Professional",
-        "Casual",
-        "Enthusiastic",
-        "Authoritative",
-        "Empathetic",
-        "Humorous",
-        "Academic",
-        "Persuasive",
-        "Technical",
-        "Friendly",
-        "Formal",
-    ]
-    formats: list[str] = [
-        "Paragraph",
-        "Bullet Points",
-        "Markdown",
-        "HTML Code",
-        "JSON",
-        "Python Script",
-        "Email Format",
-        "Essay",
-        "Step-by-Step Guide",
-        "Code",
-        "Script",
-        "Social Media Post",
-    ]
-    lengths: list[str] = [
-        "Short (< 100 words)",
-        "Medium (100-300 words)",
-        "Long (300-1000 words)",
-        "Detailed (> 1000 words)",
-    ]
-    purpose_examples: dict[str, list[str]] = {
-        "Code": [
-            "Python script to scrape a website",
-            "React component for a login form",
-            "SQL query for monthly churn",
-        ],
-        "Email": [
-            "Cold outreach to potential client",
-            "Follow-up after interview",
-            "Out of office reply",
-        ],
-        "Blog": [
-            "Benefits of remote work",
-            "Guide to personal finance",
-            "Review of iPhone 15",
-        ],
-        "Social Post": [
-            "Launch announcement for new product",
-            "Motivational quote for Monday",
-            "Poll about AI trends",
-        ],
-        "Script": [
-            "Podcast intro about tech news",
-            "YouTube video opener",
-            "Sales call script",
-        ],
-        "Creative": [
-            "Sci-fi story about Mars colony",
-            "Poem about the ocean",
-            "Character description for a hero",
-        ],
-        "Analysis": [
-            "Summarize sales data trends",
-            "Compare two marketing strategies",
-            "SWOT analysis for a startup",
-        ],
-        "Other": [
-            "Study plan for exams",
-            "Birthday party ideas",
-            "Explain quantum physics",
-        ],
-    }
+
+    @rx.var
+    def token_estimates(self) -> list[TokenEstimate]:
+        """Token count, cost and latency per model of the generated prompt."""
+        if not self.generated_prompt:
+            return []
+        return estimate_all(self.generated_prompt, expected_output_tokens(self.length))
 
     @rx.var
     def task_type(self) -> str:
@@ -143,10 +65,6 @@ class GeneratorState(rx.State):
     def topic(self) -> str:
         return self.describe
 
-    @rx.var
-    def current_purpose_examples(self) -> list[str]:
-        return self.purpose_examples.get(self.purpose, [])
-
     @rx.event
     def toggle_advanced(self):
         self.show_advanced = not self.show_advanced
@@ -154,7 +72,7 @@ class GeneratorState(rx.State):
     @rx.event
     def set_preset(self, preset: str):
         self.active_preset = preset
-        base_constraint = self.auto_constraints.get(self.purpose, "")
+        base_constraint = AUTO_CONSTRAINTS.get(self.purpose, "")
         if preset == "Quick":
             self.length = "Short (< 100 words)"
             self.constraints = base_constraint
@@ -207,20 +125,49 @@ class GeneratorState(rx.State):
     @rx.event
     def use_quick_example(self, text: str):
         self.describe = text
-        self.compose_prompt()
+        return GeneratorState.compose_prompt
 
     @rx.event
-    async def send_to_optimizer(self):
+    async def send_to_optimizer(self, prompt: str):
+        """Send the previewed prompt to the optimizer page."""
         from app.states.optimizer import OptimizerState
 
         opt_state = await self.get_state(OptimizerState)
-        opt_state.original_prompt = self.generated_prompt
+        opt_state.original_prompt = prompt or self.generated_prompt
+        opt_state.original_ref = ""
         yield rx.redirect("/optimizer")
+        yield OptimizerState.update_live_scores
 
-    @rx.event
+    @rx.event(background=True)
     async def compose_prompt(self):
-        """Construct the prompt based on form inputs."""
-        if not self.purpose or not self.describe:
+        """Construct the prompt based on form inputs.
+
+        Runs as a background task so the session lock is only held to read
+        the form and to publish the result. With a model backend configured
+        (see app/utils/llm.py) the model then expands the rendered draft,
+        streaming its reply into the result; if it fails, the draft is kept.
+        """
+        from app.states.history import HistoryState
+        from app.states.settings import SettingsState
+
+        started = time.perf_counter()
+        async with self:
+            token = self.router.session.client_token
+            fields = {
+                "purpose": self.purpose,
+                "describe": self.describe,
+                "tone": self.tone,
+                "format": self.format,
+                "length": self.length,
+                "constraints": self.constraints,
+                "examples": self.examples,
+            }
+            if fields["purpose"] and fields["describe"]:
+                self.is_generating = True
+                settings = await self.get_state(SettingsState)
+                team = settings.template_team
+                api_key = settings.api_key
+        if not fields["purpose"] or not fields["describe"]:
             yield rx.toast(
                 "Please select a purpose and describe what you need.",
                 title="Validation Error",
@@ -232,45 +179,79 @@ class GeneratorState(rx.State):
                 },
             )
             return
-        self.is_generating = True
-        yield
-        await asyncio.sleep(0.8)
-        parts = []
-        parts.append(f"# Role\nAct as an expert in {self.purpose}.")
-        parts.append(f"\n# Task\nTopic: {self.describe}")
-        if self.tone:
-            parts.append(f"Tone: {self.tone}")
-        if self.length:
-            parts.append(f"Length: {self.length}")
-        if self.format:
-            parts.append(f"Output Format: {self.format}")
-        if self.constraints:
-            parts.append(f"\n# Constraints\n{self.constraints}")
-        if self.examples:
-            parts.append(f"\n# Examples\n{self.examples}")
-        parts.append("""
-# Instructions
-Please generate the response following the requirements above. Ensure high quality and strict adherence to the constraints.""")
-        self.generated_prompt = """
-""".join(parts)
-        from app.states.history import HistoryState
-
-        hist = await self.get_state(HistoryState)
-        hist.add_item(
-            type="generated",
-            title=f"{self.purpose}: {self.describe}",
-            content=self.generated_prompt,
-            metadata={
-                "task_type": self.purpose,
-                "topic": self.describe,
-                "tone": self.tone,
-                "format": self.format,
-                "length": self.length,
-                "constraints": self.constraints,
-                "examples": self.examples,
-            },
-        )
-        self.is_generating = False
+        run_id = _compose_runs.begin(token)
+        try:
+            prompt = render_prompt(fields, team=team)
+            draft = prompt
+            backend = get_backend(api_key)
+            if backend is not None:
+                backend = cached(backend)
+            if backend is not None:
+                try:
+                    async with self:
+                        self.refined_from = draft
+                    async for prompt in accumulate(backend.stream(generation_messages(draft))):
+                        async with self:
+                            self.generated_prompt = prompt
+                    if not prompt.strip():
+                        raise BackendError(f"{backend.config.name}: empty reply")
+                except BackendError as e:
+                    logging.warning(f"Model backend failed, keeping the draft: {e}")
+                    prompt = draft
+                    yield rx.toast(
+                        "The model backend is unavailable; showing the template draft.",
+                        title="Model Error",
+                        position="bottom-right",
+                        style={
+                            "background-color": "#fee2e2",
+                            "color": "#991b1b",
+                            "border": "1px solid #f87171",
+                        },
+                    )
+            if not _compose_runs.publishing(token, run_id):
+                _compose_runs.drop(started)
+                return
+            refined_from = draft if prompt != draft else ""
+            async with self:
+                self.generated_prompt = prompt
+                self.refined_from = refined_from
+                self.is_generating = False
+                hist = await self.get_state(HistoryState)
+                hist.add_item(
+                    type="generated",
+                    title=f"{fields['purpose']}: {fields['describe']}",
+                    content=prompt,
+                    metadata=GeneratedMetadata(
+                        task_type=fields["purpose"],
+                        topic=fields["describe"],
+                        tone=fields["tone"],
+                        format=fields["format"],
+                        length=fields["length"],
+                        constraints=fields["constraints"],
+                        examples=fields["examples"],
+                        draft=refined_from,
+                    ),
+                )
+        except asyncio.CancelledError:
+            _compose_runs.drop(started, cancelled=True)
+            raise
+        except Exception as e:
+            logging.exception(f"Generating failed: {e}")
+            if _compose_runs.fail(token, run_id, started):
+                async with self:
+                    self.is_generating = False
+            yield rx.toast(
+                "The prompt could not be generated. Please try again.",
+                title="Error",
+                position="bottom-right",
+                style={
+                    "background-color": "#fee2e2",
+                    "color": "#991b1b",
+                    "border": "1px solid #f87171",
+                },
+            )
+            return
+        _compose_runs.end(token, run_id)
         yield rx.toast(
             "Prompt generated successfully!",
             title="Success",
@@ -296,23 +277,17 @@ Please generate the response following the requirements above. Ensure high quali
             f"Loaded template: {example.get('name')}", position="bottom-right"
         )
 
-    @rx.event
-    async def load_from_history(self, metadata: dict, content: str):
-        """Load a prompt from history."""
-        self.purpose = metadata.get("task_type") or metadata.get("purpose", "Code")
-        self.describe = metadata.get("topic") or metadata.get("describe", "")
-        self.tone = metadata.get("tone", "")
-        self.format = metadata.get("format", "")
-        self.length = metadata.get("length", "")
-        self.constraints = metadata.get("constraints", "")
-        self.examples = metadata.get("examples", "")
+    def _restore(self, metadata: GeneratedMetadata, content: str):
+        """Restore the form and result from a history item."""
+        self.purpose = metadata.task_type
+        self.describe = metadata.topic
+        self.tone = metadata.tone
+        self.format = metadata.format
+        self.length = metadata.length
+        self.constraints = metadata.constraints
+        self.examples = metadata.examples
         self.generated_prompt = content
-        from app.states.base import BaseState
-
-        base = await self.get_state(BaseState)
-        base.show_history = False
-        yield rx.redirect("/generator")
-        yield rx.toast("Restored prompt from history", position="bottom-right")
+        self.refined_from = metadata.draft
 
     @rx.event
     def clear_form(self):
@@ -325,18 +300,5 @@ Please generate the response following the requirements above. Ensure high quali
         self.constraints = ""
         self.examples = ""
         self.generated_prompt = ""
+        self.refined_from = ""
         self.select_purpose("Code")
-
-    @rx.event
-    def copy_to_clipboard(self):
-        """Copy the generated prompt to clipboard."""
-        yield rx.set_clipboard(self.generated_prompt)
-        yield rx.toast(
-            "Copied to clipboard!",
-            position="bottom-right",
-            style={
-                "background-color": "#dcfce7",
-                "color": "#166534",
-                "border": "1px solid #4ade80",
-            },
-        )
\ No newline at end of file
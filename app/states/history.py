@@ -1,12 +1,109 @@
 import reflex as rx
-import json
+import bisect
+import threading
 import time
-from typing import Optional
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Union
 import logging
+from app.utils import history_codec, metrics
+from app.utils.history_store import get_history_store
+from app.utils.scoring import PromptScores
+from app.utils.search import SearchIndex
+
+MAX_HISTORY_ITEMS = 200
+HISTORY_PAGE_SIZE = 20
+SEARCH_LIMIT = 20
+HISTORY_ITEM_HEIGHT = 100
+HISTORY_WINDOW = 10
+HISTORY_OVERSCAN = 4
+# Decoded history indexes kept per process, one per session.
+INDEX_CACHE_SIZE = 256
+SEARCH_METADATA_KEYS = ("topic", "tone", "original_prompt")
+METADATA_VERSION = 2
+
+
+class GeneratedMetadata(rx.Base):
+    """Metadata of a "generated" history item: the generator form."""
+
+    schema_version: int = METADATA_VERSION
+    task_type: str
+    topic: str
+    tone: str
+    format: str
+    length: str
+    constraints: str = ""
+    examples: str = ""
+    # The rendered draft a model expanded into the item's content, if any.
+    draft: str = ""
+
+
+class OptimizedMetadata(rx.Base):
+    """Metadata of an "optimized" history item: the optimizer inputs and results."""
+
+    schema_version: int = METADATA_VERSION
+    original_prompt: str
+    optimization_level: str
+    selected_goals: list[str] = []
+    explanation: list[str] = []
+    scores: PromptScores
+    # Set in large-input mode, where original_prompt and the item's content
+    # are previews of the bodies these reference.
+    original_ref: str = ""
+    result_ref: str = ""
+    # The model that wrote the result; empty for the built-in rewrite.
+    model: str = ""
+    # The token budget the result was compressed to; 0 for none.
+    token_budget: int = 0
+
+
+HistoryMetadata = Union[GeneratedMetadata, OptimizedMetadata]
+
+METADATA_SCHEMAS: dict[str, type] = {
+    "generated": GeneratedMetadata,
+    "optimized": OptimizedMetadata,
+}
+
+
+def _upgrade_metadata(type: str, metadata: dict[str, Any]) -> dict[str, Any]:
+    """Convert version 1 metadata, where every value was a string, to version 2."""
+    if type == "generated":
+        return {
+            **metadata,
+            "task_type": metadata.get("task_type") or metadata["purpose"],
+            "topic": metadata.get("topic") or metadata["describe"],
+        }
+    clarity, conciseness, structure, depth = map(int, metadata["scores"].split(","))
+    return {
+        **metadata,
+        "selected_goals": [g for g in metadata.get("selected_goals", "").split(",") if g],
+        "explanation": [e for e in metadata.get("explanation", "").split("|") if e],
+        "scores": {
+            "clarity": clarity,
+            "conciseness": conciseness,
+            "structure": structure,
+            "depth": depth,
+            "overall": (clarity + conciseness + structure + depth) // 4,
+        },
+    }
+
+
+def parse_metadata(type: str, metadata: dict[str, Any]) -> HistoryMetadata:
+    """Decode the stored metadata of an item into its typed schema.
+
+    Raises if the type is unknown or a required field is missing.
+    """
+    schema = METADATA_SCHEMAS[type]
+    if metadata.get("schema_version", 1) < METADATA_VERSION:
+        metadata = _upgrade_metadata(type, metadata)
+    return schema.parse_obj(metadata)
 
 
 class HistoryItem(rx.Base):
-    """Model for a single history item."""
+    """Model for a single history item.
+
+    ``metadata`` holds a GeneratedMetadata or OptimizedMetadata as a plain
+    dict, depending on ``type``; decode it with ``typed_metadata``.
+    """
 
     id: str
     type: str
@@ -14,62 +111,306 @@ class HistoryItem(rx.Base):
     content: str
     timestamp: float
     formatted_date: str = ""
-    metadata: dict[str, str] = {}
+    metadata: dict[str, Any] = {}
 
+    def typed_metadata(self) -> HistoryMetadata:
+        """Decode the metadata into the schema of the item's type."""
+        return parse_metadata(self.type, self.metadata)
 
-class HistoryState(rx.State):
-    """State for managing local history."""
 
-    history_json: str = rx.LocalStorage("[]", name="prompt_history")
+def search_fields(item: HistoryItem) -> list[tuple[str, int]]:
+    """Get the searchable text of an item with its weight; titles count double."""
+    fields = [(item.title, 2), (item.content, 1)]
+    fields.extend((item.metadata.get(key, ""), 1) for key in SEARCH_METADATA_KEYS)
+    return fields
 
-    @rx.var
-    def history(self) -> list[HistoryItem]:
-        """Parse history from JSON."""
+
+def summarize(item: HistoryItem) -> HistoryItem:
+    """Get a copy of the item without its content and metadata."""
+    return item.copy(update={"content": "", "metadata": {}})
+
+
+class HistoryIndex:
+    """In-memory history sorted by timestamp, built once from the stored blob.
+
+    Items are kept in a dict by id plus a list of (timestamp, id) in
+    ascending order. Saving hands the codec's writer the ids in order, and
+    it only encodes the items added since the last save, converting them to
+    plain dicts once (see app/utils/history_codec.py). The search index is built on the
+    first search and then kept up to date item by item.
+    """
+
+    def __init__(self):
+        self.items: dict[str, HistoryItem] = {}
+        self.order: list[tuple[float, str]] = []
+        self.records: dict[str, dict] = {}
+        self.search_index: Optional[SearchIndex] = None
+        self.source = "[]"
+        self.writer = history_codec.Writer()
+
+    @classmethod
+    def decode(cls, source: str) -> "HistoryIndex":
+        """Parse the stored history, in any codec version, into an index."""
+        index = cls()
         try:
-            data = json.loads(self.history_json)
-            items = []
-            for item_data in data:
-                if "formatted_date" not in item_data and "timestamp" in item_data:
-                    item_data["formatted_date"] = time.strftime(
-                        "%Y-%m-%d %H:%M", time.localtime(item_data["timestamp"])
-                    )
-                items.append(HistoryItem(**item_data))
-            return items
+            records, index.writer = history_codec.read(source)
         except Exception as e:
-            logging.exception(f"Error parsing history JSON: {e}")
-            return []
+            logging.exception(f"Error parsing history: {e}")
+            records = []
+        for item_data in records:
+            if "formatted_date" not in item_data and "timestamp" in item_data:
+                item_data["formatted_date"] = time.strftime(
+                    "%Y-%m-%d %H:%M", time.localtime(item_data["timestamp"])
+                )
+            metadata = item_data.get("metadata", {})
+            if metadata.get("schema_version", 1) < METADATA_VERSION:
+                # Upgrade now so the stored form is version 2 after the next
+                # save; items that do not upgrade are kept and fail on open.
+                try:
+                    item_data["metadata"] = parse_metadata(item_data["type"], metadata).dict()
+                except Exception as e:
+                    logging.warning(f"Cannot upgrade history item metadata: {e!r}")
+            try:
+                index.add(HistoryItem(**item_data))
+            except Exception as e:
+                logging.exception(f"Dropping unreadable history item: {e}")
+        index.source = source
+        return index
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, item: HistoryItem):
+        """Insert an item, appending in O(1) when it is the newest."""
+        if item.id in self.items:
+            self.remove(item.id)
+        key = (item.timestamp, item.id)
+        if not self.order or key >= self.order[-1]:
+            self.order.append(key)
+        else:
+            bisect.insort(self.order, key)
+        self.items[item.id] = item
+        if self.search_index is not None:
+            self.search_index.add(item.id, search_fields(item))
+
+    def remove(self, item_id: str) -> Optional[HistoryItem]:
+        """Remove an item by id, locating it by binary search."""
+        item = self.items.pop(item_id, None)
+        if item is None:
+            return None
+        pos = bisect.bisect_left(self.order, (item.timestamp, item_id))
+        del self.order[pos]
+        self.records.pop(item_id, None)
+        if self.search_index is not None:
+            self.search_index.remove(item_id)
+        return item
+
+    def trim(self, limit: int):
+        """Drop the oldest items beyond the limit."""
+        while len(self.order) > limit:
+            self.remove(self.order[0][1])
+
+    def search(self, query: str, limit: int) -> list[HistoryItem]:
+        """Get the items best matching the query."""
+        if self.search_index is None:
+            self.search_index = SearchIndex()
+            for item in self.items.values():
+                self.search_index.add(item.id, search_fields(item))
+        return [self.items[i] for i in self.search_index.search(query, limit)]
+
+    def recent(self) -> list[HistoryItem]:
+        """Get items, most recent first."""
+        return [self.items[item_id] for _, item_id in reversed(self.order)]
+
+    def window(self, start: int, count: int) -> list[HistoryItem]:
+        """Get ``count`` items from position ``start``, most recent first."""
+        stop = max(len(self.order) - start, 0)
+        first = max(stop - count, 0)
+        return [self.items[item_id] for _, item_id in reversed(self.order[first:stop])]
+
+    def encode(self) -> str:
+        """Serialize the index, encoding only the items added since the last save."""
+
+        def record(item_id: str) -> dict:
+            cached = self.records.get(item_id)
+            if cached is None:
+                cached = self.records[item_id] = self.items[item_id].dict()
+            return cached
+
+        self.source = self.writer.write([item_id for _, item_id in self.order], record)
+        return self.source
+
+
+_indexes: OrderedDict[str, HistoryIndex] = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def cached_index(token: str, source: str) -> HistoryIndex:
+    """Get a session's decoded history, decoding it only when it changed.
+
+    Indexes live in a bounded per-process cache rather than in the state,
+    so they are never serialized with it; a session whose index was
+    evicted, or that moved to another worker, decodes its history again.
+    """
+    with _indexes_lock:
+        index = _indexes.get(token)
+        if index is not None and index.source == source:
+            _indexes.move_to_end(token)
+            return index
+    index = HistoryIndex.decode(source)
+    remember_index(token, index)
+    return index
+
+
+def remember_index(token: str, index: Optional[HistoryIndex]):
+    """Cache a session's index after it was saved, or forget it with None."""
+    with _indexes_lock:
+        if index is None:
+            _indexes.pop(token, None)
+            return
+        _indexes[token] = index
+        _indexes.move_to_end(token)
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+
+
+class HistoryState(rx.State):
+    """State for managing history.
+
+    History lives in LocalStorage by default. With the SQLite backend
+    enabled (see app/utils/history_store.py) it is stored server-side per
+    owner and pages of summaries are loaded as the sidebar scrolls.
+
+    Either way the sidebar only receives summaries of the visible window
+    of items plus a small overscan; payloads are loaded on click.
+    """
+
+    history_data: str = rx.LocalStorage(history_codec.EMPTY, name="prompt_history")
+    history_owner: str = rx.LocalStorage("", name="history_owner")
+    history_window_start: int = 0
+    search_query: str = ""
+    search_results: list[HistoryItem] = []
+    _history_page: list[HistoryItem] = []
+    _has_more_history: bool = False
+
+    def _get_index(self) -> HistoryIndex:
+        """Get the history index, decoding history_data only when it changed."""
+        return cached_index(self.router.session.client_token, self.history_data)
+
+    def _owner(self) -> str:
+        """Get the id this browser's history is stored under."""
+        if not self.history_owner:
+            import uuid
+
+            self.history_owner = str(uuid.uuid4())
+        return self.history_owner
 
     @rx.var
-    def recent_history(self) -> list[HistoryItem]:
-        """Get most recent items first."""
-        return sorted(self.history, key=lambda x: x.timestamp, reverse=True)
+    def visible_history(self) -> list[HistoryItem]:
+        """Get summaries of the items in the visible window, most recent first."""
+        start = self.history_window_start
+        count = HISTORY_WINDOW + 2 * HISTORY_OVERSCAN
+        if get_history_store() is not None:
+            items = self._history_page[start : start + count]
+        else:
+            items = self._get_index().window(start, count)
+        return [summarize(item) for item in items]
+
+    @rx.var
+    def history_count(self) -> int:
+        """Get the number of items the sidebar can scroll through."""
+        if get_history_store() is not None:
+            return len(self._history_page)
+        return len(self._get_index())
 
     @rx.var
     def has_history(self) -> bool:
         """Check if history is not empty."""
-        return len(self.history) > 0
-
-    def _save_history(self, items: list[HistoryItem]):
-        """Save list to JSON string."""
-        if len(items) > 50:
-            items = sorted(items, key=lambda x: x.timestamp, reverse=True)[:50]
-        self.history_json = json.dumps(
-            [
-                {
-                    "id": item.id,
-                    "type": item.type,
-                    "title": item.title,
-                    "content": item.content,
-                    "timestamp": item.timestamp,
-                    "formatted_date": item.formatted_date,
-                    "metadata": item.metadata,
-                }
-                for item in items
-            ]
+        if get_history_store() is not None:
+            return len(self._history_page) > 0
+        return len(self._get_index()) > 0
+
+    def _save_history(self, index: HistoryIndex):
+        """Save the index back to the encoded string."""
+        index.trim(MAX_HISTORY_ITEMS)
+        self.history_data = index.encode()
+        remember_index(self.router.session.client_token, index)
+        metrics.record("history", saves=1, bytes_written=len(self.history_data))
+
+    def _get_item(self, item_id: str) -> Optional[HistoryItem]:
+        """Get a full history item, loading its payload from the store."""
+        store = get_history_store()
+        if store is None:
+            return self._get_index().items.get(item_id)
+        data = store.get(self._owner(), item_id)
+        return HistoryItem(**data) if data is not None else None
+
+    @rx.event
+    def load_history_page(self):
+        """Load the first page of history from the server-side store."""
+        store = get_history_store()
+        if store is None:
+            return
+        owner = self._owner()
+        if self.history_data != history_codec.EMPTY:
+            # Move history kept in LocalStorage before the store was enabled.
+            for item in self._get_index().recent():
+                store.add(owner, item.dict())
+            self.history_data = history_codec.EMPTY
+            remember_index(self.router.session.client_token, None)
+        rows = store.page(owner, HISTORY_PAGE_SIZE + 1)
+        self._has_more_history = len(rows) > HISTORY_PAGE_SIZE
+        self._history_page = [
+            HistoryItem(content="", **row) for row in rows[:HISTORY_PAGE_SIZE]
+        ]
+        self.history_window_start = 0
+
+    def _load_more_history(self):
+        """Load the next page of history, continuing after the last item."""
+        store = get_history_store()
+        if store is None or not self._history_page:
+            return
+        last = self._history_page[-1]
+        rows = store.page(
+            self._owner(), HISTORY_PAGE_SIZE + 1, before=(last.timestamp, last.id)
         )
+        self._has_more_history = len(rows) > HISTORY_PAGE_SIZE
+        self._history_page.extend(
+            HistoryItem(content="", **row) for row in rows[:HISTORY_PAGE_SIZE]
+        )
+
+    @rx.event
+    def scroll_history(self, scroll_top: int):
+        """Move the rendered window to follow the sidebar scroll position."""
+        first_visible = int(scroll_top) // HISTORY_ITEM_HEIGHT
+        start = max(first_visible - HISTORY_OVERSCAN, 0)
+        if start != self.history_window_start:
+            self.history_window_start = start
+        end = start + HISTORY_WINDOW + 2 * HISTORY_OVERSCAN
+        if self._has_more_history and end >= len(self._history_page):
+            self._load_more_history()
 
     @rx.event
-    def add_item(self, type: str, title: str, content: str, metadata: dict[str, str]):
+    def search_history(self, query: str):
+        """Search history titles, contents and metadata."""
+        self.search_query = query
+        if not query.strip():
+            self.search_results = []
+            return
+        store = get_history_store()
+        if store is not None:
+            results = [
+                HistoryItem(content="", **row)
+                for row in store.search(self._owner(), query, SEARCH_LIMIT)
+            ]
+        else:
+            results = [
+                summarize(item) for item in self._get_index().search(query, SEARCH_LIMIT)
+            ]
+        self.search_results = results
+
+    @rx.event
+    def add_item(self, type: str, title: str, content: str, metadata: HistoryMetadata):
         """Add a new item to history."""
         import uuid
 
@@ -82,21 +423,144 @@ class HistoryState(rx.State):
             content=content,
             timestamp=ts,
             formatted_date=formatted,
-            metadata=metadata,
+            metadata=metadata.dict(),
         )
-        current = self.history
-        current.append(new_item)
-        self._save_history(current)
+        store = get_history_store()
+        if store is not None:
+            store.add(self._owner(), new_item.dict())
+            self._history_page.insert(0, summarize(new_item))
+            return
+        index = self._get_index()
+        index.add(new_item)
+        self._save_history(index)
+
+    @rx.event
+    async def open_item(self, item_id: str):
+        """Restore a history item into the generator or optimizer."""
+        from app.states.base import BaseState
+        from app.states.generator import GeneratorState
+        from app.states.optimizer import OptimizerState
+
+        item = self._get_item(item_id)
+        if item is None:
+            yield rx.toast("History item not found", position="bottom-right")
+            return
+        try:
+            metadata = item.typed_metadata()
+        except Exception as e:
+            logging.exception(f"Invalid metadata in history item {item_id}: {e}")
+            yield rx.toast("History item could not be restored", position="bottom-right")
+            return
+        if item.type == "generated":
+            target = await self.get_state(GeneratorState)
+            path, message = "/generator", "Restored prompt from history"
+        else:
+            target = await self.get_state(OptimizerState)
+            path, message = "/optimizer", "Restored optimization from history"
+        followup = target._restore(metadata, item.content)
+        base = await self.get_state(BaseState)
+        base.show_history = False
+        base.show_search = False
+        yield rx.redirect(path)
+        yield rx.toast(message, position="bottom-right")
+        if followup is not None:
+            yield followup
 
     @rx.event
     def delete_item(self, item_id: str):
         """Delete a specific item."""
-        current = [item for item in self.history if item.id != item_id]
-        self._save_history(current)
+        store = get_history_store()
+        if store is not None:
+            store.delete(self._owner(), item_id)
+            self._history_page = [i for i in self._history_page if i.id != item_id]
+        else:
+            index = self._get_index()
+            index.remove(item_id)
+            self._save_history(index)
         yield rx.toast("Item removed from history", position="bottom-right")
 
     @rx.event
     def clear_history(self):
         """Clear all history."""
-        self.history_json = "[]"
-        yield rx.toast("History cleared", position="bottom-right")
\ No newline at end of file
+        store = get_history_store()
+        if store is not None:
+            store.clear(self._owner())
+            self._history_page = []
+            self._has_more_history = False
+        self.history_data = history_codec.EMPTY
+        remember_index(self.router.session.client_token, None)
+        self.history_window_start = 0
+        yield rx.toast("History cleared", position="bottom-right")
+
+
+def benchmark(count: int) -> dict[str, float]:
+    """Time the HistoryIndex operations on ``count`` synthetic items, in ms."""
+    import random
+
+    from app.utils.templates import render_prompt
+
+    rng = random.Random(0)
+    topics = ["launch", "onboarding", "migration", "pricing", "support", "hiring"]
+
+    def item(i: int) -> HistoryItem:
+        topic = f"{rng.choice(topics)} plan {i}"
+        content = render_prompt(
+            {"purpose": "Content Creation", "describe": topic, "tone": "Friendly"}
+        )
+        return HistoryItem(
+            id=f"{i:08d}",
+            type="generated",
+            title=topic,
+            content=content,
+            timestamp=1_700_000_000 + i,
+            metadata=GeneratedMetadata(
+                task_type="Content Creation",
+                topic=topic,
+                tone="Friendly",
+                format="Paragraph",
+                length="Medium",
+                constraints="",
+            ).dict(),
+        )
+
+    index = HistoryIndex.decode(history_codec.EMPTY)
+    for i in range(count):
+        index.add(item(i))
+    source = index.encode()
+
+    def timed(run: Callable[[], Any], runs: int = 10) -> float:
+        start = time.perf_counter()
+        for _ in range(runs):
+            run()
+        return (time.perf_counter() - start) / runs * 1000
+
+    adds = iter(range(count, count + 1000))
+
+    def add_and_save():
+        index.add(item(next(adds)))
+        index.encode()
+
+    removes = iter([item_id for _, item_id in index.order])
+
+    def remove_and_save():
+        index.remove(next(removes))
+        index.encode()
+
+    return {
+        "items": count,
+        "decode_ms": timed(lambda: HistoryIndex.decode(source), runs=3),
+        "add_save_ms": timed(add_and_save),
+        "remove_save_ms": timed(remove_and_save),
+        "search_ms": timed(lambda: index.search("migration plan", SEARCH_LIMIT)),
+        "window_ms": timed(lambda: index.window(count // 2, HISTORY_WINDOW)),
+    }
+
+
+if __name__ == "__main__":
+    for count in (50, 500, 5000):
+        row = benchmark(count)
+        print(
+            f"items={row['items']:<5} decode={row['decode_ms']:.2f}ms "
+            f"add+save={row['add_save_ms']:.2f}ms remove+save={row['remove_save_ms']:.2f}ms "
+            f"search={row['search_ms']:.2f}ms window={row['window_ms']:.3f}ms"
+        )
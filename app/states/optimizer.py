@@ -1,16 +1,82 @@
 import reflex as rx
+from typing import ClassVar
 import asyncio
-import random
+import codecs
 import logging
+import time
+from app.states.history import OptimizedMetadata
+from app.states.sync import TextSyncState
+from app.utils import large_input
+from app.utils.compress import compress
+from app.utils.diff import DiffSegment, diff_texts
+from app.utils.live_scoring import score_live
+from app.utils.llm import BackendError, accumulate, get_backend, optimization_messages
+from app.utils.response_cache import CachingBackend, cached
+from app.utils.rewrite import rewrite_prompt
+from app.utils.runs import RunTracker
+from app.utils import scoring
+from app.utils.scoring import PromptScores
+from app.utils.tokens import (
+    DEFAULT_OUTPUT_TOKENS,
+    CostChange,
+    compare_estimates,
+    count_ref_encodings,
+    estimate_all,
+)
 
+_optimize_runs = RunTracker("optimize")
+_live_score_runs = RunTracker("live_score")
 
-class OptimizerState(rx.State):
+
+def parse_budget(value: str) -> int:
+    """Read a token budget from its input; 0 (no budget) if it is not a positive number."""
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        return 0
+
+
+def optimize(
+    original: str, original_ref: str, level: str, goals: list[str], budget: int = 0
+) -> tuple[str, str, list[str], PromptScores]:
+    """Rewrite a prompt, compress it to the token budget if one is set, and score the result.
+
+    All steps are cached (by stage, by budget and by prompt), so re-running
+    with one goal changed only redoes the passes whose input changed. In
+    large-input mode the prompt is read from ``original_ref``, and a large
+    result is stored out of band too: only its preview is returned, with
+    its reference.
+    """
+    if original_ref:
+        original = large_input.get(original_ref)
+    optimized, changes = rewrite_prompt(original, level, goals)
+    if budget:
+        compression = compress(optimized, budget)
+        optimized = compression.text
+        changes = [*changes, compression.describe()]
+    scores = scoring.score_prompt(optimized)
+    result_ref = ""
+    if large_input.is_large(optimized):
+        result_ref = large_input.put(large_input.chunked(optimized))
+        optimized = large_input.preview(optimized)
+    return optimized, result_ref, changes, scores
+
+
+class OptimizerState(TextSyncState, rx.State):
     """State for the prompt optimizer page."""
 
+    synced_fields: ClassVar[tuple[str, ...]] = ("original_prompt",)
+
     original_prompt: str = ""
     optimized_prompt: str = ""
+    # In large-input mode the prompts above are previews and these reference
+    # the full bodies (see app/utils/large_input.py).
+    original_ref: str = ""
+    result_ref: str = ""
     optimization_level: str = "Moderate"
     selected_goals: list[str] = ["Clarity", "Structure"]
+    # Compression mode: the result is shrunk to fit this many tokens.
+    token_budget: str = ""
     is_optimizing: bool = False
     explanation: list[str] = []
     clarity_score: int = 0
@@ -18,16 +84,63 @@ class OptimizerState(rx.State):
     structure_score: int = 0
     depth_score: int = 0
     overall_score: int = 0
-    goal_options: list[str] = ["Clarity", "Conciseness", "Structure", "Depth"]
-    level_options: list[str] = ["Light", "Moderate", "Aggressive"]
+    # The model that wrote the shown result; empty for the built-in rewrite.
+    result_model: str = ""
+    live_scores: PromptScores = PromptScores(
+        clarity=0, conciseness=0, structure=0, depth=0, overall=0
+    )
+    show_diff: bool = False
+    diff_segments: list[DiffSegment] = []
+    # The original the shown result was optimized from; the textarea may
+    # have been edited since.
+    _optimized_from: str = ""
+    # Token counts by encoding of the large bodies behind the shown prompts,
+    # filled in by count_refs.
+    _ref_tokens: dict[str, dict[str, int]] = {}
 
-    @rx.event
-    def set_original_prompt(self, value: str):
-        self.original_prompt = value
+    @rx.var
+    def original_length(self) -> int:
+        if self.original_ref:
+            return large_input.ref_size(self.original_ref)
+        return len(self.original_prompt)
+
+    @rx.var
+    def cost_changes(self) -> list[CostChange]:
+        """Token counts and costs per model of the original and the result.
+
+        Paragraph counts are cached (see app/utils/tokens.py), so this is
+        cheap to recompute on every edit and while a result streams in.
+        Large bodies are only read by count_refs; until their counts are
+        in, there are no estimates.
+        """
+        if not (self.original_prompt or self.optimized_prompt):
+            return []
+        estimates = []
+        for text, ref in (
+            (self.original_prompt, self.original_ref),
+            (self.optimized_prompt, self.result_ref),
+        ):
+            if ref and ref not in self._ref_tokens:
+                return []
+            estimates.append(
+                estimate_all(text, DEFAULT_OUTPUT_TOKENS, self._ref_tokens.get(ref))
+            )
+        return compare_estimates(*estimates)
 
     @rx.event
     def set_optimization_level(self, value: str):
         self.optimization_level = value
+        return OptimizerState.refresh_optimization
+
+    @rx.event
+    def set_token_budget(self, value: str):
+        self.token_budget = value
+
+    @rx.event
+    def apply_token_budget(self, value: str):
+        """Re-run the optimizer once a new token budget has been entered."""
+        self.token_budget = value
+        return OptimizerState.refresh_optimization
 
     @rx.event
     def toggle_goal(self, goal: str, checked: bool):
@@ -36,22 +149,136 @@ class OptimizerState(rx.State):
                 self.selected_goals.append(goal)
         elif goal in self.selected_goals:
             self.selected_goals.remove(goal)
+        return OptimizerState.refresh_optimization
 
     @rx.event
     def clear_form(self):
         self.original_prompt = ""
         self.optimized_prompt = ""
+        self.original_ref = ""
+        self.result_ref = ""
+        self.result_model = ""
+        self._optimized_from = ""
+        self.diff_segments = []
         self.explanation = []
         self.clarity_score = 0
         self.conciseness_score = 0
         self.structure_score = 0
         self.depth_score = 0
         self.overall_score = 0
+        self.live_scores = score_live(self.router.session.client_token, "")
 
-    @rx.event
+    async def _publish(
+        self,
+        original: str,
+        original_ref: str,
+        level: str,
+        goals: list[str],
+        optimized: str,
+        result_ref: str,
+        changes: list[str],
+        scores: PromptScores,
+        record: bool,
+        model: str = "",
+        budget: int = 0,
+    ):
+        """Show an optimization result, adding it to history if requested.
+
+        Must be called with the state lock held.
+        """
+        from app.states.history import HistoryState
+
+        self.optimized_prompt = optimized
+        self.result_ref = result_ref
+        self.result_model = model
+        self._optimized_from = original
+        self.diff_segments = []
+        self.explanation = changes
+        self._set_scores(scores)
+        self.is_optimizing = False
+        if not record:
+            return
+        hist = await self.get_state(HistoryState)
+        preview = original[:30] + "..." if len(original) > 30 else original
+        hist.add_item(
+            type="optimized",
+            title=f"Optimized: {preview}",
+            content=optimized,
+            metadata=OptimizedMetadata(
+                original_prompt=original,
+                original_ref=original_ref,
+                result_ref=result_ref,
+                model=model,
+                token_budget=budget,
+                optimization_level=level,
+                selected_goals=goals,
+                explanation=changes,
+                scores=scores,
+            ),
+        )
+
+    async def _stream_model(
+        self, backend: CachingBackend, original: str, level: str, goals: list[str]
+    ) -> tuple[str, str, list[str], PromptScores]:
+        """Stream a model's rewrite into the result card, then score it.
+
+        Identical requests are answered from the response cache, or share
+        a call already in flight (see app/utils/response_cache.py).
+        """
+        messages = optimization_messages(original, level, goals)
+        async with self:
+            self.result_model = backend.config.model
+        optimized = ""
+        async for optimized in accumulate(backend.stream(messages)):
+            async with self:
+                self.optimized_prompt = optimized
+        if not optimized.strip():
+            raise BackendError(f"{backend.config.name}: empty reply")
+        scores = await asyncio.to_thread(scoring.score_prompt, optimized)
+        usage = backend.usage
+        if backend.cached:
+            changes = [
+                f"Reused an earlier rewrite by {backend.config.model}, saving "
+                f"{usage.prompt_tokens + usage.completion_tokens} tokens."
+            ]
+        else:
+            changes = [
+                f"Rewritten by {backend.config.model} ({usage.prompt_tokens} prompt "
+                f"and {usage.completion_tokens} completion tokens)."
+            ]
+        return optimized, "", changes, scores
+
+    @rx.event(background=True)
     async def optimize_prompt(self):
-        """Simulate the optimization process."""
-        if not self.original_prompt:
+        """Optimize the prompt and add the result to history.
+
+        Runs as a background task so the session lock is only held to read
+        the inputs and to publish the result; the rewrite itself runs in a
+        worker thread so it never stalls the event loop. With a model
+        backend configured (see app/utils/llm.py) the model rewrites the
+        prompt instead and its reply is streamed into the result as it
+        arrives; if the backend fails, the built-in rewrite is used.
+        Large-input mode and compression mode (a token budget is set)
+        always use the built-in rewrite.
+        """
+        from app.states.settings import SettingsState
+
+        started = time.perf_counter()
+        async with self:
+            token = self.router.session.client_token
+            original = self.original_prompt
+            original_ref = self.original_ref
+            level = self.optimization_level
+            goals = list(self.selected_goals)
+            budget = parse_budget(self.token_budget)
+            valid_budget = budget > 0 or not self.token_budget.strip()
+            if original and valid_budget:
+                self.is_optimizing = True
+                self.optimized_prompt = ""
+                self.result_model = ""
+                settings = await self.get_state(SettingsState)
+                api_key = settings.api_key
+        if not original:
             yield rx.toast(
                 "Please enter a prompt to optimize.",
                 title="Validation Error",
@@ -63,64 +290,80 @@ class OptimizerState(rx.State):
                 },
             )
             return
-        self.is_optimizing = True
-        self.optimized_prompt = ""
-        yield
-        await asyncio.sleep(1.5)
-        prefix = ""
-        suffix = ""
-        changes = []
-        if self.optimization_level == "Light":
-            prefix = "[Refined] "
-            changes.append("Corrected minor grammatical inconsistencies.")
-        elif self.optimization_level == "Moderate":
-            prefix = "[Optimized] "
-            suffix = """
-
-Ensure the output strictly follows these guidelines."""
-            changes.append("Enhanced vocabulary for better precision.")
-            changes.append("Clarified instruction intent.")
-        else:
-            prefix = "[Expert-Level Rewrite] "
-            suffix = """
-
-Step-by-step reasoning is required before the final answer."""
-            changes.append("Completely restructured for maximum logical flow.")
-            changes.append("Added strict constraints to prevent hallucinations.")
-        modified_body = self.original_prompt
-        if "Clarity" in self.selected_goals:
-            changes.append("Removed ambiguous terms to improve clarity.")
-        if "Conciseness" in self.selected_goals:
-            changes.append("Reduced word count by removing redundancy.")
-        if "Structure" in self.selected_goals:
-            modified_body = f"# Context\n{modified_body}\n\n# Instructions\n- Follow the guidelines below..."
-            changes.append("Applied markdown formatting for better structure.")
-        if "Depth" in self.selected_goals:
-            changes.append("Expanded context requirements for deeper analysis.")
-        self.optimized_prompt = f"{prefix}\n{modified_body}{suffix}"
-        self.explanation = changes
-        self.score_prompt()
-        from app.states.history import HistoryState
-
-        hist = await self.get_state(HistoryState)
-        preview = (
-            self.original_prompt[:30] + "..."
-            if len(self.original_prompt) > 30
-            else self.original_prompt
-        )
-        hist.add_item(
-            type="optimized",
-            title=f"Optimized: {preview}",
-            content=self.optimized_prompt,
-            metadata={
-                "original_prompt": self.original_prompt,
-                "optimization_level": self.optimization_level,
-                "selected_goals": ",".join(self.selected_goals),
-                "explanation": "|".join(self.explanation),
-                "scores": f"{self.clarity_score},{self.conciseness_score},{self.structure_score},{self.depth_score}",
-            },
-        )
-        self.is_optimizing = False
+        if not valid_budget:
+            yield rx.toast(
+                "The token budget must be a positive whole number.",
+                title="Validation Error",
+                position="bottom-right",
+                style={
+                    "background-color": "#fee2e2",
+                    "color": "#991b1b",
+                    "border": "1px solid #f87171",
+                },
+            )
+            return
+        run_id = _optimize_runs.begin(token)
+        model = ""
+        try:
+            backend = None if original_ref or budget else get_backend(api_key)
+            if backend is not None:
+                backend = cached(backend)
+            result = None
+            if backend is not None:
+                try:
+                    result = await self._stream_model(backend, original, level, goals)
+                    model = backend.config.model
+                except BackendError as e:
+                    logging.warning(f"Model backend failed, using the built-in rewrite: {e}")
+                    async with self:
+                        self.optimized_prompt = ""
+                        self.result_model = ""
+                    yield rx.toast(
+                        "The model backend is unavailable; used the built-in optimizer.",
+                        title="Model Error",
+                        position="bottom-right",
+                        style={
+                            "background-color": "#fee2e2",
+                            "color": "#991b1b",
+                            "border": "1px solid #f87171",
+                        },
+                    )
+            if result is None:
+                result = await asyncio.to_thread(
+                    optimize, original, original_ref, level, goals, budget
+                )
+            if not _optimize_runs.publishing(token, run_id):
+                _optimize_runs.drop(started)
+                return
+            optimized, result_ref, changes, scores = result
+            async with self:
+                await self._publish(
+                    original, original_ref, level, goals, optimized, result_ref, changes, scores,
+                    record=True, model=model, budget=budget,
+                )
+        except asyncio.CancelledError:
+            _optimize_runs.drop(started, cancelled=True)
+            raise
+        except Exception as e:
+            logging.exception(f"Optimizing failed: {e}")
+            if _optimize_runs.fail(token, run_id, started):
+                async with self:
+                    self.is_optimizing = False
+                    self.result_model = ""
+            yield rx.toast(
+                "The prompt could not be optimized. Please try again.",
+                title="Error",
+                position="bottom-right",
+                style={
+                    "background-color": "#fee2e2",
+                    "color": "#991b1b",
+                    "border": "1px solid #f87171",
+                },
+            )
+            return
+        _optimize_runs.end(token, run_id)
+        yield OptimizerState.load_diff
+        yield OptimizerState.count_refs
         yield rx.toast(
             "Prompt optimized successfully!",
             title="Success",
@@ -132,30 +375,259 @@ Step-by-step reasoning is required before the final answer."""
             },
         )
 
+    @rx.event(background=True)
+    async def refresh_optimization(self):
+        """Re-run the optimizer after the level, a goal or the token budget changed.
+
+        Only runs when there is a result of the built-in rewrite to update,
+        or a token budget that calls for one; model results are only
+        requested by clicking Optimize. Unchanged
+        passes come from the stage cache, so this is near-instant. The
+        result is added to history only if it supersedes an Optimize click
+        still running.
+        """
+        started = time.perf_counter()
+        async with self:
+            token = self.router.session.client_token
+            original = self.original_prompt
+            original_ref = self.original_ref
+            level = self.optimization_level
+            goals = list(self.selected_goals)
+            budget = parse_budget(self.token_budget)
+            valid_budget = budget > 0 or not self.token_budget.strip()
+            record = self.is_optimizing
+            has_result = bool(self.optimized_prompt)
+            # A model result, shown or still streaming.
+            model_result = bool(self.result_model)
+        if not valid_budget:
+            return rx.toast(
+                "The token budget must be a positive whole number.",
+                title="Validation Error",
+                position="bottom-right",
+                style={
+                    "background-color": "#fee2e2",
+                    "color": "#991b1b",
+                    "border": "1px solid #f87171",
+                },
+            )
+        if not original or not (has_result or record) or (model_result and not budget):
+            return
+        run_id = _optimize_runs.begin(token)
+        try:
+            result = await asyncio.to_thread(
+                optimize, original, original_ref, level, goals, budget
+            )
+            if not _optimize_runs.publishing(token, run_id):
+                _optimize_runs.drop(started)
+                return
+            optimized, result_ref, changes, scores = result
+            async with self:
+                await self._publish(
+                    original, original_ref, level, goals, optimized, result_ref, changes, scores,
+                    record=record, budget=budget,
+                )
+        except asyncio.CancelledError:
+            _optimize_runs.drop(started, cancelled=True)
+            raise
+        except Exception as e:
+            logging.exception(f"Re-optimizing failed: {e}")
+            if _optimize_runs.fail(token, run_id, started):
+                async with self:
+                    self.is_optimizing = False
+            return rx.toast(
+                "The prompt could not be optimized. Please try again.",
+                title="Error",
+                position="bottom-right",
+                style={
+                    "background-color": "#fee2e2",
+                    "color": "#991b1b",
+                    "border": "1px solid #f87171",
+                },
+            )
+        _optimize_runs.end(token, run_id)
+        return [OptimizerState.load_diff, OptimizerState.count_refs]
+
     @rx.event
-    def score_prompt(self):
-        """Generate mock scores."""
-        base = 70 if self.optimization_level == "Light" else 80
-        if self.optimization_level == "Aggressive":
-            base = 85
-        self.clarity_score = min(100, base + random.randint(5, 15))
-        self.conciseness_score = min(100, base + random.randint(-5, 10))
-        self.structure_score = min(100, base + random.randint(0, 15))
-        self.depth_score = min(100, base + random.randint(-5, 15))
-        self.overall_score = int(
-            (
-                self.clarity_score
-                + self.conciseness_score
-                + self.structure_score
-                + self.depth_score
+    def toggle_diff(self):
+        """Switch the result card between the result and the changes."""
+        self.show_diff = not self.show_diff
+        return OptimizerState.load_diff
+
+    @rx.event(background=True)
+    async def load_diff(self):
+        """Diff the shown result against its original if the diff is open.
+
+        Diffing 100 KB prompts takes a few hundred milliseconds, so it runs
+        in a worker thread outside the session lock. Diffs are cached per
+        original and result pair, so reopening a history item is instant.
+        Large-input mode has no diff view.
+        """
+        async with self:
+            if not self.show_diff or self.diff_segments or not self.optimized_prompt:
+                return
+            if self.is_optimizing:
+                return
+            if self.original_ref or self.result_ref:
+                return
+            original = self._optimized_from
+            optimized = self.optimized_prompt
+        segments = await asyncio.to_thread(diff_texts, original, optimized)
+        async with self:
+            if self._optimized_from == original and self.optimized_prompt == optimized:
+                self.diff_segments = segments
+
+    def _set_scores(self, scores: PromptScores):
+        """Show the given scores."""
+        self.clarity_score = scores.clarity
+        self.conciseness_score = scores.conciseness
+        self.structure_score = scores.structure
+        self.depth_score = scores.depth
+        self.overall_score = scores.overall
+
+    def _text_synced(self, field: str):
+        if field != "original_prompt":
+            return None
+        # The textarea is the source of the prompt again.
+        self.original_ref = ""
+        if large_input.is_large(self.original_prompt):
+            return OptimizerState.offload_original
+        return OptimizerState.update_live_scores
+
+    @rx.event(background=True)
+    async def offload_original(self):
+        """Move a large original prompt out of the session state.
+
+        The body is stored and scored chunk by chunk in a worker thread;
+        the state keeps a preview and the reference.
+        """
+        async with self:
+            original = self.original_prompt
+            if not large_input.is_large(original):
+                return
+        ref, scores = await asyncio.to_thread(large_input.offload, original)
+        async with self:
+            if self.original_prompt != original:
+                return
+            self.original_prompt = large_input.preview(original)
+            self.original_ref = ref
+            self.live_scores = scores
+        return OptimizerState.count_refs
+
+    @rx.event
+    async def upload_original(self, files: list[rx.UploadFile]):
+        """Load the original prompt from an uploaded text file.
+
+        The file is decoded in chunks and, if it is large, stored out of band
+        without ever being joined, so it never passes through the textarea.
+        """
+        for file in files[:1]:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            parts: list[str] = []
+            length = 0
+            while block := await file.read(large_input.CHUNK_BYTES):
+                parts.append(decoder.decode(block))
+                length += len(parts[-1])
+                if length > self.max_text_chars:
+                    return self._reject_text("original_prompt", length)
+            parts.append(decoder.decode(b"", final=True))
+            if length + len(parts[-1]) > large_input.LARGE_INPUT_CHARS:
+                self.original_ref = await asyncio.to_thread(large_input.put, parts)
+                self.original_prompt = large_input.preview(parts[0])
+            else:
+                self.original_ref = ""
+                self.original_prompt = "".join(parts)
+            return OptimizerState.update_live_scores
+
+    @rx.event(background=True)
+    async def update_live_scores(self):
+        """Re-score the original prompt after an edit was synced.
+
+        The textarea debounces edits, and scoring runs in a worker thread
+        outside the session lock, re-summarizing only the paragraphs the
+        edit touched (see app/utils/live_scoring.py).
+        """
+        started = time.perf_counter()
+        async with self:
+            token = self.router.session.client_token
+            original = self.original_prompt
+            original_ref = self.original_ref
+            has_refs = bool(original_ref or self.result_ref)
+        run_id = _live_score_runs.begin(token)
+        try:
+            if original_ref:
+                scores = await asyncio.to_thread(large_input.score_ref, original_ref)
+            else:
+                scores = await asyncio.to_thread(score_live, token, original)
+        except asyncio.CancelledError:
+            _live_score_runs.drop(started, cancelled=True)
+            raise
+        except Exception as e:
+            logging.exception(f"Live scoring failed: {e}")
+            _live_score_runs.fail(token, run_id, started)
+            return rx.toast(
+                "The live scores could not be updated.",
+                title="Error",
+                position="bottom-right",
+                style={
+                    "background-color": "#fee2e2",
+                    "color": "#991b1b",
+                    "border": "1px solid #f87171",
+                },
             )
-            / 4
-        )
+        if not _live_score_runs.publishing(token, run_id):
+            _live_score_runs.drop(started)
+            return
+        async with self:
+            self.live_scores = scores
+        _live_score_runs.end(token, run_id)
+        if has_refs:
+            return OptimizerState.count_refs
+
+    @rx.event(background=True)
+    async def count_refs(self):
+        """Count the tokens of the large bodies behind the shown prompts.
+
+        The bodies are read from the blob store, so they are counted in a
+        worker thread rather than in cost_changes.
+        """
+        async with self:
+            refs = [
+                ref
+                for ref in (self.original_ref, self.result_ref)
+                if ref and ref not in self._ref_tokens
+            ]
+        if not refs:
+            return
+        counts = {}
+        try:
+            for ref in refs:
+                counts[ref] = await asyncio.to_thread(count_ref_encodings, ref)
+        except Exception as e:
+            logging.exception(f"Counting large prompt tokens failed: {e}")
+        async with self:
+            shown = (self.original_ref, self.result_ref)
+            # Only keep the counts of the shown bodies.
+            self._ref_tokens = {
+                ref: ref_counts
+                for ref, ref_counts in {**self._ref_tokens, **counts}.items()
+                if ref in shown
+            }
+
+    @rx.event
+    def score_prompt(self):
+        """Score the optimized prompt (see app/utils/scoring.py)."""
+        self._set_scores(scoring.score_prompt(self._result_text()))
+
+    def _result_text(self) -> str:
+        """Get the full optimized prompt, reading it back in large-input mode."""
+        if self.result_ref:
+            return large_input.get(self.result_ref)
+        return self.optimized_prompt
 
     @rx.event
     def copy_result(self):
         """Copy the optimized prompt to clipboard."""
-        yield rx.set_clipboard(self.optimized_prompt)
+        yield rx.set_clipboard(self._result_text())
         yield rx.toast(
             "Copied to clipboard!",
             position="bottom-right",
@@ -166,29 +638,27 @@ Step-by-step reasoning is required before the final answer."""
             },
         )
 
-    @rx.event
-    async def load_from_history(self, metadata: dict, content: str):
-        """Load an optimized prompt from history."""
-        self.original_prompt = metadata.get("original_prompt", "")
-        self.optimization_level = metadata.get("optimization_level", "Moderate")
-        self.optimized_prompt = content
-        goals_str = metadata.get("selected_goals", "")
-        self.selected_goals = goals_str.split(",") if goals_str else []
-        expl_str = metadata.get("explanation", "")
-        self.explanation = expl_str.split("|") if expl_str else []
-        scores_str = metadata.get("scores", "0,0,0,0")
-        try:
-            c, co, s, d = map(int, scores_str.split(","))
-            self.clarity_score = c
-            self.conciseness_score = co
-            self.structure_score = s
-            self.depth_score = d
-            self.overall_score = int((c + co + s + d) / 4)
-        except Exception as e:
-            logging.exception(f"Error parsing scores from history: {e}")
-        from app.states.base import BaseState
+    def _restore(self, metadata: OptimizedMetadata, content: str):
+        """Restore the inputs, result and scores from a history item.
 
-        base = await self.get_state(BaseState)
-        base.show_history = False
-        yield rx.redirect("/optimizer")
-        yield rx.toast("Restored optimization from history", position="bottom-right")
\ No newline at end of file
+        Returns the event that re-scores the restored original.
+        """
+        refs = [metadata.original_ref, metadata.result_ref]
+        for i, ref in enumerate(refs):
+            if ref and not large_input.exists(ref):
+                # Stored on another server or cleaned up; keep the preview.
+                logging.warning(f"Large prompt body {ref[:60]!r} is missing")
+                refs[i] = ""
+        self.original_prompt = metadata.original_prompt
+        self.original_ref, self.result_ref = refs
+        self.result_model = metadata.model
+        self.optimization_level = metadata.optimization_level
+        self.token_budget = str(metadata.token_budget) if metadata.token_budget else ""
+        self.optimized_prompt = content
+        self._optimized_from = metadata.original_prompt
+        self.diff_segments = []
+        self.show_diff = False
+        self.selected_goals = list(metadata.selected_goals)
+        self.explanation = list(metadata.explanation)
+        self._set_scores(metadata.scores)
+        return OptimizerState.update_live_scores
\ No newline at end of file
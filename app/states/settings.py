@@ -10,6 +10,7 @@ class SettingsState(rx.State):
     default_tone: str = rx.LocalStorage("Professional", name="def_tone")
     default_format: str = rx.LocalStorage("Markdown", name="def_format")
     default_length: str = rx.LocalStorage("Medium (100-300 words)", name="def_length")
+    template_team: str = rx.LocalStorage("default", name="template_team")
 
     @rx.event
     def set_api_key(self, value: str):
@@ -34,4 +35,5 @@ class SettingsState(rx.State):
         self.default_tone = "Professional"
         self.default_format = "Markdown"
         self.default_length = "Medium (100-300 words)"
+        self.template_team = "default"
         yield rx.toast("Defaults reset", position="bottom-right")
\ No newline at end of file
@@ -0,0 +1,96 @@
+import reflex as rx
+import logging
+from typing import ClassVar
+from app.utils import metrics
+from app.utils.large_input import MAX_INPUT_CHARS
+
+
+class TextSyncState(rx.State, mixin=True):
+    """Mixin that syncs large text fields as patches instead of full values.
+
+    The browser sends ``[base_len, start, end, text, events]``: replace
+    ``value[start:end]`` with ``text``, where ``base_len`` is the length the
+    client diffed against and ``events`` is the number of input events that
+    were coalesced into this patch. Lengths and offsets count code points,
+    like Python strings, not the UTF-16 units of JavaScript strings.
+    """
+
+    synced_fields: ClassVar[tuple[str, ...]] = ()
+    # Longer values are rejected and the field keeps its previous value.
+    max_text_chars: ClassVar[int] = MAX_INPUT_CHARS
+    _sync_stats: dict[str, dict[str, int]] = {}
+
+    def _record_sync(self, field: str, **increments: int):
+        stats = self._sync_stats.setdefault(field, {})
+        for key, value in increments.items():
+            stats[key] = stats.get(key, 0) + value
+        metrics.record(f"text_sync.{field}", **increments)
+
+    def _reject_text(self, field: str, length: int):
+        self._record_sync(field, rejected=1)
+        return rx.toast(
+            f"Text is too long ({length:,} characters, the limit is {self.max_text_chars:,}).",
+            title="Validation Error",
+            position="bottom-right",
+            style={
+                "background-color": "#fee2e2",
+                "color": "#991b1b",
+                "border": "1px solid #f87171",
+            },
+        )
+
+    def _text_synced(self, field: str):
+        """Hook called after a synced field changed; may return events to run."""
+        return None
+
+    @rx.event
+    def sync_text(self, field: str, patch: list):
+        """Apply a text patch sent by a synced textarea."""
+        if field not in self.synced_fields:
+            logging.warning(f"Rejected text sync for unknown field: {field}")
+            return
+        if not (
+            isinstance(patch, list)
+            and len(patch) == 5
+            and all(type(n) is int for n in (patch[0], patch[1], patch[2], patch[4]))
+            and isinstance(patch[3], str)
+        ):
+            logging.warning(f"Rejected malformed text patch for {field}")
+            self._record_sync(field, rejected=1)
+            return
+        base_len, start, end, text, events = patch
+        current = getattr(self, field)
+        if len(current) != base_len or not 0 <= start <= end <= base_len:
+            self._record_sync(field, resyncs=1)
+            element_id = f"sync-{field}"
+            return rx.call_script(
+                f"(() => {{ delete (window.__textSync ?? {{}})[{field!r}]; "
+                f"return document.getElementById({element_id!r}).value; }})()",
+                callback=lambda value: type(self).replace_text(field, value),
+            )
+        length = base_len - (end - start) + len(text)
+        if length > self.max_text_chars:
+            return self._reject_text(field, length)
+        value = current[:start] + text + current[end:]
+        setattr(self, field, value)
+        full_bytes = len(value.encode())
+        sent_bytes = len(text.encode())
+        self._record_sync(
+            field,
+            events_received=1,
+            events_saved=max(events - 1, 0),
+            bytes_received=sent_bytes,
+            bytes_saved=max(full_bytes * max(events, 1) - sent_bytes, 0),
+        )
+        return self._text_synced(field)
+
+    @rx.event
+    def replace_text(self, field: str, value: str):
+        """Replace a synced field with the full value after a failed patch."""
+        if field not in self.synced_fields:
+            return
+        if len(value) > self.max_text_chars:
+            return self._reject_text(field, len(value))
+        setattr(self, field, value)
+        self._record_sync(field, events_received=1, bytes_received=len(value.encode()))
+        return self._text_synced(field)
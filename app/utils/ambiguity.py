@@ -0,0 +1,379 @@
+"""Vague-term and hedge detection for the Clarity goal.
+
+The lexicon (a few thousand phrases, mostly generated from intensifier and
+adjective combinations) is compiled once per process into an Aho–Corasick
+automaton over word tokens. Scanning a prompt is then a single pass over
+its words, whatever the lexicon size, and every match is a whole-word
+phrase. The shared ``LINTER`` is built when this module is imported.
+
+Run ``python -m app.utils.ambiguity`` for startup and per-prompt timings.
+"""
+
+import re
+from collections import Counter, deque
+from typing import Optional
+
+import reflex as rx
+
+WORD = re.compile(r"[a-z0-9']+")
+
+HEDGE = "hedge"
+VAGUE = "vague"
+
+# Hedges mapped to a safe replacement ("" drops them), or None when dropping
+# the phrase would break the sentence.
+HEDGES = {
+    "maybe": "",
+    "perhaps": "",
+    "possibly": "",
+    "probably": "",
+    "hopefully": "",
+    "arguably": "",
+    "somewhat": "",
+    "more or less": "",
+    "kind of": "",
+    "sort of": "",
+    "i think": "",
+    "i believe": "",
+    "i guess": "",
+    "i feel like": "",
+    "if possible": "",
+    "if you can": "",
+    "try to": "",
+    "in a way": "",
+    "to some extent": "",
+    "you might want to": "",
+    "you could": "",
+    "it seems": None,
+    "might": None,
+    "could be": None,
+}
+VAGUE_NOUNS = ("stuff", "things", "something", "anything", "everything", "whatever")
+TRAILING_VAGUE = (
+    "etc",
+    "and so on",
+    "and so forth",
+    "and more",
+    "or something",
+    "or whatever",
+    "and the like",
+)
+CONDITIONAL_VAGUE = (
+    "if necessary",
+    "if needed",
+    "as needed",
+    "as appropriate",
+    "when appropriate",
+    "where relevant",
+    "where appropriate",
+    "when needed",
+)
+QUANTIFIERS = (
+    "some",
+    "several",
+    "various",
+    "many",
+    "few",
+    "a few",
+    "a lot",
+    "a lot of",
+    "lots of",
+    "a bit",
+    "a little",
+    "a number of",
+    "a couple of",
+    "plenty of",
+    "numerous",
+)
+ADJECTIVES = {
+    "good": "say what makes it good, e.g. the criteria it must meet",
+    "nice": "say what makes it good, e.g. the criteria it must meet",
+    "great": "say what makes it good, e.g. the criteria it must meet",
+    "bad": "say which problems to avoid",
+    "better": "say what to improve and by how much",
+    "best": "say how to judge the best option",
+    "appropriate": "state the rule that decides what is appropriate",
+    "proper": "state the rule that decides what is proper",
+    "suitable": "state the rule that decides what is suitable",
+    "relevant": "list what counts as relevant",
+    "interesting": "say what the reader should find interesting",
+    "engaging": "say how engagement will be judged",
+    "reasonable": "give the acceptable range",
+    "decent": "give the minimum acceptable quality",
+    "clean": "name the style rules to follow",
+    "simple": "say what to leave out",
+    "easy": "say who it must be easy for",
+    "clear": "say who must understand it",
+    "robust": "list the failure cases to handle",
+    "efficient": "give a time or memory budget",
+    "fast": "give a time limit",
+    "quick": "give a time limit",
+    "slow": "give a time limit",
+    "short": "give a word or sentence limit",
+    "long": "give a word or sentence count",
+    "brief": "give a word or sentence limit",
+    "concise": "give a word or sentence limit",
+    "detailed": "say which details to include",
+    "comprehensive": "list what must be covered",
+    "thorough": "list what must be covered",
+    "high quality": "state the quality criteria",
+    "professional": "name the register and audience",
+    "modern": "name the versions or conventions to follow",
+    "creative": "say which constraints may be broken",
+    "unique": "say what it must differ from",
+    "important": "say why and in what order of priority",
+    "significant": "give a threshold",
+    "large": "give a size",
+    "small": "give a size",
+    "big": "give a size",
+    "recent": "give a date range",
+    "soon": "give a deadline",
+    "often": "give a frequency",
+    "sometimes": "give a frequency",
+    "usually": "state the exceptions",
+    "well written": "state the quality criteria",
+    "user friendly": "say who the users are and what they need",
+    "optimized": "say what to optimize for",
+    "scalable": "give the expected load",
+    "secure": "name the threats to handle",
+    "polished": "state the quality criteria",
+    "impactful": "say which outcome to drive",
+    "compelling": "say which action the reader should take",
+    "catchy": "give a length and style reference",
+    "informative": "list the facts to include",
+    "accurate": "name the sources to check against",
+    "correct": "say how correctness is checked",
+    "enough": "give the exact amount",
+    "sufficient": "give the exact amount",
+    "adequate": "give the minimum acceptable level",
+}
+INTENSIFIERS = (
+    "very",
+    "really",
+    "quite",
+    "fairly",
+    "pretty",
+    "rather",
+    "somewhat",
+    "extremely",
+    "super",
+    "highly",
+    "reasonably",
+    "relatively",
+    "sufficiently",
+    "more",
+    "less",
+    "too",
+    "so",
+    "a bit",
+    "a little",
+    "kind of",
+    "sort of",
+    "slightly",
+    "overly",
+    "incredibly",
+    "truly",
+)
+
+
+class Phrase(rx.Base):
+    """A lexicon entry."""
+
+    phrase: str
+    category: str
+    suggestion: str
+    # Safe drop-in replacement, or None when the fix needs the author's input.
+    replacement: Optional[str] = None
+
+
+class AmbiguityIssue(rx.Base):
+    """A lexicon match in a prompt; ``start`` and ``end`` are character offsets."""
+
+    start: int
+    end: int
+    text: str
+    category: str
+    suggestion: str
+    replacement: Optional[str] = None
+
+
+def build_lexicon() -> list[Phrase]:
+    """Generate the lexicon of hedges and vague terms."""
+    entries: dict[str, Phrase] = {}
+
+    def add(phrase: str, category: str, suggestion: str, replacement=None):
+        if phrase not in entries:
+            entries[phrase] = Phrase.construct(
+                phrase=phrase, category=category, suggestion=suggestion, replacement=replacement
+            )
+
+    for phrase, replacement in HEDGES.items():
+        add(phrase, HEDGE, "state the instruction directly", replacement)
+    for noun in VAGUE_NOUNS:
+        add(noun, VAGUE, "name the exact items")
+    for phrase in TRAILING_VAGUE:
+        add(phrase, VAGUE, "list every item that is wanted")
+    for phrase in CONDITIONAL_VAGUE:
+        add(phrase, VAGUE, "state the condition explicitly")
+    for phrase in QUANTIFIERS:
+        add(phrase, VAGUE, "give an exact number or range")
+    for adjective, suggestion in ADJECTIVES.items():
+        add(adjective, VAGUE, suggestion)
+        add(f"{adjective} enough", VAGUE, suggestion)
+        add(f"as {adjective} as possible", VAGUE, suggestion)
+        add(f"not too {adjective}", VAGUE, suggestion)
+        for intensifier in INTENSIFIERS:
+            add(f"{intensifier} {adjective}", VAGUE, suggestion)
+            add(f"{intensifier} {adjective} enough", VAGUE, suggestion)
+    return list(entries.values())
+
+
+class AmbiguityLinter:
+    """Aho–Corasick automaton whose alphabet is words rather than characters.
+
+    ``goto`` holds the trie transitions per state, ``fail`` the failure
+    links and ``outputs`` the lexicon entries ending in each state (its
+    own plus those along its failure chain), longest first.
+    """
+
+    def __init__(self, lexicon: list[Phrase]):
+        self.lexicon = lexicon
+        self.lengths = [len(entry.phrase.split()) for entry in lexicon]
+        self.goto: list[dict[str, int]] = [{}]
+        self.outputs: list[tuple[int, ...]] = [()]
+        for index, entry in enumerate(lexicon):
+            state = 0
+            for word in entry.phrase.split():
+                next_state = self.goto[state].get(word)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][word] = next_state
+                    self.goto.append({})
+                    self.outputs.append(())
+                state = next_state
+            self.outputs[state] = (index,)
+        self.vocabulary = frozenset(word for edges in self.goto for word in edges)
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(word, 0)
+                self.fail[child] = target if target != child else 0
+                self.outputs[child] = tuple(
+                    sorted(
+                        self.outputs[child] + self.outputs[self.fail[child]],
+                        key=self.lengths.__getitem__,
+                        reverse=True,
+                    )
+                )
+
+    def scan(self, words: list[str]) -> list[tuple[int, int]]:
+        """Find the longest lexicon match ending at each word.
+
+        Returns (index of the match's last word, lexicon index) pairs.
+        """
+        goto, fail, outputs, vocabulary = self.goto, self.fail, self.outputs, self.vocabulary
+        matches = []
+        state = 0
+        for position, word in enumerate(words):
+            if word not in vocabulary:
+                # No phrase contains this word, so every state falls back to the root.
+                state = 0
+                continue
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            if outputs[state]:
+                matches.append((position, outputs[state][0]))
+        return matches
+
+    def _select(self, matches: list[tuple[int, int]]) -> list[tuple[int, int, int]]:
+        """Keep the leftmost-longest matches that do not overlap.
+
+        Returns (first word, last word, lexicon index) triples in order.
+        """
+        spans = sorted(
+            ((end - self.lengths[index] + 1, end, index) for end, index in matches),
+            key=lambda span: (span[0], -span[1]),
+        )
+        selected = []
+        next_free = 0
+        for first, last, index in spans:
+            if first >= next_free:
+                selected.append((first, last, index))
+                next_free = last + 1
+        return selected
+
+    def count(self, words: list[str]) -> Counter:
+        """Count non-overlapping matches per category in lowercase words."""
+        return Counter(
+            self.lexicon[index].category for _, _, index in self._select(self.scan(words))
+        )
+
+    def lint(self, text: str) -> list[AmbiguityIssue]:
+        """Find hedges and vague terms in the text, with their spans."""
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Some characters change length when lowercased; fall back to
+            # matching case-insensitively on the original text.
+            tokens = list(re.finditer(WORD.pattern, text, re.IGNORECASE))
+            words = [token.group().lower() for token in tokens]
+        else:
+            tokens = list(WORD.finditer(lowered))
+            words = [token.group() for token in tokens]
+        issues = []
+        for first, last, index in self._select(self.scan(words)):
+            entry = self.lexicon[index]
+            start, end = tokens[first].start(), tokens[last].end()
+            issues.append(
+                AmbiguityIssue.construct(
+                    start=start,
+                    end=end,
+                    text=text[start:end],
+                    category=entry.category,
+                    suggestion=entry.suggestion,
+                    replacement=entry.replacement,
+                )
+            )
+        return issues
+
+
+LINTER = AmbiguityLinter(build_lexicon())
+
+
+if __name__ == "__main__":
+    import time
+
+    from app.utils.templates import DEFAULT_TEMPLATE
+
+    start = time.perf_counter()
+    lexicon = build_lexicon()
+    built = time.perf_counter()
+    linter = AmbiguityLinter(lexicon)
+    compiled = time.perf_counter()
+    print(
+        f"lexicon: {len(lexicon)} phrases in {(built - start) * 1000:.1f} ms, "
+        f"automaton: {len(linter.goto)} states in {(compiled - built) * 1000:.1f} ms"
+    )
+    block = DEFAULT_TEMPLATE + "\nMaybe make it very short and add some relevant stuff, etc.\n"
+    for size in (1_000, 10_000, 50_000):
+        prompt = (block * (size // len(block) + 1))[:size]
+        words = WORD.findall(prompt.lower())
+        runs = 20
+        start = time.perf_counter()
+        for _ in range(runs):
+            linter.count(words)
+        count_ms = (time.perf_counter() - start) / runs * 1000
+        start = time.perf_counter()
+        for _ in range(runs):
+            issues = linter.lint(prompt)
+        lint_ms = (time.perf_counter() - start) / runs * 1000
+        print(
+            f"{size:>6} chars: count {count_ms:.2f} ms, lint {lint_ms:.2f} ms, "
+            f"{len(issues)} issues"
+        )
@@ -0,0 +1,197 @@
+"""Run one request against several model backends at once.
+
+A ``Comparison`` starts every backend in its own task and reports each
+column's progress as it happens, so columns stream independently. Every
+backend has its own deadline: a backend that has not finished by then is
+cancelled and marked as timed out, without holding back the others. In
+hedged mode the first backend to finish with an acceptable answer wins and
+the rest are cancelled, which trades the cost of the extra requests for
+the latency of the fastest backend.
+
+Compare mode calls the backends directly rather than through the response
+cache, so the latencies shown are real and cancelling a column closes its
+connection.
+
+Run ``python -m app.utils.compare`` for a demo with stub backends of
+different latencies.
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Optional
+
+import reflex as rx
+
+from app.utils import metrics
+from app.utils.llm import BackendError, ChatBackend
+
+PENDING = "pending"
+STREAMING = "streaming"
+DONE = "done"
+TIMEOUT = "timeout"
+ERROR = "error"
+CANCELLED = "cancelled"
+FINISHED = frozenset({DONE, TIMEOUT, ERROR, CANCELLED})
+
+DEFAULT_DEADLINE_SECONDS = 30
+MAX_BACKENDS = 6
+
+
+class CompareColumn(rx.Base):
+    """One backend's answer and measurements in a comparison."""
+
+    name: str
+    model: str
+    status: str = PENDING
+    text: str = ""
+    error: str = ""
+    first_token_ms: int = 0
+    total_ms: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    winner: bool = False
+
+
+def is_acceptable(text: str) -> bool:
+    """Check whether a finished answer is good enough to win a hedged run."""
+    return bool(text.strip())
+
+
+class Comparison:
+    """A request fanned out to several backends."""
+
+    def __init__(
+        self,
+        backends: list[ChatBackend],
+        messages: list[dict[str, str]],
+        deadline: float = DEFAULT_DEADLINE_SECONDS,
+        hedged: bool = False,
+        acceptable: Callable[[str], bool] = is_acceptable,
+    ):
+        self.backends = backends
+        self.messages = messages
+        self.deadline = deadline
+        self.hedged = hedged
+        self.acceptable = acceptable
+        self.columns = [
+            CompareColumn(name=backend.config.name, model=backend.config.model)
+            for backend in backends
+        ]
+        self.winner: Optional[int] = None
+        # (column index, whether it is the column's last update)
+        self._queue: asyncio.Queue[tuple[int, bool]] = asyncio.Queue()
+
+    async def _run(self, i: int, backend: ChatBackend):
+        column = self.columns[i]
+        started = time.perf_counter()
+
+        async def stream():
+            async for text in backend.stream(self.messages):
+                if column.status == PENDING:
+                    column.status = STREAMING
+                    column.first_token_ms = int((time.perf_counter() - started) * 1000)
+                column.text += text
+                self._queue.put_nowait((i, False))
+
+        try:
+            # wait_for rather than asyncio.timeout, which needs Python 3.11.
+            await asyncio.wait_for(stream(), self.deadline)
+            column.status = DONE
+        except asyncio.TimeoutError:
+            column.status = TIMEOUT
+            column.error = f"No answer within {self.deadline:g}s"
+        except BackendError as e:
+            column.status = ERROR
+            column.error = str(e)
+        except asyncio.CancelledError:
+            # Cancelled by a hedged win or by the comparison being closed.
+            column.status = CANCELLED
+        finally:
+            column.total_ms = int((time.perf_counter() - started) * 1000)
+            column.prompt_tokens = backend.usage.prompt_tokens
+            column.completion_tokens = backend.usage.completion_tokens
+            self._queue.put_nowait((i, True))
+
+    async def updates(self) -> AsyncIterator[int]:
+        """Run the backends and yield the index of a column whenever it changes.
+
+        Every column's last update has it in a FINISHED status.
+        """
+        tasks = [
+            asyncio.create_task(self._run(i, backend))
+            for i, backend in enumerate(self.backends)
+        ]
+        running = len(tasks)
+        try:
+            while running:
+                i, last = await self._queue.get()
+                column = self.columns[i]
+                running -= last
+                yield i
+                if (
+                    self.hedged
+                    and self.winner is None
+                    and column.status == DONE
+                    and self.acceptable(column.text)
+                ):
+                    self.winner = i
+                    column.winner = True
+                    for task in tasks:
+                        task.cancel()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            metrics.record(
+                "compare",
+                runs=1,
+                backends=len(tasks),
+                hedged_wins=int(self.winner is not None),
+                **{
+                    status: sum(column.status == status for column in self.columns)
+                    for status in (TIMEOUT, ERROR, CANCELLED)
+                },
+            )
+
+
+if __name__ == "__main__":
+    from app.utils.llm import BackendConfig, StubBackend, optimization_messages
+
+    def stub(name: str, first_token_ms: float, token_ms: float, failure_rate: float = 0.0):
+        return StubBackend(
+            BackendConfig(
+                name=name,
+                kind="stub",
+                model=name,
+                options={
+                    "first_token_ms": first_token_ms,
+                    "token_ms": token_ms,
+                    "failure_rate": failure_rate,
+                },
+            )
+        )
+
+    async def main():
+        messages = optimization_messages("Write a haiku about latency. " * 10, "Light", [])
+        for hedged in (False, True):
+            backends = [
+                stub("fast", 50, 1),
+                stub("medium", 300, 2),
+                stub("slow", 3000, 5),
+                stub("flaky", 100, 1, failure_rate=1.0),
+            ]
+            comparison = Comparison(backends, messages, deadline=1.0, hedged=hedged)
+            start = time.perf_counter()
+            updates = 0
+            async for _ in comparison.updates():
+                updates += 1
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"hedged={hedged} finished in {elapsed:.0f} ms after {updates} updates")
+            for column in comparison.columns:
+                print(
+                    f"  {column.name:<7} {column.status:<9} winner={column.winner!s:<5} "
+                    f"ttft={column.first_token_ms}ms total={column.total_ms}ms "
+                    f"tokens={column.completion_tokens} {column.error}"
+                )
+
+    asyncio.run(main())
@@ -0,0 +1,390 @@
+"""Compress a prompt to fit a token budget.
+
+Compression works coarse to fine. Sentences are ranked by how much
+information their words carry, and the least informative ones are dropped
+until the prompt fits; if it still does not, low-information function words
+("the", "very", "just", ...) are dropped from the remaining sentences.
+
+Information is the self-information of each word, ``-log2 p(word)``, where
+``p`` mixes the word's frequency in the prompt itself with a Zipf prior
+over common English words. Words a prompt repeats, and common function
+words, are therefore cheap to drop, while rare terms and names are kept.
+
+Headings, the first sentence of "Label: value" fields, sentences that state
+constraints (see ``scoring.CONSTRAINT_MARKERS``), list markers and fenced
+code blocks are never touched, and the most informative sentence is always
+kept. When those alone exceed the budget, the prompt is compressed as far as
+possible and the result says so.
+
+Run ``python -m app.utils.compress`` to benchmark the compression ratio
+against runtime on a small corpus.
+"""
+
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import NamedTuple
+
+from app.utils import metrics
+from app.utils.rewrite import CODE_FENCE, SENTENCE
+from app.utils.scoring import CONSTRAINT_MARKERS
+from app.utils.tokens import DEFAULT_ENCODING, count_tokens
+
+CACHE_SIZE = 64
+# Weight of the prompt's own word frequencies against the prior.
+DOCUMENT_WEIGHT = 0.5
+UNKNOWN_WORD_PROBABILITY = 1e-6
+MAX_ROUNDS = 8
+
+# The most common English words, most frequent first; the prior gives the
+# word at rank r a probability of about 0.1 / r.
+COMMON_WORDS = (
+    "the of and to a in is that for it as was with be by on not he i this are or his "
+    "from at which but have an they you were her she there been one all we their has "
+    "would when if so no will more can who its what out up them about into than some "
+    "could other then these two may only do any also time like very just over such "
+    "our most your should each new well how many those much make use first where "
+    "after through even because here way get both between being while really please"
+).split()
+PRIOR = {word: 0.1 / rank for rank, word in enumerate(COMMON_WORDS, 1)}
+
+# Words that can go without changing what a prompt asks for. Negations and
+# modal verbs are deliberately absent, and so are words like "that",
+# "which" and "there" whose removal can change what a sentence says.
+DROPPABLE = frozenset(
+    "the a an very just really quite simply basically actually please "
+    "kindly also so then here some".split()
+)
+
+WORD = re.compile(r"[A-Za-z0-9']+")
+DROPPABLE_WORD = re.compile(
+    r"\b(" + "|".join(sorted(DROPPABLE)) + r")\b[ \t]?", re.IGNORECASE
+)
+HEADING_LINE = re.compile(r"#|[A-Za-z][^\n:]{0,38}:[ \t]*$")
+# A "Label: value" line, like the fields of a rendered template.
+FIELD_LINE = re.compile(r"[A-Za-z][\w ]{0,30}:[ \t]+\S")
+LINE_PREFIX = re.compile(r"[ \t]*(?:(?:[-*+•]|\d+[.)])[ \t]+)?")
+CONSTRAINT = re.compile(
+    r"\b(?:" + "|".join(re.escape(marker) for marker in CONSTRAINT_MARKERS) + r")\b",
+    re.IGNORECASE,
+)
+BLANK_LINES = re.compile(r"\n{3,}")
+
+
+class Compression(NamedTuple):
+    text: str
+    original_tokens: int
+    tokens: int
+    budget: int
+    sentences_dropped: int
+    words_dropped: int
+    protected: int
+
+    @property
+    def ratio(self) -> float:
+        """How many times smaller the prompt got, in tokens."""
+        return self.original_tokens / max(self.tokens, 1)
+
+    @property
+    def fits(self) -> bool:
+        return self.tokens <= self.budget
+
+    def describe(self) -> str:
+        """Summarize the compression for the optimizer's explanation."""
+        summary = (
+            f"Compressed from {self.original_tokens} to {self.tokens} tokens "
+            f"({self.ratio:.1f}× smaller) by dropping {self.sentences_dropped} "
+            f"low-information sentences and {self.words_dropped} filler words"
+        )
+        if not self.fits:
+            return (
+                f"{summary}; the {self.budget}-token budget cannot be met without "
+                "touching headings, constraints, code or the most informative sentence."
+            )
+        return f"{summary}, to fit the {self.budget}-token budget."
+
+
+class _Unit:
+    """A sentence, or a part of the prompt that is kept whole."""
+
+    __slots__ = ("text", "protected", "dropped", "line")
+
+    def __init__(self, text: str, protected: bool, line: int):
+        self.text = text
+        self.protected = protected
+        self.dropped = False
+        self.line = line
+
+
+class _Line(NamedTuple):
+    prefix: str  # indentation and list marker, kept while any sentence is
+    newline: bool
+
+
+def _split(text: str) -> tuple[list[_Unit], list[_Line]]:
+    """Split a prompt into units, each on one of the returned lines."""
+    units: list[_Unit] = []
+    lines: list[_Line] = []
+    for i, part in enumerate(CODE_FENCE.split(text)):
+        if i % 2:
+            units.append(_Unit(part, True, len(lines)))
+            lines.append(_Line("", False))
+            continue
+        for line in part.splitlines(keepends=True):
+            prefix = LINE_PREFIX.match(line).group(0)
+            body = line[len(prefix) :].rstrip("\n")
+            if not body.strip() or HEADING_LINE.match(body):
+                units.append(_Unit(body, True, len(lines)))
+            else:
+                # A field keeps its label and the first sentence of its value.
+                field = bool(FIELD_LINE.match(body))
+                units.extend(
+                    _Unit(sentence, (field and j == 0) or bool(CONSTRAINT.search(sentence)), len(lines))
+                    for j, sentence in enumerate(s for s in SENTENCE.findall(body) if s)
+                )
+            lines.append(_Line(prefix, line.endswith("\n")))
+    return units, lines
+
+
+def _join(units: list[_Unit], lines: list[_Line]) -> str:
+    """Put the kept units back together, leaving out lines with nothing kept."""
+    kept: list[list[str]] = [[] for _ in lines]
+    for unit in units:
+        if not unit.dropped:
+            kept[unit.line].append(unit.text)
+    out = []
+    for line, parts in zip(lines, kept):
+        if parts:
+            text = line.prefix + "".join(parts)
+            out.append(text.rstrip(" \t") + "\n" if line.newline else text)
+    text = BLANK_LINES.sub("\n\n", "".join(out).rstrip(" \t")).lstrip("\n")
+    # Dropping the last paragraph leaves the blank line before it.
+    return text[:-1] if text.endswith("\n\n") else text
+
+
+def _information(units: list[_Unit]) -> dict[str, float]:
+    """Self-information in bits of every word of the prompt."""
+    counts = Counter(
+        word.lower() for unit in units for word in WORD.findall(unit.text)
+    )
+    total = sum(counts.values()) or 1
+    return {
+        word: -math.log2(
+            DOCUMENT_WEIGHT * count / total
+            + (1 - DOCUMENT_WEIGHT) * PRIOR.get(word, UNKNOWN_WORD_PROBABILITY)
+        )
+        for word, count in counts.items()
+    }
+
+
+def _drop_words(text: str, matches: list[re.Match]) -> str:
+    """Remove matched words from a text, in order of position."""
+    out = []
+    last = 0
+    capitalize = False
+    for match in [*matches, None]:
+        kept = text[last : match.start() if match else len(text)]
+        # Keep a sentence capitalized when its first words go.
+        if capitalize and kept:
+            kept = kept[0].upper() + kept[1:]
+            capitalize = False
+        out.append(kept)
+        if match:
+            last = match.end()
+            capitalize = capitalize or match.group(1)[0].isupper()
+    return "".join(out)
+
+
+def _drop_fillers(
+    units: list[_Unit],
+    lines: list[_Line],
+    kept: list[_Unit],
+    information: dict[str, float],
+    budget: int,
+    encoding: str,
+) -> tuple[str, int, int]:
+    """Drop the least informative filler words of the kept sentences until the text fits.
+
+    Each word is counted as a token, and the text is recounted after every
+    round. Returns the text, its token count and the number of words dropped.
+    """
+    text = _join(units, lines)
+    tokens = count_tokens(text, encoding)
+    dropped = 0
+    for _ in range(MAX_ROUNDS):
+        if tokens <= budget:
+            break
+        matches = sorted(
+            (
+                (information.get(match.group(1).lower(), 0.0), i, match)
+                for i, unit in enumerate(kept)
+                for match in DROPPABLE_WORD.finditer(unit.text)
+            ),
+            key=lambda item: item[:2],
+        )[: tokens - budget]
+        if not matches:
+            break
+        by_unit: dict[int, list[re.Match]] = {}
+        for _, i, match in matches:
+            by_unit.setdefault(i, []).append(match)
+        for i, unit_matches in by_unit.items():
+            unit_matches.sort(key=lambda match: match.start())
+            kept[i].text = _drop_words(kept[i].text, unit_matches)
+        dropped += len(matches)
+        text = _join(units, lines)
+        tokens = count_tokens(text, encoding)
+    return text, tokens, dropped
+
+
+def _compress(text: str, budget: int, encoding: str) -> Compression:
+    original_tokens = count_tokens(text, encoding)
+    units, lines = _split(text)
+    protected = sum(unit.protected for unit in units)
+    if original_tokens <= budget:
+        return Compression(text, original_tokens, original_tokens, budget, 0, 0, protected)
+    information = _information(units)
+
+    def density(unit: _Unit) -> float:
+        words = WORD.findall(unit.text)
+        if not words:
+            return 0.0
+        return sum(information[word.lower()] for word in words) / len(words)
+
+    # Coarse: drop whole sentences, least informative first, until the
+    # estimated count fits; recount exactly and repeat if it does not. The
+    # densest sentence is never a candidate, so the prompt cannot go empty.
+    candidates = sorted((unit for unit in units if not unit.protected), key=density)[:-1]
+    tokens = original_tokens
+    sentences_dropped = 0
+    for _ in range(MAX_ROUNDS):
+        estimate = tokens
+        while estimate > budget and sentences_dropped < len(candidates):
+            unit = candidates[sentences_dropped]
+            unit.dropped = True
+            estimate -= count_tokens(unit.text, encoding)
+            sentences_dropped += 1
+        compressed = _join(units, lines)
+        tokens = count_tokens(compressed, encoding)
+        if tokens <= budget or sentences_dropped == len(candidates):
+            break
+    # Fine: sentence dropping overshoots by up to a sentence, so give back
+    # the densest dropped sentences while dropping filler words pays for them.
+    content = [unit for unit in units if not unit.protected]
+    words_dropped = 0
+    for unit in reversed(candidates[max(0, sentences_dropped - MAX_ROUNDS) : sentences_dropped]):
+        unit.dropped = False
+        kept = [other for other in content if not other.dropped]
+        texts = [other.text for other in kept]
+        restored, restored_tokens, words = _drop_fillers(
+            units, lines, kept, information, budget, encoding
+        )
+        if restored_tokens > budget:
+            unit.dropped = True
+            for other, text in zip(kept, texts):
+                other.text = text
+            break
+        compressed, tokens = restored, restored_tokens
+        sentences_dropped -= 1
+        words_dropped += words
+    if tokens > budget:
+        # Nothing left to drop but filler words.
+        compressed, tokens, words = _drop_fillers(
+            units, lines, [unit for unit in content if not unit.dropped], information, budget, encoding
+        )
+        words_dropped += words
+    return Compression(
+        compressed, original_tokens, tokens, budget, sentences_dropped, words_dropped, protected
+    )
+
+
+_cache: OrderedDict[tuple[bytes, int, str], Compression] = OrderedDict()
+# The cache is shared by every session and used from worker threads.
+_cache_lock = threading.Lock()
+
+
+def compress(text: str, budget: int, encoding: str = DEFAULT_ENCODING) -> Compression:
+    """Compress a prompt to at most ``budget`` tokens, as far as it can go.
+
+    Results are cached by prompt and budget, so re-running the optimizer
+    with another goal does not compress the same text again.
+    """
+    key = (hashlib.blake2b(text.encode(), digest_size=16).digest(), budget, encoding)
+    with _cache_lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+    if result is not None:
+        metrics.record("compress", hits=1)
+        return result
+    started = time.perf_counter()
+    result = _compress(text, budget, encoding)
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    metrics.record(
+        "compress",
+        misses=1,
+        tokens_in=result.original_tokens,
+        tokens_out=result.tokens,
+        missed_budget=int(not result.fits),
+        us=int((time.perf_counter() - started) * 1_000_000),
+    )
+    return result
+
+
+if __name__ == "__main__":
+    from app.utils.templates import render_prompt
+
+    rambling = (
+        "So basically I am working on a small web service and I would really like some help "
+        "with it. The service is just a simple thing that takes orders and stores them. "
+        "It is written in Python and it uses Flask, which is a web framework. "
+        "I have been working on it for a while now and it has been going quite well. "
+        "Honestly the code is a bit messy but it mostly works. "
+        "Please review the handler below for bugs and race conditions. "
+        "You must keep the public API unchanged. "
+        "Answer in at most five bullet points.\n\n"
+        "```python\n@app.post('/orders')\ndef create_order():\n"
+        "    order = Order(**request.json)\n    db.session.add(order)\n"
+        "    db.session.commit()\n    return jsonify(order.id)\n```\n"
+    )
+    corpus = {
+        "template": render_prompt(
+            {
+                "purpose": "Content Creation",
+                "describe": (
+                    "A blog post about the history of coffee. It should be interesting. "
+                    "Coffee is a really popular drink that many people drink every day. "
+                    "The post is for a general audience that likes coffee. "
+                    "I think the post could also mention some of the ways that coffee is made."
+                ),
+                "tone": "Friendly",
+                "length": "Medium (100-300 words)",
+                "constraints": "- Never invent dates.\n- Cite at least two sources.",
+            }
+        ),
+        "rambling": rambling,
+        "long": "\n\n".join(
+            f"## Part {i}\n" + rambling.replace("orders", f"orders of kind {i}")
+            for i in range(200)
+        ),
+    }
+    for name, text in corpus.items():
+        total = count_tokens(text)
+        for fraction in (0.75, 0.5, 0.25):
+            budget = int(total * fraction)
+            with _cache_lock:
+                _cache.clear()
+            start = time.perf_counter()
+            result = compress(text, budget)
+            ms = (time.perf_counter() - start) * 1000
+            kept = all(fence in result.text for fence in CODE_FENCE.findall(text))
+            print(
+                f"{name:<9} {total:>6} tokens budget={budget:<6} -> {result.tokens:<6} "
+                f"ratio={result.ratio:.2f}x fits={result.fits!s:<5} code kept={kept!s:<5} "
+                f"{ms:.1f} ms"
+            )
@@ -0,0 +1,278 @@
+"""Token-level before/after diff for the optimizer.
+
+Texts are compared line by line first, then the lines that changed are
+compared token by token (words and punctuation marks), which
+keeps the token diff to the edited regions. Both levels use Myers'
+linear-space algorithm: it finds the middle snake of an optimal edit path
+by searching from both ends at once, then recurses on either side of it,
+so memory stays linear in the input size.
+
+The search is capped twice. When a region needs more than
+``MAX_EDIT_COST`` edits on each side of its middle, it is split at the
+furthest point the search reached, so the diff stays close to minimal
+while the cost per split is bounded. And once ``MAX_DIFF_STEPS`` search
+steps have been spent on a diff, whatever is left is reported as deleted
+and re-inserted whole. Pathological inputs (two unrelated 100 KB texts)
+therefore finish in bounded time with a coarser diff.
+
+Run ``python -m app.utils.diff`` for a timing benchmark.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import reflex as rx
+
+from app.utils import metrics
+
+EQUAL = "equal"
+INSERT = "insert"
+DELETE = "delete"
+
+MAX_EDIT_COST = 32
+MAX_DIFF_STEPS = 2_000_000
+CACHE_SIZE = 64
+
+# A word or punctuation mark with the whitespace before it, so runs of
+# spaces do not count as matches between otherwise unrelated text.
+TOKEN = re.compile(r"\s*(?:\w+|[^\w\s])|\s+")
+
+
+class DiffSegment(rx.Base):
+    """A run of text that is equal in both versions, inserted or deleted."""
+
+    kind: str
+    text: str
+
+
+def _middle_snake(a, b, a0: int, a1: int, b0: int, b1: int, limit: int, budget: list[int]):
+    """Find the middle snake of an optimal path from (a0, b0) to (a1, b1).
+
+    Returns the snake's (start in a, start in b, end in a, end in b). If the
+    path needs more than ``limit`` edits on each side of its middle, returns
+    the furthest point the forward search reached instead, as an empty
+    snake; the path through it is not optimal but close to it. Returns None
+    once ``budget``, the number of diagonal steps left, is used up.
+    """
+    n, m = a1 - a0, b1 - b0
+    delta = n - m
+    odd = delta & 1
+    max_d = min(limit, (n + m + 1) // 2)
+    offset = max_d + 1
+    # Furthest x reached on each diagonal k = x - y, forwards and backwards.
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+    for d in range(max_d + 1):
+        budget[0] -= 2 * d + 2
+        if budget[0] < 0:
+            return None
+        for k in range(-d, d + 1, 2):
+            i = k + offset
+            if k == -d or (k != d and forward[i - 1] < forward[i + 1]):
+                x = forward[i + 1]
+            else:
+                x = forward[i - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and a[a0 + x] == b[b0 + y]:
+                x += 1
+                y += 1
+            forward[i] = x
+            if odd and -d < delta - k < d and x + backward[delta - k + offset] >= n:
+                return a0 + start_x, b0 + start_y, a0 + x, b0 + y
+        for k in range(-d, d + 1, 2):
+            i = k + offset
+            if k == -d or (k != d and backward[i - 1] < backward[i + 1]):
+                x = backward[i + 1]
+            else:
+                x = backward[i - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and a[a1 - 1 - x] == b[b1 - 1 - y]:
+                x += 1
+                y += 1
+            backward[i] = x
+            if not odd and -d <= delta - k <= d and x + forward[delta - k + offset] >= n:
+                return a1 - x, b1 - y, a1 - start_x, b1 - start_y
+    # Over the limit: split at the furthest point on any reachable diagonal.
+    best_x, best_k = -1, 0
+    for k in range(-max_d, max_d + 1, 2):
+        x = min(forward[k + offset], n, m + k)
+        if x - k >= 0 and 2 * x - k > 2 * best_x - best_k:
+            best_x, best_k = x, k
+    return a0 + best_x, b0 + best_x - best_k, a0 + best_x, b0 + best_x - best_k
+
+
+def _diff(a, b, a0: int, a1: int, b0: int, b1: int, limit: int, budget: list[int], ops: list):
+    tail = 0
+    while a0 < a1 - tail and b0 < b1 - tail and a[a1 - 1 - tail] == b[b1 - 1 - tail]:
+        tail += 1
+    a1 -= tail
+    b1 -= tail
+    # The part after each snake is handled by this loop rather than by
+    # recursion, so splits at the limit do not deepen the stack.
+    while True:
+        head_a, head_b = a0, b0
+        while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+            a0 += 1
+            b0 += 1
+        if a0 > head_a:
+            ops.append((EQUAL, head_a, a0, head_b, b0))
+        snake = None
+        if a0 < a1 and b0 < b1:
+            snake = _middle_snake(a, b, a0, a1, b0, b1, limit, budget)
+        if snake is None:
+            break
+        x0, y0, x1, y1 = snake
+        _diff(a, b, a0, x0, b0, y0, limit, budget, ops)
+        if x1 > x0:
+            ops.append((EQUAL, x0, x1, y0, y1))
+        a0, b0 = x1, y1
+    if a0 < a1:
+        ops.append((DELETE, a0, a1, b0, b0))
+    if b0 < b1:
+        ops.append((INSERT, a1, a1, b0, b1))
+    if tail:
+        ops.append((EQUAL, a1, a1 + tail, b1, b1 + tail))
+
+
+def diff_sequences(
+    a, b, limit: int = MAX_EDIT_COST, budget: int = MAX_DIFF_STEPS
+) -> list[tuple[str, int, int, int, int]]:
+    """Diff two sequences of hashable items.
+
+    Returns (kind, start in a, end in a, start in b, end in b) operations in
+    order; deletions come before insertions at the same place.
+    """
+    ops: list[tuple[str, int, int, int, int]] = []
+    _diff(a, b, 0, len(a), 0, len(b), limit, [budget], ops)
+    return ops
+
+
+def _intern(parts: list[str], ids: dict[str, int]) -> list[int]:
+    return [ids.setdefault(part, len(ids)) for part in parts]
+
+
+def _diff_tokens(before: str, after: str, emit):
+    tokens_a = TOKEN.findall(before)
+    tokens_b = TOKEN.findall(after)
+    ids: dict[str, int] = {}
+    for kind, a0, a1, b0, b1 in diff_sequences(
+        _intern(tokens_a, ids), _intern(tokens_b, ids)
+    ):
+        if kind == INSERT:
+            emit(kind, "".join(tokens_b[b0:b1]))
+        else:
+            emit(kind, "".join(tokens_a[a0:a1]))
+
+
+def _compute(before: str, after: str) -> list[DiffSegment]:
+    segments: list[DiffSegment] = []
+
+    def emit(kind: str, text: str):
+        if not text:
+            return
+        if segments and segments[-1].kind == kind:
+            segments[-1].text += text
+        else:
+            segments.append(DiffSegment.construct(kind=kind, text=text))
+
+    lines_a = before.splitlines(keepends=True)
+    lines_b = after.splitlines(keepends=True)
+    ids: dict[str, int] = {}
+    ops = diff_sequences(_intern(lines_a, ids), _intern(lines_b, ids))
+    deleted: list[str] = []
+    inserted: list[str] = []
+
+    def flush():
+        if deleted and inserted:
+            _diff_tokens("".join(deleted), "".join(inserted), emit)
+        else:
+            emit(DELETE, "".join(deleted))
+            emit(INSERT, "".join(inserted))
+        deleted.clear()
+        inserted.clear()
+
+    for kind, a0, a1, b0, b1 in ops:
+        if kind == DELETE:
+            deleted.extend(lines_a[a0:a1])
+        elif kind == INSERT:
+            inserted.extend(lines_b[b0:b1])
+        else:
+            flush()
+            emit(EQUAL, "".join(lines_a[a0:a1]))
+    flush()
+    return segments
+
+
+_cache: OrderedDict[bytes, list[DiffSegment]] = OrderedDict()
+# The cache is shared by every session and used from worker threads.
+_cache_lock = threading.Lock()
+
+
+def _digest(before: str, after: str) -> bytes:
+    digest = hashlib.blake2b(before.encode(), digest_size=16)
+    digest.update(b"\0")
+    digest.update(after.encode())
+    return digest.digest()
+
+
+def diff_texts(before: str, after: str) -> list[DiffSegment]:
+    """Diff two texts into equal, deleted and inserted segments.
+
+    Results are cached by the pair of texts, so reopening the same history
+    item, or toggling the view, does not recompute its diff.
+    """
+    key = _digest(before, after)
+    with _cache_lock:
+        segments = _cache.get(key)
+        if segments is not None:
+            _cache.move_to_end(key)
+    if segments is not None:
+        metrics.record("diff", hits=1)
+        return segments
+    started = time.perf_counter()
+    segments = _compute(before, after)
+    with _cache_lock:
+        _cache[key] = segments
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    metrics.record(
+        "diff", misses=1, us=int((time.perf_counter() - started) * 1_000_000)
+    )
+    return segments
+
+
+if __name__ == "__main__":
+    import random
+
+    from app.utils.rewrite import rewrite_prompt
+    from app.utils.templates import DEFAULT_TEMPLATE
+
+    block = (
+        DEFAULT_TEMPLATE
+        + "\n\nMaybe add some relevant stuff, etc. I think it should be very short.\n\n"
+    )
+    for size in (10_000, 100_000):
+        original = (block * (size // len(block) + 1))[:size]
+        optimized, _ = rewrite_prompt(
+            original, "Aggressive", ["Clarity", "Conciseness", "Structure", "Depth"]
+        )
+        start = time.perf_counter()
+        segments = _compute(original, optimized)
+        elapsed = (time.perf_counter() - start) * 1000
+        rebuilt_a = "".join(s.text for s in segments if s.kind != INSERT)
+        rebuilt_b = "".join(s.text for s in segments if s.kind != DELETE)
+        print(
+            f"{size:>7} chars, rewritten: {elapsed:.1f} ms, {len(segments)} segments, "
+            f"round trip {rebuilt_a == original and rebuilt_b == optimized}"
+        )
+        rng = random.Random(0)
+        unrelated = "".join(rng.choice("abcdefgh \n") for _ in range(size))
+        start = time.perf_counter()
+        segments = _compute(original, unrelated)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{size:>7} chars, unrelated: {elapsed:.1f} ms, {len(segments)} segments")
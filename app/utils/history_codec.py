@@ -0,0 +1,283 @@
+"""Compact encoding for the history kept in LocalStorage.
+
+Every text field is split into paragraph blocks, each distinct block is
+stored once (keyed by its digest), and items refer to blocks by position,
+so repeated constraints, examples and optimizer originals cost a few bytes
+per entry instead of their full length.
+
+Version 3 stores history as a chain of segments, each compressed with
+zlib on its own. A segment holds the blocks it adds to the shared block
+table, the items it adds and the ids of the items it drops. Saving after
+an item was added or removed therefore only encodes one new segment for
+the change; the chain is rewritten as a single segment once it gets long
+or holds too many dropped items. Version 2 (a single compressed payload)
+and version 1 (a plain JSON list) are still decoded, and are rewritten as
+version 3 on their next save.
+
+Run ``python -m app.utils.history_codec`` for a bytes-per-item benchmark.
+"""
+
+import base64
+import hashlib
+import json
+import zlib
+from typing import Callable
+
+VERSION = 3
+PREFIX = f"hc{VERSION}:"
+V2_PREFIX = "hc2:"
+EMPTY = "[]"
+BLOCK_SEPARATOR = "\n\n"
+SEGMENT_SEPARATOR = "."
+TEXT_FIELDS = ("title", "content")
+# Rewrite the chain as one segment beyond this many segments, or once
+# dropped items outnumber this share of the live ones.
+MAX_SEGMENTS = 32
+MAX_DROPPED_SHARE = 0.25
+
+
+def digest(text: str) -> bytes:
+    """Get the content address of a text block."""
+    return hashlib.blake2b(text.encode(), digest_size=8).digest()
+
+
+class BlockTable:
+    """Distinct text blocks in insertion order, addressed by digest."""
+
+    def __init__(self):
+        self.blocks: list[str] = []
+        self.positions: dict[bytes, int] = {}
+
+    def refs(self, text: str) -> list[int]:
+        """Get the block positions a text is made of, adding new blocks."""
+        refs = []
+        for block in text.split(BLOCK_SEPARATOR):
+            key = digest(block)
+            position = self.positions.get(key)
+            if position is None:
+                position = self.positions[key] = len(self.blocks)
+                self.blocks.append(block)
+            refs.append(position)
+        return refs
+
+    def extend(self, blocks: list[str]):
+        """Add blocks read from an encoded segment."""
+        for block in blocks:
+            self.positions.setdefault(digest(block), len(self.blocks))
+            self.blocks.append(block)
+
+
+def _join(blocks: list[str], refs: list[int]) -> str:
+    return BLOCK_SEPARATOR.join(blocks[i] for i in refs)
+
+
+def _pack(table: BlockTable, item: dict) -> dict:
+    entry = dict(item)
+    for field in TEXT_FIELDS:
+        entry[field] = table.refs(item[field])
+    entry["metadata"] = {
+        key: table.refs(value) if isinstance(value, str) else {"v": value}
+        for key, value in item.get("metadata", {}).items()
+    }
+    return entry
+
+
+def _unpack(blocks: list[str], entry: dict) -> dict:
+    for field in TEXT_FIELDS:
+        entry[field] = _join(blocks, entry[field])
+    entry["metadata"] = {
+        key: _join(blocks, value) if isinstance(value, list) else value["v"]
+        for key, value in entry["metadata"].items()
+    }
+    return entry
+
+
+def _compress(payload: dict) -> str:
+    data = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.b64encode(zlib.compress(data, 9)).decode()
+
+
+def _decompress(segment: str) -> dict:
+    return json.loads(zlib.decompress(base64.b64decode(segment)))
+
+
+class Writer:
+    """The encoded form of a history, kept so the next save can append to it."""
+
+    def __init__(self):
+        self.table = BlockTable()
+        self.source = EMPTY
+        # Ids of the live items in the encoded form, oldest first.
+        self.ids: list[str] = []
+        self.segments = 0
+        self.dropped = 0
+
+    def write(self, ids: list[str], record: Callable[[str], dict]) -> str:
+        """Encode the items with these ids, oldest first.
+
+        ``record`` gets an item's plain dict by id; it is only called for
+        the items that have to be encoded.
+        """
+        if not ids:
+            self.__init__()
+            return EMPTY
+        live = set(ids)
+        kept = [item_id for item_id in self.ids if item_id in live]
+        drop = [item_id for item_id in self.ids if item_id not in live]
+        if (
+            not self.segments
+            or self.segments >= MAX_SEGMENTS
+            or ids[: len(kept)] != kept
+            or self.dropped + len(drop) > MAX_DROPPED_SHARE * len(ids)
+        ):
+            return self._rewrite(ids, record)
+        added = ids[len(kept) :]
+        if not added and not drop:
+            return self.source
+        self.source += SEGMENT_SEPARATOR + self._segment([record(i) for i in added], drop)
+        self.ids = ids
+        self.segments += 1
+        self.dropped += len(drop)
+        return self.source
+
+    def _segment(self, items: list[dict], drop: list[str]) -> str:
+        start = len(self.table.blocks)
+        packed = [_pack(self.table, item) for item in items]
+        payload = {"v": VERSION, "blocks": self.table.blocks[start:], "items": packed}
+        if drop:
+            payload["drop"] = drop
+        return _compress(payload)
+
+    def _rewrite(self, ids: list[str], record: Callable[[str], dict]) -> str:
+        self.table = BlockTable()
+        self.source = PREFIX + self._segment([record(i) for i in ids], [])
+        self.ids = list(ids)
+        self.segments = 1
+        self.dropped = 0
+        return self.source
+
+
+def encode(items: list[dict]) -> str:
+    """Encode history items, oldest first, into a LocalStorage string."""
+    by_id = {item["id"]: item for item in items}
+    return Writer().write(list(by_id), by_id.__getitem__)
+
+
+def read(source: str) -> tuple[list[dict], Writer]:
+    """Decode a LocalStorage string in any known version.
+
+    Returns the items, oldest first, and a writer that appends the next
+    save to a version 3 string instead of rewriting it.
+    """
+    writer = Writer()
+    if source.startswith(V2_PREFIX):
+        payload = _decompress(source[len(V2_PREFIX) :])
+        return [_unpack(payload["blocks"], entry) for entry in payload["items"]], writer
+    if not source.startswith(PREFIX):
+        return json.loads(source or EMPTY), writer
+    items: dict[str, dict] = {}
+    for segment in source[len(PREFIX) :].split(SEGMENT_SEPARATOR):
+        payload = _decompress(segment)
+        writer.table.extend(payload["blocks"])
+        for item_id in payload.get("drop", ()):
+            items.pop(item_id, None)
+            writer.dropped += 1
+        for entry in payload["items"]:
+            items.pop(entry["id"], None)
+            items[entry["id"]] = _unpack(writer.table.blocks, entry)
+        writer.segments += 1
+    writer.source = source
+    writer.ids = list(items)
+    return list(items.values()), writer
+
+
+def decode(source: str) -> list[dict]:
+    """Decode a LocalStorage string in any known version into history items."""
+    return read(source)[0]
+
+
+def benchmark(count: int = 200) -> dict[str, float]:
+    """Measure bytes per item of version 1 (plain JSON) and version 3 on synthetic history."""
+    import random
+    import time
+
+    from app.constants import AUTO_CONSTRAINTS, PURPOSES, TONES
+    from app.states.history import GeneratedMetadata, OptimizedMetadata
+    from app.utils.scoring import PromptScores
+    from app.utils.rewrite import rewrite_prompt
+    from app.utils.templates import render_prompt
+
+    rng = random.Random(0)
+    items = []
+    for i in range(count):
+        purpose = rng.choice(PURPOSES)
+        topic = f"Topic {i}: {rng.choice(['launch', 'onboarding', 'migration', 'pricing'])}"
+        fields = {
+            "purpose": purpose,
+            "describe": topic,
+            "tone": rng.choice(TONES),
+            "format": "Paragraph",
+            "length": "Medium",
+            "constraints": AUTO_CONSTRAINTS.get(purpose, ""),
+            "examples": "",
+        }
+        if i % 2:
+            content = render_prompt(fields)
+            metadata = GeneratedMetadata(
+                task_type=purpose,
+                topic=topic,
+                tone=fields["tone"],
+                format=fields["format"],
+                length=fields["length"],
+                constraints=fields["constraints"],
+            ).dict()
+            kind = "generated"
+        else:
+            original = render_prompt(fields)
+            content, changes = rewrite_prompt(original, "Moderate", ["Clarity"])
+            metadata = OptimizedMetadata(
+                original_prompt=original,
+                optimization_level="Moderate",
+                selected_goals=["Clarity"],
+                explanation=changes,
+                scores=PromptScores(
+                    clarity=85, conciseness=80, structure=90, depth=75, overall=82
+                ),
+            ).dict()
+            kind = "optimized"
+        items.append(
+            {
+                "id": f"{i:08d}",
+                "type": kind,
+                "title": topic,
+                "content": content,
+                "timestamp": 1700000000.0 + i,
+                "formatted_date": "2024-11-14 22:13",
+                "metadata": metadata,
+            }
+        )
+    legacy = json.dumps(items)
+    start = time.perf_counter()
+    encoded = encode(items)
+    encode_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    assert decode(encoded) == items
+    decode_ms = (time.perf_counter() - start) * 1000
+    return {
+        "items": count,
+        "legacy_bytes_per_item": len(legacy) / count,
+        "current_bytes_per_item": len(encoded) / count,
+        "ratio": len(legacy) / len(encoded),
+        "encode_ms": encode_ms,
+        "decode_ms": decode_ms,
+    }
+
+
+if __name__ == "__main__":
+    for count in (50, 200, 1000):
+        row = benchmark(count)
+        print(
+            f"items={row['items']:<5} v1={row['legacy_bytes_per_item']:<8.1f} "
+            f"v3={row['current_bytes_per_item']:<8.1f} ratio={row['ratio']:<6.1f} "
+            f"encode={row['encode_ms']:.1f}ms decode={row['decode_ms']:.1f}ms"
+        )
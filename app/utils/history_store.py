@@ -0,0 +1,239 @@
+"""Optional server-side history storage backed by a local SQLite file.
+
+Enable with ``HISTORY_BACKEND=sqlite``; the file defaults to ``history.db``
+and can be changed with ``HISTORY_DB_PATH``. Listing only reads the
+summary table, and an item's content and metadata are loaded when it is
+opened. Search uses an FTS5 table kept in sync on every add and delete.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    type TEXT NOT NULL,
+    title TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    formatted_date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history_payload (
+    id TEXT PRIMARY KEY REFERENCES history(id) ON DELETE CASCADE,
+    content TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_owner_ts ON history (owner, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS history_owner_type_ts ON history (owner, type, timestamp DESC, id DESC);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE history_fts USING fts5(
+    title, content, topic, tone, original_prompt, owner UNINDEXED
+);
+INSERT INTO history_fts (rowid, title, content, topic, tone, original_prompt, owner)
+SELECT h.rowid, h.title, p.content,
+    COALESCE(json_extract(p.metadata, '$.topic'), ''),
+    COALESCE(json_extract(p.metadata, '$.tone'), ''),
+    COALESCE(json_extract(p.metadata, '$.original_prompt'), ''),
+    h.owner
+FROM history h JOIN history_payload p ON p.id = h.id;
+"""
+
+SUMMARY_COLUMNS = "id, type, title, timestamp, formatted_date"
+
+FTS_TOKEN = re.compile(r"\w+")
+
+
+def fts_query(query: str) -> str:
+    """Turn user input into an FTS5 query where every word is a prefix match."""
+    return " ".join(f'"{token}"*' for token in FTS_TOKEN.findall(query))
+
+
+class SQLiteHistoryStore:
+    """History rows per owner with keyset pagination."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+        self.has_fts = self._create_fts()
+
+    def _create_fts(self) -> bool:
+        """Create and backfill the full-text index if it does not exist yet."""
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'history_fts'"
+            ).fetchone()
+            if exists:
+                return True
+            try:
+                with self._conn:
+                    self._conn.executescript(FTS_SCHEMA)
+                return True
+            except sqlite3.OperationalError as e:
+                logging.exception(f"History search unavailable, FTS5 not supported: {e}")
+                return False
+
+    def _delete_fts(self, rowids: list):
+        if self.has_fts and rowids:
+            self._conn.executemany(
+                "DELETE FROM history_fts WHERE rowid = ?", [(r,) for r in rowids]
+            )
+
+    def add(self, owner: str, item: dict):
+        """Insert or replace a history item."""
+        metadata = item.get("metadata", {})
+        with self._lock, self._conn:
+            self._delete_fts(
+                [
+                    row[0]
+                    for row in self._conn.execute(
+                        "SELECT rowid FROM history WHERE id = ?", (item["id"],)
+                    )
+                ]
+            )
+            cursor = self._conn.execute(
+                "INSERT OR REPLACE INTO history (id, owner, type, title, timestamp, formatted_date) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    item["id"],
+                    owner,
+                    item["type"],
+                    item["title"],
+                    item["timestamp"],
+                    item.get("formatted_date", ""),
+                ),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO history_payload (id, content, metadata) VALUES (?, ?, ?)",
+                (item["id"], item["content"], json.dumps(metadata)),
+            )
+            if self.has_fts:
+                self._conn.execute(
+                    "INSERT INTO history_fts "
+                    "(rowid, title, content, topic, tone, original_prompt, owner) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        cursor.lastrowid,
+                        item["title"],
+                        item["content"],
+                        metadata.get("topic", ""),
+                        metadata.get("tone", ""),
+                        metadata.get("original_prompt", ""),
+                        owner,
+                    ),
+                )
+
+    def delete(self, owner: str, item_id: str):
+        """Delete an item owned by the owner."""
+        with self._lock, self._conn:
+            self._delete_fts(
+                [
+                    row[0]
+                    for row in self._conn.execute(
+                        "SELECT rowid FROM history WHERE owner = ? AND id = ?",
+                        (owner, item_id),
+                    )
+                ]
+            )
+            self._conn.execute(
+                "DELETE FROM history WHERE owner = ? AND id = ?", (owner, item_id)
+            )
+
+    def clear(self, owner: str):
+        """Delete all items of the owner."""
+        with self._lock, self._conn:
+            self._delete_fts(
+                [
+                    row[0]
+                    for row in self._conn.execute(
+                        "SELECT rowid FROM history WHERE owner = ?", (owner,)
+                    )
+                ]
+            )
+            self._conn.execute("DELETE FROM history WHERE owner = ?", (owner,))
+
+    def page(
+        self,
+        owner: str,
+        limit: int,
+        before: Optional[tuple[float, str]] = None,
+        type: Optional[str] = None,
+    ) -> list[dict]:
+        """Get item summaries, newest first, strictly older than ``before``."""
+        query = f"SELECT {SUMMARY_COLUMNS} FROM history WHERE owner = ?"
+        params: list = [owner]
+        if type:
+            query += " AND type = ?"
+            params.append(type)
+        if before is not None:
+            query += " AND (timestamp, id) < (?, ?)"
+            params.extend(before)
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, owner: str, item_id: str) -> Optional[dict]:
+        """Get a full item, including content and metadata."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT h.id, h.type, h.title, h.timestamp, h.formatted_date, "
+                f"p.content, p.metadata FROM history h JOIN history_payload p ON p.id = h.id "
+                f"WHERE h.owner = ? AND h.id = ?",
+                (owner, item_id),
+            ).fetchone()
+        if row is None:
+            return None
+        item = dict(row)
+        item["metadata"] = json.loads(item["metadata"])
+        return item
+
+    def search(self, owner: str, query: str, limit: int) -> list[dict]:
+        """Get summaries of the owner's items best matching the query."""
+        match = fts_query(query)
+        if not self.has_fts or not match:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT h.id, h.type, h.title, h.timestamp, h.formatted_date "
+                f"FROM history_fts f JOIN history h ON h.rowid = f.rowid "
+                f"WHERE history_fts MATCH ? AND f.owner = ? "
+                f"ORDER BY bm25(history_fts, 2.0, 1.0, 1.0, 1.0, 1.0) LIMIT ?",
+                (match, owner, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self, owner: str) -> int:
+        """Count the items of the owner."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM history WHERE owner = ?", (owner,)
+            ).fetchone()[0]
+
+
+_store: Optional[SQLiteHistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> Optional[SQLiteHistoryStore]:
+    """Get the shared store, or None when the SQLite backend is disabled."""
+    global _store
+    if os.environ.get("HISTORY_BACKEND", "local").lower() != "sqlite":
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = SQLiteHistoryStore(os.environ.get("HISTORY_DB_PATH", "history.db"))
+    return _store
@@ -0,0 +1,228 @@
+"""Large-input mode for very long prompts.
+
+Thresholds, in characters:
+
+    LARGE_INPUT_CHARS  longer prompts leave the session state: the full
+                       body goes to the blob store and the state keeps a
+                       PREVIEW_CHARS preview and a reference to the body
+    MAX_INPUT_CHARS    longer input is rejected outright
+
+Bodies are stored content-addressed and zlib-compressed in
+``PROMPT_BLOB_DIR`` (default ``blobs/``). They are written, read and scored
+in CHUNK_CHARS chunks, so no step copies the whole body more than once, and
+every pass over a body is linear in its size. A reference looks like
+``blob:<digest>:<length>`` and can be kept in history metadata; it is
+validated before use since history comes back from the browser.
+
+Run ``python -m app.utils.large_input`` for a stress benchmark at 10 KB,
+100 KB and 1 MB.
+"""
+
+import codecs
+import hashlib
+import os
+import re
+import tempfile
+import zlib
+from typing import Iterable, Iterator
+
+from app.utils import metrics
+from app.utils.scoring import (
+    ADDITIVE_FEATURES,
+    PromptScores,
+    combine_features,
+    score_features,
+    summarize,
+)
+
+LARGE_INPUT_CHARS = 128_000
+MAX_INPUT_CHARS = 4_000_000
+PREVIEW_CHARS = 2_000
+CHUNK_CHARS = 64 * 1024
+CHUNK_BYTES = 64 * 1024
+
+REF = re.compile(r"blob:([0-9a-f]{32}):(\d+)")
+
+
+def is_large(text: str) -> bool:
+    """Check whether a prompt is handled in large-input mode."""
+    return len(text) > LARGE_INPUT_CHARS
+
+
+def preview(text: str) -> str:
+    """Get the start of a body, cut at a line break when there is one nearby."""
+    if len(text) <= PREVIEW_CHARS:
+        return text
+    cut = text.rfind("\n", PREVIEW_CHARS // 2, PREVIEW_CHARS)
+    return text[: cut if cut > 0 else PREVIEW_CHARS] + "\n…"
+
+
+def chunked(text: str, size: int = CHUNK_CHARS) -> Iterator[str]:
+    """Split a text into chunks of at most ``size`` characters."""
+    for start in range(0, len(text), size):
+        yield text[start : start + size]
+
+
+def ref_size(ref: str) -> int:
+    """Get the length in characters of the body behind a reference."""
+    return int(_parse(ref).group(2))
+
+
+def _parse(ref: str) -> re.Match:
+    match = REF.fullmatch(ref)
+    if match is None:
+        raise ValueError(f"Invalid blob reference: {ref[:60]!r}")
+    return match
+
+
+def _directory() -> str:
+    return os.environ.get("PROMPT_BLOB_DIR", "blobs")
+
+
+def _path(ref: str) -> str:
+    return os.path.join(_directory(), f"{_parse(ref).group(1)}.z")
+
+
+def put(chunks: Iterable[str]) -> str:
+    """Store a body given as chunks and get its reference.
+
+    The body is hashed and compressed as it streams to a temporary file,
+    which is then moved into place; storing the same body twice keeps one
+    copy.
+    """
+    directory = _directory()
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.blake2b(digest_size=16)
+    compressor = zlib.compressobj(6)
+    length = stored = 0
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            for chunk in chunks:
+                data = chunk.encode()
+                length += len(chunk)
+                digest.update(data)
+                stored += file.write(compressor.compress(data))
+            stored += file.write(compressor.flush())
+        ref = f"blob:{digest.hexdigest()}:{length}"
+        os.replace(temporary, _path(ref))
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    metrics.record("blobs", puts=1, chars=length, bytes_stored=stored)
+    return ref
+
+
+def chunks(ref: str) -> Iterator[str]:
+    """Read the body behind a reference in chunks."""
+    decompressor = zlib.decompressobj()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(_path(ref), "rb") as file:
+        while block := file.read(CHUNK_BYTES):
+            text = decoder.decode(decompressor.decompress(block))
+            if text:
+                yield text
+    tail = decoder.decode(decompressor.flush(), final=True)
+    if tail:
+        yield tail
+    metrics.record("blobs", reads=1)
+
+
+def get(ref: str) -> str:
+    """Read the whole body behind a reference."""
+    return "".join(chunks(ref))
+
+
+def exists(ref: str) -> bool:
+    """Check whether a reference is valid and its body is stored here."""
+    try:
+        return os.path.exists(_path(ref))
+    except ValueError:
+        return False
+
+
+def paragraphs(chunks: Iterable[str]) -> Iterator[str]:
+    """Re-cut a stream of chunks so that each piece ends at a blank line.
+
+    Pieces then split the text where paragraphs do, so their feature
+    summaries combine like those of app/utils/live_scoring.py. Text without
+    blank lines is cut at a line break once it spans a few chunks, so the
+    pending text stays bounded and the pass stays linear.
+    """
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        # Only the new chunk (and the character before it) can hold a new break.
+        cut = pending.rfind("\n\n", max(len(pending) - len(chunk) - 1, 0))
+        if cut >= 0:
+            cut += 2
+        elif len(pending) > 4 * CHUNK_CHARS:
+            cut = pending.rfind("\n") + 1 or len(pending)
+        else:
+            continue
+        yield pending[:cut]
+        pending = pending[cut:]
+    if pending:
+        yield pending
+
+
+def score_chunks(chunks: Iterable[str]) -> PromptScores:
+    """Score a body from its chunks without holding it whole."""
+    totals = [0.0] * len(ADDITIVE_FEATURES)
+    sentences: set[str] = set()
+    aspects: set[str] = set()
+    for piece in paragraphs(chunks):
+        summary = summarize(piece)
+        for i, value in enumerate(summary.counts):
+            totals[i] += value
+        sentences.update(summary.sentences)
+        aspects.update(summary.aspects)
+    return score_features(combine_features(totals, len(sentences), len(aspects)))
+
+
+def score_ref(ref: str) -> PromptScores:
+    """Score the body behind a reference, reading it chunk by chunk."""
+    return score_chunks(chunks(ref))
+
+
+def offload(text: str) -> tuple[str, PromptScores]:
+    """Store a large prompt out of band and score it, chunk by chunk."""
+    return put(chunked(text)), score_chunks(chunked(text))
+
+
+if __name__ == "__main__":
+    import shutil
+    import time
+
+    from app.utils.rewrite import rewrite_prompt
+    from app.utils.templates import DEFAULT_TEMPLATE
+
+    os.environ["PROMPT_BLOB_DIR"] = tempfile.mkdtemp(prefix="blobs-")
+    goals = ["Clarity", "Conciseness", "Structure", "Depth"]
+    block = DEFAULT_TEMPLATE + "\n\nMaybe add some relevant stuff, etc. Item %d.\n\n"
+    try:
+        for size in (10_000, 100_000, 1_000_000):
+            text = "".join(block % i for i in range(size // len(block) + 1))[:size]
+            timings = {}
+            start = time.perf_counter()
+            ref = put(chunked(text))
+            timings["store"] = time.perf_counter() - start
+            start = time.perf_counter()
+            body = get(ref)
+            timings["load"] = time.perf_counter() - start
+            assert body == text
+            start = time.perf_counter()
+            score_chunks(chunks(ref))
+            timings["score"] = time.perf_counter() - start
+            start = time.perf_counter()
+            optimized, _ = rewrite_prompt(body, "Aggressive", goals)
+            timings["rewrite"] = time.perf_counter() - start
+            state_chars = len(preview(text)) if is_large(text) else len(text)
+            per_kb = sum(timings.values()) * 1000 / (size / 1000)
+            print(
+                f"{size:>9} chars large={is_large(text)!s:<5} state={state_chars:<7} "
+                + " ".join(f"{name}={ms * 1000:.1f}ms" for name, ms in timings.items())
+                + f" total/KB={per_kb:.3f}ms"
+            )
+    finally:
+        shutil.rmtree(os.environ["PROMPT_BLOB_DIR"])
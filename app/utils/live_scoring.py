@@ -0,0 +1,135 @@
+"""Incremental scoring of a prompt while it is being edited.
+
+An ``IncrementalScorer`` keeps the text split into paragraphs together with
+each paragraph's feature summary (see ``scoring.summarize``) and running
+totals over all of them. On an edit only the paragraphs between the
+unchanged leading and trailing ones are summarized again; their old
+summaries are subtracted from the totals and the new ones added, and the
+scores are computed from the totals. Python-level work therefore scales
+with the edited paragraphs, not with the prompt.
+
+Scores can differ slightly from ``scoring.score_prompt`` on the same text:
+a lexicon phrase is never matched across a blank line here.
+
+Run ``python -m app.utils.live_scoring`` for a timing benchmark.
+"""
+
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from app.utils import metrics
+from app.utils.scoring import (
+    ADDITIVE_FEATURES,
+    FeatureSummary,
+    PromptScores,
+    combine_features,
+    score_features,
+    summarize,
+)
+
+MAX_SESSIONS = 256
+
+BLANK_LINE = re.compile(r"\n[ \t]*\n")
+
+
+class IncrementalScorer:
+    """Scores of one text, updated paragraph by paragraph."""
+
+    def __init__(self):
+        self.paragraphs: list[str] = []
+        self.summaries: list[FeatureSummary] = []
+        self.totals = [0.0] * len(ADDITIVE_FEATURES)
+        self.sentences: Counter = Counter()
+        self.aspects: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def _apply(self, summary: FeatureSummary, sign: int):
+        totals = self.totals
+        for i, value in enumerate(summary.counts):
+            totals[i] += sign * value
+        for sentence in summary.sentences:
+            self.sentences[sentence] += sign
+            if not self.sentences[sentence]:
+                del self.sentences[sentence]
+        for aspect in summary.aspects:
+            self.aspects[aspect] += sign
+            if not self.aspects[aspect]:
+                del self.aspects[aspect]
+
+    def update(self, text: str) -> PromptScores:
+        """Score the new text, re-summarizing only the paragraphs that changed."""
+        with self.lock:
+            old = self.paragraphs
+            new = BLANK_LINE.split(text)
+            limit = min(len(old), len(new))
+            prefix = 0
+            while prefix < limit and old[prefix] == new[prefix]:
+                prefix += 1
+            suffix = 0
+            while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+                suffix += 1
+            old_end, new_end = len(old) - suffix, len(new) - suffix
+            added = [summarize(paragraph) for paragraph in new[prefix:new_end]]
+            for summary in self.summaries[prefix:old_end]:
+                self._apply(summary, -1)
+            for summary in added:
+                self._apply(summary, 1)
+            self.summaries[prefix:old_end] = added
+            self.paragraphs = new
+            metrics.record(
+                "live_scoring",
+                updates=1,
+                paragraphs_scored=len(added),
+                paragraphs_reused=len(new) - len(added),
+            )
+            return score_features(
+                combine_features(self.totals, len(self.sentences), len(self.aspects))
+            )
+
+
+_scorers: OrderedDict[str, IncrementalScorer] = OrderedDict()
+_scorers_lock = threading.Lock()
+
+
+def score_live(token: str, text: str) -> PromptScores:
+    """Score the text a session is editing, reusing its previous version.
+
+    Scorers are kept for the most recently active ``MAX_SESSIONS`` sessions;
+    a session that was evicted just starts over from a full pass.
+    """
+    with _scorers_lock:
+        scorer = _scorers.get(token)
+        if scorer is None:
+            scorer = _scorers[token] = IncrementalScorer()
+            while len(_scorers) > MAX_SESSIONS:
+                _scorers.popitem(last=False)
+        else:
+            _scorers.move_to_end(token)
+    return scorer.update(text)
+
+
+if __name__ == "__main__":
+    from app.utils.scoring import extract_features
+    from app.utils.templates import DEFAULT_TEMPLATE
+
+    block = DEFAULT_TEMPLATE + "\n\n- Maybe add some relevant stuff, etc.\n\n"
+    for size in (10_000, 100_000, 1_000_000):
+        prompt = (block * (size // len(block) + 1))[:size]
+        start = time.perf_counter()
+        extract_features(prompt)
+        full_ms = (time.perf_counter() - start) * 1000
+        scorer = IncrementalScorer()
+        scorer.update(prompt)
+        runs = 20
+        middle = len(prompt) // 2
+        start = time.perf_counter()
+        for i in range(runs):
+            edited = prompt[:middle] + "very " * (i + 1) + prompt[middle:]
+            scores = scorer.update(edited)
+        edit_ms = (time.perf_counter() - start) / runs * 1000
+        print(
+            f"{size:>8} chars: full pass {full_ms:.2f} ms, "
+            f"one-word edit {edit_ms:.2f} ms -> {scores}"
+        )
@@ -0,0 +1,466 @@
+"""Model backends for the optimizer and generator.
+
+A backend turns a list of chat messages into a stream of text deltas.
+``ChatBackend`` talks to any OpenAI-compatible ``/chat/completions``
+endpoint; other kinds can be registered in ``BACKEND_KINDS``. Without a
+configured backend the app keeps using the rule-based rewrite passes.
+
+Backends are configured in ``LLM_BACKENDS_FILE`` (default
+``backends.json``), a JSON list of ``BackendConfig`` objects::
+
+    [{"name": "gpt", "base_url": "https://api.openai.com/v1", "model": "gpt-4o-mini",
+      "use_user_key": true},
+     {"name": "slow stub", "kind": "stub", "options": {"first_token_ms": 2000}}]
+
+or, for a single endpoint, with ``LLM_BASE_URL`` and ``LLM_MODEL``. Entering
+an API key in Settings enables the default OpenAI endpoint. The key from
+Settings is only sent to that endpoint and to configs that set
+``use_user_key``; every other endpoint gets the key from its config's
+``api_key_env`` variable, so a user's key never reaches other hosts.
+
+All requests share one pooled ``httpx.AsyncClient`` per process, so
+connections are reused across sessions. Every request has connect and
+read timeouts, and connection errors and retryable statuses (429, 5xx)
+are retried with jittered exponential backoff, honouring ``Retry-After``,
+as long as no text has been streamed yet.
+
+Run ``python -m app.utils.llm`` for a throughput and time-to-first-token
+benchmark against the local stub server in app/utils/llm_stub.py.
+"""
+
+import asyncio
+import contextlib
+import functools
+import json
+import logging
+import os
+import random
+import re
+import time
+import unicodedata
+from typing import AsyncIterator, Optional
+
+import httpx
+import reflex as rx
+
+from app.utils import metrics
+from app.utils.llm_stub import stub_reply
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+DEFAULT_MODEL = "gpt-4o-mini"
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 60.0
+POOL_TIMEOUT = 10.0
+MAX_RETRIES = 2
+STREAM_FLUSH_SECONDS = 0.05
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 8.0
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+POOL_LIMITS = httpx.Limits(
+    max_connections=64, max_keepalive_connections=16, keepalive_expiry=30.0
+)
+
+SYSTEM_PROMPT = (
+    "You improve prompts written for large language models. Reply with the "
+    "improved prompt only, without commentary, and keep the author's intent, "
+    "facts, placeholders and code blocks."
+)
+GOAL_INSTRUCTIONS = {
+    "Clarity": "Replace vague terms and hedges with specific instructions.",
+    "Conciseness": "Remove filler, repetition and redundant sentences.",
+    "Structure": "Organise the prompt into headed sections and lists.",
+    "Depth": "Add the missing details a model needs: audience, format, length and examples.",
+}
+LEVEL_INSTRUCTIONS = {
+    "Light": "Make minimal edits and keep the original wording where possible.",
+    "Moderate": "Rewrite sentences where it helps, keeping the overall shape.",
+    "Aggressive": "Restructure freely and ask the model to reason step by step.",
+}
+TRAILING_SPACE = re.compile(r"[ \t]+$", re.MULTILINE)
+
+GENERATOR_INSTRUCTION = (
+    "Turn this draft into a complete, specific prompt. Keep its sections and "
+    "fill in what the draft leaves implicit."
+)
+
+
+class BackendError(Exception):
+    """A model backend request failed for good."""
+
+
+class BackendConfig(rx.Base):
+    """A configured model endpoint and its parameters."""
+
+    name: str
+    kind: str = "openai"
+    base_url: str = DEFAULT_BASE_URL
+    model: str = DEFAULT_MODEL
+    api_key_env: str = "OPENAI_API_KEY"
+    # Send the API key entered in Settings instead of ``api_key_env``.
+    use_user_key: bool = False
+    temperature: float = 0.2
+    max_tokens: int = 2048
+    timeout: float = READ_TIMEOUT
+    retries: int = MAX_RETRIES
+    # Settings of a specific kind, e.g. a stub's latencies.
+    options: dict[str, float] = {}
+
+
+class Usage(rx.Base):
+    """Token counts reported by a backend for one request."""
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Get the process-wide pooled client for the running event loop."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            limits=POOL_LIMITS,
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT, pool=POOL_TIMEOUT),
+        )
+        _client_loop = loop
+        metrics.record("llm", clients=1)
+    return _client
+
+
+async def close_client():
+    """Close the shared client and its pooled connections."""
+    global _client
+    if _client is not None and _client_loop is asyncio.get_running_loop():
+        await _client.aclose()
+    _client = None
+
+
+@contextlib.asynccontextmanager
+async def client_lifespan():
+    """App lifespan task that closes the shared client on shutdown."""
+    try:
+        yield
+    finally:
+        await close_client()
+
+
+def _backoff(attempt: int, retry_after: Optional[str]) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_BACKOFF_SECONDS)
+        except ValueError:
+            pass
+    delay = min(BACKOFF_SECONDS * 2**attempt, MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status: int, retry_after: Optional[str]):
+        super().__init__(f"HTTP {status}")
+        self.retry_after = retry_after
+
+
+class ChatBackend:
+    """An OpenAI-compatible chat completions endpoint.
+
+    One instance serves one request: after ``stream`` finishes, ``usage``
+    holds the reported token counts and ``first_token_s`` the time to the
+    first streamed text.
+    """
+
+    def __init__(
+        self, config: BackendConfig, api_key: str = "", client: Optional[httpx.AsyncClient] = None
+    ):
+        self.config = config
+        self.client = client
+        self.api_key = api_key or os.environ.get(config.api_key_env, "")
+        self.usage = Usage()
+        self.first_token_s: Optional[float] = None
+
+    def _request(self, messages: list[dict[str, str]]) -> tuple[str, dict, dict]:
+        url = f"{self.config.base_url.rstrip('/')}/chat/completions"
+        headers = {"Accept": "text/event-stream"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        payload = {
+            "model": self.config.model,
+            "messages": messages,
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        return url, headers, payload
+
+    async def stream(self, messages: list[dict[str, str]]) -> AsyncIterator[str]:
+        """Stream the completion's text as it arrives."""
+        url, headers, payload = self._request(messages)
+        timeout = httpx.Timeout(self.config.timeout, connect=CONNECT_TIMEOUT, pool=POOL_TIMEOUT)
+        client = self.client or get_client()
+        started = time.perf_counter()
+        streamed = False
+        for attempt in range(self.config.retries + 1):
+            try:
+                async with client.stream(
+                    "POST", url, json=payload, headers=headers, timeout=timeout
+                ) as response:
+                    if response.status_code in RETRY_STATUSES:
+                        raise _RetryableStatus(
+                            response.status_code, response.headers.get("retry-after")
+                        )
+                    if response.status_code >= 400:
+                        body = (await response.aread()).decode(errors="replace")
+                        raise BackendError(
+                            f"{self.config.name}: HTTP {response.status_code}: {body[:200]}"
+                        )
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        # Read on past the end marker so the connection
+                        # goes back to the pool instead of being dropped.
+                        if data == "[DONE]":
+                            continue
+                        event = json.loads(data)
+                        if event.get("usage"):
+                            self.usage = Usage(
+                                prompt_tokens=event["usage"].get("prompt_tokens", 0),
+                                completion_tokens=event["usage"].get("completion_tokens", 0),
+                            )
+                        for choice in event.get("choices") or ():
+                            text = (choice.get("delta") or {}).get("content")
+                            if text:
+                                if not streamed:
+                                    streamed = True
+                                    self.first_token_s = time.perf_counter() - started
+                                yield text
+                metrics.record(
+                    "llm",
+                    requests=1,
+                    prompt_tokens=self.usage.prompt_tokens,
+                    completion_tokens=self.usage.completion_tokens,
+                    first_token_ms=int((self.first_token_s or 0) * 1000),
+                    total_ms=int((time.perf_counter() - started) * 1000),
+                )
+                return
+            except (httpx.TransportError, _RetryableStatus) as e:
+                if streamed or attempt == self.config.retries:
+                    metrics.record("llm", failures=1)
+                    raise BackendError(f"{self.config.name}: {e!r}") from e
+                delay = _backoff(attempt, getattr(e, "retry_after", None))
+                logging.warning(
+                    f"Model backend {self.config.name} failed ({e!r}), retrying in {delay:.2f}s"
+                )
+                metrics.record("llm", retries=1)
+                await asyncio.sleep(delay)
+            except (json.JSONDecodeError, AttributeError, TypeError) as e:
+                # Not JSON, or JSON that is not a chunk object (e.g. a list).
+                metrics.record("llm", failures=1)
+                raise BackendError(f"{self.config.name}: malformed stream: {e}") from e
+
+    async def complete(self, messages: list[dict[str, str]]) -> str:
+        """Get the whole completion."""
+        return "".join([text async for text in self.stream(messages)])
+
+
+async def accumulate(
+    deltas: AsyncIterator[str], interval: float = STREAM_FLUSH_SECONDS
+) -> AsyncIterator[str]:
+    """Yield the text streamed so far, at most once per ``interval`` and at the end.
+
+    Each yield becomes a state update sent to the browser, so batching
+    deltas keeps a fast stream from flooding the websocket.
+    """
+    parts: list[str] = []
+    flushed = time.perf_counter()
+    async for delta in deltas:
+        parts.append(delta)
+        now = time.perf_counter()
+        if now - flushed >= interval:
+            flushed = now
+            yield "".join(parts)
+    yield "".join(parts)
+
+
+class StubBackend(ChatBackend):
+    """An in-process stand-in that echoes the request like app/utils/llm_stub.py.
+
+    Its ``options`` set ``first_token_ms``, ``token_ms`` and
+    ``failure_rate``, so slow or failing backends can be tried without a
+    network, e.g. in compare mode.
+    """
+
+    async def stream(self, messages: list[dict[str, str]]) -> AsyncIterator[str]:
+        options = self.config.options
+        started = time.perf_counter()
+        await asyncio.sleep(options.get("first_token_ms", 0) / 1000)
+        if random.random() < options.get("failure_rate", 0):
+            metrics.record("llm", failures=1)
+            raise BackendError(f"{self.config.name}: simulated failure")
+        words, usage = stub_reply(messages, self.config.max_tokens)
+        self.first_token_s = time.perf_counter() - started
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(options.get("token_ms", 0) / 1000)
+            yield word
+        self.usage = Usage(
+            prompt_tokens=usage["prompt_tokens"], completion_tokens=usage["completion_tokens"]
+        )
+
+
+BACKEND_KINDS: dict[str, type[ChatBackend]] = {"openai": ChatBackend, "stub": StubBackend}
+
+
+@functools.lru_cache(maxsize=None)
+def load_backends() -> tuple[BackendConfig, ...]:
+    """Read the configured backends, from the backends file or the environment.
+
+    The configuration is read once per process, so changes to it take
+    effect on restart.
+    """
+    path = os.environ.get("LLM_BACKENDS_FILE", "backends.json")
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                return tuple(BackendConfig.parse_obj(entry) for entry in json.load(f))
+        except Exception as e:
+            logging.exception(f"Invalid backends file {path}: {e}")
+            return ()
+    base_url = os.environ.get("LLM_BASE_URL")
+    if base_url:
+        return (
+            BackendConfig(
+                name="default", base_url=base_url, model=os.environ.get("LLM_MODEL", DEFAULT_MODEL)
+            ),
+        )
+    return ()
+
+
+def get_backends(api_key: str = "") -> list[ChatBackend]:
+    """Create one backend per configured endpoint, for one request each.
+
+    Without a configuration, the default OpenAI endpoint is used when the
+    user entered an API key. ``api_key`` is only passed to backends whose
+    config sets ``use_user_key``.
+    """
+    configs = load_backends()
+    if not configs and api_key:
+        configs = (BackendConfig(name="openai", use_user_key=True),)
+    backends = []
+    for config in configs:
+        kind = BACKEND_KINDS.get(config.kind)
+        if kind is None:
+            logging.warning(f"Unknown backend kind {config.kind!r} for {config.name}")
+            continue
+        backends.append(kind(config, api_key if config.use_user_key else ""))
+    return backends
+
+
+def get_backend(api_key: str = "", name: str = "") -> Optional[ChatBackend]:
+    """Create a backend for one request, or None to use the built-in rewrite.
+
+    Uses the backend called ``name``, or else the first configured one.
+    """
+    for backend in get_backends(api_key):
+        if not name or backend.config.name == name:
+            return backend
+    return None
+
+
+def normalize_prompt(text: str) -> str:
+    """Canonicalise a prompt without changing what it asks for.
+
+    Normalises Unicode and line endings, and drops trailing whitespace and
+    surrounding blank lines; indentation is kept, as code may depend on it.
+    Requests built from the result hash the same in the response cache.
+    """
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    return TRAILING_SPACE.sub("", text).strip("\n")
+
+
+def optimization_messages(original: str, level: str, goals: list[str]) -> list[dict[str, str]]:
+    """Build the chat request that asks a model to optimize a prompt."""
+    instructions = [LEVEL_INSTRUCTIONS.get(level, "")]
+    instructions += [GOAL_INSTRUCTIONS[goal] for goal in GOAL_INSTRUCTIONS if goal in goals]
+    original = normalize_prompt(original)
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": "\n".join(filter(None, instructions)) + f"\n\nPrompt:\n{original}",
+        },
+    ]
+
+
+def generation_messages(draft: str) -> list[dict[str, str]]:
+    """Build the chat request that asks a model to complete a generated draft."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"{GENERATOR_INSTRUCTION}\n\nDraft:\n{normalize_prompt(draft)}",
+        },
+    ]
+
+
+async def benchmark(requests: int = 50, concurrency: int = 10, pooled: bool = True) -> dict:
+    """Stream completions from a local stub and measure time to first token."""
+    from app.utils.llm_stub import StubServer
+
+    server = StubServer(first_token_ms=50, token_ms=1)
+    base_url = await server.start()
+    config = BackendConfig(name="stub", base_url=base_url, model="stub")
+    messages = optimization_messages("Write a short poem about the sea. " * 20, "Moderate", ["Clarity"])
+    semaphore = asyncio.Semaphore(concurrency)
+    first_tokens: list[float] = []
+    tokens = 0
+
+    async def one():
+        nonlocal tokens
+        async with semaphore:
+            if pooled:
+                backend = ChatBackend(config)
+                async for _ in backend.stream(messages):
+                    pass
+            else:
+                async with httpx.AsyncClient() as client:
+                    backend = ChatBackend(config, client=client)
+                    async for _ in backend.stream(messages):
+                        pass
+            first_tokens.append(backend.first_token_s or 0.0)
+            tokens += backend.usage.completion_tokens
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    await close_client()
+    await server.close()
+    first_tokens.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "pooled": pooled,
+        "connections": server.connections,
+        "ttft_p50_ms": first_tokens[len(first_tokens) // 2] * 1000,
+        "ttft_p95_ms": first_tokens[int(len(first_tokens) * 0.95)] * 1000,
+        "tokens_per_s": tokens / elapsed,
+    }
+
+
+if __name__ == "__main__":
+
+    async def main():
+        for pooled in (True, False):
+            row = await benchmark(pooled=pooled)
+            print(
+                f"pooled={row['pooled']!s:<5} requests={row['requests']} "
+                f"concurrency={row['concurrency']} connections={row['connections']:<3} "
+                f"ttft p50={row['ttft_p50_ms']:.1f}ms p95={row['ttft_p95_ms']:.1f}ms "
+                f"throughput={row['tokens_per_s']:.0f} tokens/s"
+            )
+
+    asyncio.run(main())
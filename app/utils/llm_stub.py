@@ -0,0 +1,194 @@
+"""A local stand-in for an OpenAI-style chat completions endpoint.
+
+Serves ``POST /v1/chat/completions``, streamed (server-sent events) or not,
+on plain asyncio, so backends can be exercised and benchmarked without a
+network or an API key. The reply echoes the last user message word by
+word after ``first_token_ms``, with ``token_ms`` between words, and a
+``failure_rate`` share of requests fail with HTTP 503.
+
+    python -m app.utils.llm_stub --port 8001 --first-token-ms 200 --token-ms 5
+
+then point the app at it with ``LLM_BASE_URL=http://127.0.0.1:8001/v1``.
+Backends of kind "stub" (see ``llm.StubBackend``) produce the same reply
+in-process, without a server.
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Optional
+
+WORD = re.compile(r"\s*\S+")
+
+
+def stub_reply(
+    messages: list[dict[str, str]], max_tokens: Optional[int] = None
+) -> tuple[list[str], dict[str, int]]:
+    """Get the stub's reply, as a list of tokens, and its usage counts."""
+    prompt_tokens = sum(len(WORD.findall(m.get("content", ""))) for m in messages)
+    reply = next(
+        (m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), ""
+    )
+    words = WORD.findall(reply)[: max_tokens or None]
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(words),
+        "total_tokens": prompt_tokens + len(words),
+    }
+    return words, usage
+
+
+class StubServer:
+    """A minimal HTTP/1.1 server with keep-alive and chunked streaming."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        first_token_ms: float = 0.0,
+        token_ms: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.connections = 0
+        self.requests = 0
+        self.server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self) -> str:
+        """Start listening and get the base URL to configure a backend with."""
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = lines[0].split(" ", 2)
+                headers = {
+                    name.strip().lower(): value.strip()
+                    for name, _, value in (line.partition(":") for line in lines[1:] if line)
+                }
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                await self._respond(method, path, body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    return
+        finally:
+            writer.close()
+
+    async def _respond(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter):
+        if method != "POST" or path.rstrip("/") != "/v1/chat/completions":
+            return await self._send_json(writer, 404, {"error": {"message": "Not found"}})
+        if self.random.random() < self.failure_rate:
+            return await self._send_json(
+                writer, 503, {"error": {"message": "Overloaded"}}, {"Retry-After": "0"}
+            )
+        try:
+            request = json.loads(body)
+            messages = request["messages"]
+        except (ValueError, KeyError) as e:
+            return await self._send_json(writer, 400, {"error": {"message": str(e)}})
+        words, usage = stub_reply(messages, request.get("max_tokens"))
+        model = request.get("model", "stub")
+        created = int(time.time())
+        await asyncio.sleep(self.first_token_ms / 1000)
+        if not request.get("stream"):
+            return await self._send_json(
+                writer,
+                200,
+                {
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(words)},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                },
+            )
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n"
+        )
+
+        async def event(data: str):
+            payload = f"data: {data}\n\n".encode()
+            writer.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+            await writer.drain()
+
+        for i, word in enumerate(words):
+            if i and self.token_ms:
+                await asyncio.sleep(self.token_ms / 1000)
+            chunk = {
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+            }
+            await event(json.dumps(chunk))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            await event(
+                json.dumps(
+                    {"object": "chat.completion.chunk", "model": model, "choices": [], "usage": usage}
+                )
+            )
+        await event("[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _send_json(
+        self, writer: asyncio.StreamWriter, status: int, body: dict, headers: Optional[dict] = None
+    ):
+        data = json.dumps(body).encode()
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 503: "Service Unavailable"}
+        head = f"HTTP/1.1 {status} {reason[status]}\r\nContent-Type: application/json\r\n"
+        head += f"Content-Length: {len(data)}\r\n"
+        for name, value in (headers or {}).items():
+            head += f"{name}: {value}\r\n"
+        writer.write(head.encode() + b"\r\n" + data)
+        await writer.drain()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-token-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    async def main():
+        server = StubServer(
+            args.host, args.port, args.first_token_ms, args.token_ms, args.failure_rate
+        )
+        print(f"Serving a stub chat completions API at {await server.start()}")
+        async with server.server:
+            await server.server.serve_forever()
+
+    asyncio.run(main())
@@ -0,0 +1,20 @@
+"""Process-wide counters for performance metrics."""
+
+from collections import Counter, defaultdict
+
+_counters: defaultdict[str, Counter] = defaultdict(Counter)
+
+
+def record(namespace: str, **increments: int):
+    """Add the given increments to the counters in a namespace."""
+    _counters[namespace].update(increments)
+
+
+def snapshot() -> dict[str, dict[str, int]]:
+    """Get a copy of all counters, grouped by namespace."""
+    return {name: dict(counter) for name, counter in sorted(_counters.items())}
+
+
+def reset():
+    """Clear all counters."""
+    _counters.clear()
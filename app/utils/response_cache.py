@@ -0,0 +1,369 @@
+"""Persistent cache of model responses, shared by all sessions.
+
+Responses are stored in a local SQLite file, ``RESPONSE_CACHE_PATH``
+(default ``responses.db``; set it empty to disable the cache), keyed by a
+hash of the backend's model parameters and the request messages. Requests
+are built from normalised inputs (see ``llm.normalize_prompt``), so the
+same prompt with different line endings, trailing whitespace or goal order
+hits the same entry. Entries expire ``RESPONSE_CACHE_TTL`` seconds after
+they were stored (default a week), and once the responses take more than
+``RESPONSE_CACHE_MAX_BYTES`` the least recently used ones are evicted.
+
+Identical requests that arrive while one is in flight share its backend
+call: the call runs in a task of its own, and every request, including
+the first, replays its stream. A session that gives up therefore does not
+cancel the call for the others, and the finished response still fills the
+cache. Coalescing is per process; the cache file is shared by all of them.
+
+Hits, misses, coalesced requests and the bytes and tokens saved are
+counted under "response_cache" in app/utils/metrics.py; ``stats`` adds the
+hit rate and the size of the cache. Run ``python -m app.utils.response_cache``
+for a benchmark against the local stub server.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import AsyncIterator, NamedTuple, Optional
+
+from app.utils import metrics
+from app.utils.llm import BackendError, ChatBackend, Usage
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key BLOB PRIMARY KEY,
+    model TEXT NOT NULL,
+    text TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+CREATE INDEX IF NOT EXISTS responses_created ON responses (created);
+"""
+
+
+class CachedResponse(NamedTuple):
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+
+
+def request_key(backend: ChatBackend, messages: list[dict[str, str]]) -> bytes:
+    """Hash everything about a request that changes the response, except the API key."""
+    config = backend.config
+    request = {
+        "kind": config.kind,
+        "base_url": config.base_url.rstrip("/"),
+        "model": config.model,
+        "temperature": config.temperature,
+        "max_tokens": config.max_tokens,
+        "messages": messages,
+    }
+    data = json.dumps(request, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class ResponseCache:
+    """Responses by request key with a TTL and a size bound, in SQLite."""
+
+    def __init__(
+        self, path: str, ttl: float = DEFAULT_TTL_SECONDS, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self.total_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(bytes), 0) FROM responses"
+            ).fetchone()[0]
+            self._purge_expired()
+
+    def get(self, key: bytes) -> Optional[CachedResponse]:
+        """Get a stored response, marking it as recently used."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT text, prompt_tokens, completion_tokens, bytes, created "
+                "FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            text, prompt_tokens, completion_tokens, size, created = row
+            if created + self.ttl < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+                metrics.record("response_cache", expired=1)
+                return None
+            self._conn.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+        return CachedResponse(text, prompt_tokens, completion_tokens)
+
+    def put(self, key: bytes, model: str, response: CachedResponse):
+        """Store a response, evicting the least recently used ones if over the bound."""
+        size = len(response.text.encode())
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            old = self._conn.execute(
+                "SELECT bytes FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, model, text, prompt_tokens, completion_tokens, bytes, created, used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model, *response, size, now, now),
+            )
+            self.total_bytes += size - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes:
+                self._purge_expired()
+            evicted = 0
+            while self.total_bytes > self.max_bytes:
+                rows = self._conn.execute(
+                    "SELECT key, bytes FROM responses ORDER BY used LIMIT 64"
+                ).fetchall()
+                if not rows:
+                    break
+                for row_key, row_bytes in rows:
+                    if self.total_bytes <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (row_key,))
+                    self.total_bytes -= row_bytes
+                    evicted += 1
+        metrics.record("response_cache", stored=1, bytes_stored=size, evicted=evicted)
+
+    def _purge_expired(self):
+        """Delete expired responses. Must be called with the lock held."""
+        cutoff = time.time() - self.ttl
+        size, count = self._conn.execute(
+            "SELECT COALESCE(SUM(bytes), 0), COUNT(*) FROM responses WHERE created < ?",
+            (cutoff,),
+        ).fetchone()
+        if count:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+            self.total_bytes -= size
+            metrics.record("response_cache", expired=count)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get the process-wide response cache, or None if it is disabled."""
+    global _cache
+    path = os.environ.get("RESPONSE_CACHE_PATH", "responses.db")
+    if not path:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                path,
+                ttl=float(os.environ.get("RESPONSE_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+                max_bytes=int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            )
+    return _cache
+
+
+class _Flight:
+    """One backend call, replayed to every request that joined it."""
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self.usage = Usage()
+        self.done = False
+        self.error: Optional[BackendError] = None
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def replay(self) -> AsyncIterator[str]:
+        i = 0
+        while True:
+            # Take the event before reading, so a part added meanwhile
+            # sets it and the wait below returns at once.
+            changed = self.changed
+            while i < len(self.parts):
+                yield self.parts[i]
+                i += 1
+            if self.done:
+                break
+            await changed.wait()
+        if self.error is not None:
+            raise self.error
+
+
+_flights: dict[bytes, _Flight] = {}
+
+
+async def _run(
+    key: bytes,
+    flight: _Flight,
+    backend: ChatBackend,
+    messages: list[dict[str, str]],
+    cache: Optional[ResponseCache],
+):
+    try:
+        async for text in backend.stream(messages):
+            flight.parts.append(text)
+            flight.notify()
+        flight.usage = backend.usage
+    except BackendError as e:
+        flight.error = e
+    except asyncio.CancelledError:
+        # The joined requests must not take the partial text for a
+        # whole response, and it must not be cached.
+        flight.error = BackendError(f"{backend.config.name}: the call was cancelled")
+        raise
+    except Exception as e:
+        flight.error = BackendError(f"{backend.config.name}: {e!r}")
+    finally:
+        flight.done = True
+        flight.notify()
+        _flights.pop(key, None)
+    if flight.error is None and cache is not None:
+        response = CachedResponse(
+            "".join(flight.parts), flight.usage.prompt_tokens, flight.usage.completion_tokens
+        )
+        try:
+            await asyncio.to_thread(cache.put, key, backend.config.model, response)
+        except sqlite3.Error as e:
+            logging.exception(f"Cannot store a model response: {e}")
+
+
+class CachingBackend:
+    """A backend that answers from the response cache or from a shared call.
+
+    Has the interface of ``ChatBackend``; ``cached`` tells whether the
+    last response came from the cache.
+    """
+
+    def __init__(self, backend: ChatBackend, cache: Optional[ResponseCache] = None):
+        self.backend = backend
+        self.config = backend.config
+        self.cache = cache
+        self.usage = Usage()
+        self.cached = False
+
+    async def stream(self, messages: list[dict[str, str]]) -> AsyncIterator[str]:
+        """Stream a response from the cache, a call in flight or a new call."""
+        key = request_key(self.backend, messages)
+        hit = None
+        if self.cache is not None:
+            try:
+                hit = await asyncio.to_thread(self.cache.get, key)
+            except sqlite3.Error as e:
+                logging.exception(f"Cannot read the response cache: {e}")
+        if hit is not None:
+            self.cached = True
+            self.usage = Usage(
+                prompt_tokens=hit.prompt_tokens, completion_tokens=hit.completion_tokens
+            )
+            metrics.record(
+                "response_cache",
+                hits=1,
+                bytes_saved=len(hit.text.encode()),
+                tokens_saved=hit.prompt_tokens + hit.completion_tokens,
+            )
+            yield hit.text
+            return
+        flight = _flights.get(key)
+        if flight is None:
+            flight = _flights[key] = _Flight()
+            flight.task = asyncio.create_task(
+                _run(key, flight, self.backend, messages, self.cache)
+            )
+            metrics.record("response_cache", misses=1)
+        else:
+            metrics.record("response_cache", coalesced=1)
+        async for text in flight.replay():
+            yield text
+        self.usage = flight.usage
+
+    async def complete(self, messages: list[dict[str, str]]) -> str:
+        """Get the whole response."""
+        return "".join([text async for text in self.stream(messages)])
+
+
+def cached(backend: ChatBackend) -> CachingBackend:
+    """Wrap a backend so it uses the process-wide response cache."""
+    return CachingBackend(backend, get_response_cache())
+
+
+def stats() -> dict:
+    """Get the cache counters with the hit rate and the size of the cache."""
+    counters = metrics.snapshot().get("response_cache", {})
+    requests = sum(counters.get(name, 0) for name in ("hits", "misses", "coalesced"))
+    # Coalesced requests did not pay for a call of their own either.
+    saved = counters.get("hits", 0) + counters.get("coalesced", 0)
+    report = {
+        **counters,
+        "hit_rate": saved / requests if requests else 0.0,
+        "in_flight": len(_flights),
+    }
+    cache = get_response_cache()
+    if cache is not None:
+        report.update(entries=cache.count(), bytes=cache.total_bytes, max_bytes=cache.max_bytes)
+    return report
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from app.utils.llm import BackendConfig, close_client, optimization_messages
+    from app.utils.llm_stub import StubServer
+
+    async def main():
+        directory = tempfile.mkdtemp(prefix="responses-")
+        server = StubServer(first_token_ms=100, token_ms=1)
+        base_url = await server.start()
+        cache = ResponseCache(os.path.join(directory, "responses.db"))
+        config = BackendConfig(name="stub", base_url=base_url, model="stub")
+        messages = optimization_messages("Summarize this report. " * 50, "Moderate", ["Clarity"])
+
+        async def one() -> float:
+            backend = CachingBackend(ChatBackend(config), cache)
+            start = time.perf_counter()
+            await backend.complete(messages)
+            return (time.perf_counter() - start) * 1000
+
+        for label, concurrency in (("cold, concurrent", 20), ("warm", 20)):
+            before = server.requests
+            times = sorted(await asyncio.gather(*(one() for _ in range(concurrency))))
+            await asyncio.sleep(0.05)
+            print(
+                f"{label:<17} requests={concurrency} backend calls={server.requests - before} "
+                f"p50={times[len(times) // 2]:.1f}ms max={times[-1]:.1f}ms"
+            )
+        report = {
+            name: value
+            for name, value in metrics.snapshot()["response_cache"].items()
+            if name in ("hits", "misses", "coalesced", "bytes_saved", "tokens_saved")
+        }
+        print(report)
+        await close_client()
+        await server.close()
+
+    asyncio.run(main())
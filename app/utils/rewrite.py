@@ -0,0 +1,470 @@
+"""Rule-based prompt rewriting for the optimizer.
+
+A rewrite is a pipeline of passes. Each pass takes the text and returns
+the rewritten text with a description of every change it actually made,
+so the optimizer's explanation only lists real edits. Passes run in
+linear time, skip fenced code blocks, and are timed individually; the
+timings are recorded under ``rewrite.<pass>`` in app/utils/metrics.py.
+Stage outputs are cached (see ``_run_stage``), with hits and misses
+recorded under ``rewrite.cache``.
+
+The optimization level picks the general passes and each goal adds its
+own (see ``plan``).
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable
+
+from app.utils import metrics
+from app.utils.ambiguity import LINTER
+from app.utils.scoring import COVERAGE, WORD, count_terms
+
+Pass = Callable[[str], tuple[str, list[str]]]
+
+CODE_FENCE = re.compile(r"(```.*?(?:```|\Z))", re.DOTALL)
+SENTENCE = re.compile(r"[^.!?\n]*(?:[.!?]+[ \t]*\n?|\n|\Z)")
+MIN_DEDUPE_WORDS = 4
+STAGE_CACHE_SIZE = 512
+# Total length of cached stage outputs, so a few 1 MB prompts cannot fill
+# the cache with hundreds of megabytes.
+STAGE_CACHE_CHARS = 16_000_000
+
+
+def outside_code(text: str, rewrite: Callable[[str], str]) -> str:
+    """Apply a rewrite to the text between fenced code blocks only."""
+    parts = CODE_FENCE.split(text)
+    # re.split puts the captured fences at odd positions.
+    return "".join(part if i % 2 else rewrite(part) for i, part in enumerate(parts))
+
+
+def _counted(items: Counter) -> str:
+    return ", ".join(
+        f"{item} (×{count})" if count > 1 else item for item, count in items.most_common()
+    )
+
+
+def dedupe_sentences(text: str) -> tuple[str, list[str]]:
+    """Drop sentences that repeat an earlier one, ignoring case and spacing."""
+    seen: set[str] = set()
+    removed = 0
+
+    def rewrite(segment: str) -> str:
+        nonlocal removed
+        kept = []
+        for sentence in SENTENCE.findall(segment):
+            words = sentence.lower().split()
+            if len(words) >= MIN_DEDUPE_WORDS:
+                key = " ".join(words).rstrip(".!?")
+                if key in seen:
+                    removed += 1
+                    # Keep the line break of a dropped sentence that ended a line.
+                    if sentence.endswith("\n") and kept and not kept[-1].endswith("\n"):
+                        kept[-1] = kept[-1].rstrip(" \t") + "\n"
+                    continue
+                seen.add(key)
+            kept.append(sentence)
+        return "".join(kept)
+
+    text = outside_code(text, rewrite)
+    if not removed:
+        return text, []
+    plural = "s" if removed > 1 else ""
+    return text, [f"Removed {removed} duplicate sentence{plural}."]
+
+
+# Phrases that add nothing, mapped to a shorter equivalent ("" drops them).
+FILLERS = {
+    "please note that": "",
+    "it is important to note that": "",
+    "it should be noted that": "",
+    "it goes without saying that": "",
+    "as a matter of fact,": "",
+    "needless to say,": "",
+    "basically": "",
+    "actually": "",
+    "literally": "",
+    "really": "",
+    "very": "",
+    "kindly": "",
+    "in order to": "to",
+    "due to the fact that": "because",
+    "in the event that": "if",
+    "for the purpose of": "for",
+    "at this point in time": "now",
+    "a large number of": "many",
+    "is able to": "can",
+    "are able to": "can",
+    "make sure that": "ensure",
+}
+FILLER = re.compile(
+    r"\b(" + "|".join(re.escape(p) for p in sorted(FILLERS, key=len, reverse=True)) + r")(?!\w) ?",
+    re.IGNORECASE,
+)
+COMMA_AFTER = re.compile(r",[ \t]*")
+# What a sentence can follow; "" is the start of the text.
+SENTENCE_BREAKS = ("", ".", "!", "?", ":", "\n")
+
+
+def strip_fillers(text: str) -> tuple[str, list[str]]:
+    """Remove filler phrases and shorten wordy ones."""
+    dropped: Counter = Counter()
+    shortened: Counter = Counter()
+
+    def rewrite(segment: str) -> str:
+        out = []
+        last = 0
+        previous = ""  # last non-blank character written, "" at the start
+        capitalize = False
+        for match in FILLER.finditer(segment):
+            chunk = segment[last : match.start()]
+            if capitalize and chunk:
+                chunk = chunk[0].upper() + chunk[1:]
+            out.append(chunk)
+            previous = chunk.rstrip(" \t")[-1:] or previous
+            phrase = match.group(1)
+            replacement = FILLERS[phrase.lower()]
+            if replacement:
+                shortened[f'"{phrase.lower()}" to "{replacement}"'] += 1
+                if phrase[0].isupper():
+                    replacement = replacement[0].upper() + replacement[1:]
+                out.append(replacement + match.group(0)[len(phrase) :])
+                previous = replacement[-1]
+                capitalize = False
+            else:
+                dropped[f'"{phrase.lower()}"'] += 1
+                # A run of fillers passes the capital on ("Really, really good").
+                capitalize = (
+                    phrase[0].isupper() or (capitalize and not chunk)
+                ) and previous in SENTENCE_BREAKS
+            last = match.end()
+            if replacement:
+                continue
+            # "Basically, write", "it, actually, works" and "it, really.": the
+            # commas that set the filler off go with it.
+            before = chunk.rstrip(" \t")
+            comma = COMMA_AFTER.match(segment, last)
+            if comma:
+                last = comma.end()
+                if before.endswith(","):
+                    out[-1] = before[:-1] + chunk[len(before) :]
+            elif segment[last : last + 1] in (".", "!", "?", "\n", ""):
+                out[-1] = before.removesuffix(",")
+        chunk = segment[last:]
+        if capitalize and chunk:
+            chunk = chunk[0].upper() + chunk[1:]
+        out.append(chunk)
+        return "".join(out)
+
+    text = outside_code(text, rewrite)
+    changes = []
+    if dropped:
+        changes.append(f"Removed filler phrases: {_counted(dropped)}.")
+    if shortened:
+        changes.append(f"Shortened wordy phrases: {_counted(shortened)}.")
+    return text, changes
+
+
+# Section names recognised in "Name:" lines and normalised to headings.
+SECTION_NAMES = (
+    "role",
+    "context",
+    "background",
+    "task",
+    "goal",
+    "instructions",
+    "steps",
+    "requirements",
+    "constraints",
+    "rules",
+    "format",
+    "output",
+    "output format",
+    "style",
+    "tone",
+    "audience",
+    "examples",
+    "example",
+    "notes",
+)
+MARKDOWN_HEADING = re.compile(r"#{1,6}\s")
+LABEL_LINE = re.compile(
+    r"(?:\*\*|__)?(" + "|".join(SECTION_NAMES) + r")(?:\*\*|__)?\s*:(?:\*\*|__)?[ \t]*(.*)",
+    re.IGNORECASE,
+)
+CAPS_LINE = re.compile(r"[A-Z][A-Z ]{2,40}:?")
+
+
+def normalize_sections(text: str) -> tuple[str, list[str]]:
+    """Turn section labels into Markdown headings, adding one if there is none.
+
+    "Context:", "**Constraints:**" and "OUTPUT FORMAT" lines become "# Context"
+    style headings; a label with text after it ("Task: write a haiku") is
+    split into the heading and the text.
+    """
+    normalized = []
+    has_headings = False
+
+    def rewrite(segment: str) -> str:
+        nonlocal has_headings
+        lines = segment.split("\n")
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            if MARKDOWN_HEADING.match(stripped):
+                has_headings = True
+                continue
+            match = LABEL_LINE.fullmatch(stripped)
+            if match:
+                title = match.group(1).title()
+                rest = match.group(2).strip()
+                lines[i] = f"# {title}\n{rest[:1].upper()}{rest[1:]}" if rest else f"# {title}"
+            elif CAPS_LINE.fullmatch(stripped):
+                title = stripped.rstrip(":").title()
+                lines[i] = f"# {title}"
+            else:
+                continue
+            has_headings = True
+            normalized.append(title)
+        return "\n".join(lines)
+
+    text = outside_code(text, rewrite)
+    changes = []
+    if normalized:
+        changes.append(f"Turned section labels into headings: {', '.join(normalized)}.")
+    if not has_headings and text.strip():
+        text = f"# Task\n{text.lstrip()}"
+        changes.append('Added a "# Task" heading so the prompt has a clear structure.')
+    return text, changes
+
+
+# What to fill in for common placeholders; others get a generic hint.
+PLACEHOLDER_HINTS = {
+    "topic": "the specific subject and the scope to cover",
+    "subject": "the specific subject and the scope to cover",
+    "audience": "who will read it and what they already know",
+    "reader": "who will read it and what they already know",
+    "tone": "the voice to use, e.g. formal, friendly or technical",
+    "length": "the target length in words or paragraphs",
+    "format": "the exact output format, e.g. bullet list, JSON or table",
+    "example": "a concrete sample of the expected output",
+    "examples": "concrete samples of the expected output",
+    "goal": "the outcome the response should achieve",
+    "context": "the background the model needs to know",
+    "language": "the programming or natural language to use",
+    "product": "the product name and what it does",
+    "company": "the company name and what it does",
+    "name": "the exact name to use",
+}
+PLACEHOLDER = re.compile(
+    r"(?<![\w\]])\[(?:insert |your )?([A-Za-z][\w \-]{0,40})\](?!\()"
+    r"|\{\{?\s*([A-Za-z][\w\-]{0,40})\s*\}?\}"
+    r"|<(?:insert |your )?([A-Za-z][\w \-]{0,40})>"
+)
+
+
+def expand_placeholders(text: str) -> tuple[str, list[str]]:
+    """Spell out what each bare placeholder like [topic] or {audience} needs."""
+    expanded: Counter = Counter()
+
+    def replace(match: re.Match) -> str:
+        name = next(group for group in match.groups() if group).strip()
+        key = name.lower()
+        hint = PLACEHOLDER_HINTS.get(key) or PLACEHOLDER_HINTS.get(key.split()[-1])
+        expanded[name] += 1
+        return f"[{name}: {hint or f'a concrete {key}'}]"
+
+    text = outside_code(text, lambda segment: PLACEHOLDER.sub(replace, segment))
+    if not expanded:
+        return text, []
+    return text, [f"Spelled out what to fill in for placeholders: {_counted(expanded)}."]
+
+
+# Details a prompt should pin down, by COVERAGE aspect of app/utils/scoring.py.
+DETAIL_PROMPTS = {
+    "audience": "Audience: [audience: who will read it and what they already know]",
+    "format": "Format: [format: the exact output format, e.g. bullet list, JSON or table]",
+    "length": "Length: [length: the target length in words or paragraphs]",
+}
+
+
+def add_missing_details(text: str) -> tuple[str, list[str]]:
+    """Add fill-in lines for the audience, format and length if none is given."""
+    words = WORD.findall(text.lower())
+    counts = Counter(words)
+    normalized = f" {' '.join(words)} "
+    missing = [
+        aspect
+        for aspect in DETAIL_PROMPTS
+        if not count_terms(counts, normalized, COVERAGE[aspect])
+    ]
+    if not missing:
+        return text, []
+    lines = "\n".join(f"- {DETAIL_PROMPTS[aspect]}" for aspect in missing)
+    text = f"{text.rstrip()}\n\n# Requirements\n{lines}"
+    return text, [f"Added requirements to fill in for the missing {', '.join(missing)}."]
+
+
+MAX_REPORTED_TERMS = 5
+
+
+def clarify(text: str) -> tuple[str, list[str]]:
+    """Drop hedges that can go safely and point out the remaining vague terms."""
+    dropped: Counter = Counter()
+    flagged: dict[str, str] = {}
+
+    def rewrite(segment: str) -> str:
+        out = []
+        last = 0
+        previous = ""  # last non-blank character written, "" at the start
+        capitalize = False
+        for issue in LINTER.lint(segment):
+            if issue.replacement != "":
+                flagged.setdefault(issue.text.lower(), issue.suggestion)
+                continue
+            chunk = segment[last : issue.start]
+            if capitalize and chunk:
+                chunk = chunk[0].upper() + chunk[1:]
+            out.append(chunk)
+            previous = chunk.rstrip(" \t")[-1:] or previous
+            dropped[f'"{issue.text.lower()}"'] += 1
+            capitalize = previous in SENTENCE_BREAKS
+            last = issue.end
+            # Drop a separating comma and the space after the hedge too, and
+            # the comma before it when it was set off on both sides.
+            before = chunk.rstrip(" \t")
+            if segment[last : last + 1] == ",":
+                last += 1
+                if before.endswith(","):
+                    out[-1] = before[:-1] + chunk[len(before) :]
+            elif segment[last : last + 1] in (".", "!", "?", "\n", ""):
+                # A hedge that ended the sentence ("in French, if possible.").
+                out[-1] = before.removesuffix(",")
+            if segment[last : last + 1] == " ":
+                last += 1
+        chunk = segment[last:]
+        if capitalize and chunk:
+            chunk = chunk[0].upper() + chunk[1:]
+        out.append(chunk)
+        return "".join(out)
+
+    text = outside_code(text, rewrite)
+    changes = []
+    if dropped:
+        changes.append(f"Removed hedges: {_counted(dropped)}.")
+    if flagged:
+        terms = list(flagged.items())[:MAX_REPORTED_TERMS]
+        listed = "; ".join(f'"{term}": {suggestion}' for term, suggestion in terms)
+        more = len(flagged) - len(terms)
+        changes.append(
+            f"Vague terms left to make concrete: {listed}" + (f" (and {more} more)." if more else ".")
+        )
+    return text, changes
+
+
+REASONING = "Think through the problem step by step before giving the final answer."
+
+
+def require_reasoning(text: str) -> tuple[str, list[str]]:
+    """Ask for step-by-step reasoning unless the prompt already does."""
+    if "step by step" in text.lower() or "step-by-step" in text.lower():
+        return text, []
+    return f"{text.rstrip()}\n\n{REASONING}", ["Asked for step-by-step reasoning before the answer."]
+
+
+PASSES: dict[str, Pass] = {
+    "dedupe_sentences": dedupe_sentences,
+    "strip_fillers": strip_fillers,
+    "clarify": clarify,
+    "expand_placeholders": expand_placeholders,
+    # Before add_missing_details, whose "# Requirements" heading would
+    # otherwise stop it from adding "# Task".
+    "normalize_sections": normalize_sections,
+    "add_missing_details": add_missing_details,
+    "require_reasoning": require_reasoning,
+}
+LEVEL_PASSES = {
+    "Light": (),
+    "Moderate": ("dedupe_sentences",),
+    "Aggressive": ("dedupe_sentences", "require_reasoning"),
+}
+GOAL_PASSES = {
+    "Clarity": ("clarify",),
+    "Conciseness": ("dedupe_sentences", "strip_fillers"),
+    "Structure": ("normalize_sections",),
+    "Depth": ("expand_placeholders", "add_missing_details"),
+}
+
+
+def plan(level: str, goals: list[str]) -> list[str]:
+    """Get the names of the passes to run, in pipeline order."""
+    wanted = set(LEVEL_PASSES.get(level, ()))
+    for goal in goals:
+        wanted.update(GOAL_PASSES.get(goal, ()))
+    return [name for name in PASSES if name in wanted]
+
+
+_stages: OrderedDict[tuple[bytes, str], tuple[str, tuple[str, ...]]] = OrderedDict()
+_stage_chars = 0
+# Guards both of the above; stages run in worker threads of many sessions.
+_stages_lock = threading.Lock()
+
+
+def _run_stage(text: str, name: str) -> tuple[str, tuple[str, ...]]:
+    """Run one pass, reusing its output for an input it has seen before.
+
+    Passes are pure functions of their input text, so a stage is keyed by
+    the digest of its input and the pass name. When a goal or level
+    changes, the passes before the first changed one hit the cache, and
+    later passes only rerun if their input actually changed.
+    """
+    global _stage_chars
+    key = (hashlib.blake2b(text.encode(), digest_size=16).digest(), name)
+    with _stages_lock:
+        cached = _stages.get(key)
+        if cached is not None:
+            _stages.move_to_end(key)
+    if cached is not None:
+        metrics.record("rewrite.cache", hits=1)
+        return cached
+    start = time.perf_counter()
+    output, changes = PASSES[name](text)
+    elapsed = time.perf_counter() - start
+    metrics.record("rewrite.cache", misses=1)
+    metrics.record(
+        f"rewrite.{name}",
+        runs=1,
+        changed=int(bool(changes)),
+        us=int(elapsed * 1_000_000),
+    )
+    with _stages_lock:
+        # Another thread may have run the same stage meanwhile.
+        previous = _stages.pop(key, None)
+        if previous is not None:
+            _stage_chars -= len(previous[0])
+        _stages[key] = (output, tuple(changes))
+        _stage_chars += len(output)
+        while len(_stages) > STAGE_CACHE_SIZE or _stage_chars > STAGE_CACHE_CHARS:
+            _, (evicted, _) = _stages.popitem(last=False)
+            _stage_chars -= len(evicted)
+    return output, tuple(changes)
+
+
+def run_passes(text: str, names: list[str]) -> tuple[str, list[str], dict[str, float]]:
+    """Run the named passes in order; return the text, changes and ms per pass."""
+    changes = []
+    timings = {}
+    for name in names:
+        start = time.perf_counter()
+        text, pass_changes = _run_stage(text, name)
+        timings[name] = (time.perf_counter() - start) * 1000
+        changes.extend(pass_changes)
+    return text, changes, timings
+
+
+def rewrite_prompt(original: str, level: str, goals: list[str]) -> tuple[str, list[str]]:
+    """Apply the optimization level and goals to a prompt."""
+    text, changes, _ = run_passes(original, plan(level, goals))
+    return text, changes or ["No changes were needed for the selected goals."]
@@ -0,0 +1,147 @@
+"""Track in-flight background runs so newer requests supersede stale ones.
+
+Run ``python -m app.utils.runs`` for a benchmark of how long other events
+of a session wait while an optimization runs, with the work done under
+the session's state lock and as a background run.
+"""
+
+import asyncio
+import time
+from app.utils import metrics
+
+
+class RunTracker:
+    """Keep the latest run of a background handler per session.
+
+    Starting a run cancels the previous run of the same session while it
+    is still working. A run that is already publishing is not cancelled,
+    but it is superseded: it learns it is stale and drops its result.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._runs: dict[str, tuple[int, asyncio.Task | None, bool, float]] = {}
+        self._next_id = 0
+
+    def begin(self, token: str) -> int:
+        """Register a new run for the session and cancel the stale one."""
+        previous = self._runs.get(token)
+        if previous is not None:
+            _, task, publishing, _ = previous
+            if task is not None and not task.done() and not publishing:
+                task.cancel()
+        self._next_id += 1
+        self._runs[token] = (self._next_id, asyncio.current_task(), False, time.perf_counter())
+        metrics.record(f"runs.{self.kind}", started=1)
+        return self._next_id
+
+    def publishing(self, token: str, run_id: int) -> bool:
+        """Mark the run as publishing, or return False if it was superseded."""
+        current = self._runs.get(token)
+        if current is None or current[0] != run_id:
+            return False
+        self._runs[token] = (run_id, current[1], True, current[3])
+        return True
+
+    def drop(self, started: float, cancelled: bool = False):
+        """Record a run whose work was thrown away."""
+        metrics.record(
+            f"runs.{self.kind}",
+            superseded=1,
+            cancelled=int(cancelled),
+            dropped_ms=int((time.perf_counter() - started) * 1000),
+        )
+
+    def fail(self, token: str, run_id: int, started: float) -> bool:
+        """Record a run that raised, and forget it if it is the session's latest.
+
+        Returns whether it was the latest run, i.e. whether the session's
+        busy flag is still the failed run's to reset.
+        """
+        self.drop(started)
+        metrics.record(f"runs.{self.kind}", failed=1)
+        current = self._runs.get(token)
+        if current is None or current[0] != run_id:
+            return False
+        del self._runs[token]
+        return True
+
+    def end(self, token: str, run_id: int):
+        """Forget the run once it has finished."""
+        current = self._runs.get(token)
+        if current is not None and current[0] == run_id:
+            del self._runs[token]
+            metrics.record(f"runs.{self.kind}", completed=1)
+
+
+async def benchmark(background: bool, work_s: float = 1.5, interval_s: float = 0.05) -> dict:
+    """Time a session's events while one optimization runs.
+
+    The session's state lock is an ``asyncio.Lock``, like the one Reflex
+    holds while it processes an event. The optimization waits ``work_s``
+    for a model and runs the rule-based rewrite in a worker thread, either
+    all under the lock, as handlers did before they became background
+    runs, or only taking the lock to read its inputs and publish.
+    """
+    from app.utils.rewrite import rewrite_prompt
+
+    lock = asyncio.Lock()
+    state = {"prompt": "Basically, write a really short poem about the sea. " * 50, "result": ""}
+    tracker = RunTracker("benchmark")
+    waits: list[float] = []
+
+    async def work(prompt: str) -> str:
+        await asyncio.sleep(work_s)
+        text, _ = await asyncio.to_thread(rewrite_prompt, prompt, "Moderate", ["Conciseness"])
+        return text
+
+    async def optimize():
+        if not background:
+            async with lock:
+                state["result"] = await work(state["prompt"])
+            return
+        run_id = tracker.begin("session")
+        async with lock:
+            prompt = state["prompt"]
+        result = await work(prompt)
+        if tracker.publishing("session", run_id):
+            async with lock:
+                state["result"] = result
+        tracker.end("session", run_id)
+
+    async def event():
+        # A sidebar toggle or a goal checkbox: trivial once it gets the lock.
+        queued = time.perf_counter()
+        async with lock:
+            waits.append(time.perf_counter() - queued)
+
+    start = time.perf_counter()
+    running = asyncio.create_task(optimize())
+    await asyncio.sleep(0)
+    events = []
+    while not running.done():
+        events.append(asyncio.create_task(event()))
+        await asyncio.sleep(interval_s)
+    await asyncio.gather(running, *events)
+    waits.sort()
+    return {
+        "background": background,
+        "optimize_ms": (time.perf_counter() - start) * 1000,
+        "events": len(waits),
+        "wait_p50_ms": waits[len(waits) // 2] * 1000,
+        "wait_max_ms": waits[-1] * 1000,
+    }
+
+
+if __name__ == "__main__":
+
+    async def main():
+        for background in (False, True):
+            row = await benchmark(background)
+            print(
+                f"background={row['background']!s:<5} optimize={row['optimize_ms']:.0f}ms "
+                f"events={row['events']:<3} wait p50={row['wait_p50_ms']:.1f}ms "
+                f"max={row['wait_max_ms']:.1f}ms"
+            )
+
+    asyncio.run(main())
@@ -0,0 +1,465 @@
+"""Deterministic prompt scoring from text features.
+
+Features are extracted in linear time over the prompt: word and
+sentence counts, hedge and vague-term density (from the linter in
+app/utils/ambiguity.py), headings and lists,
+duplicate sentences and constraint coverage. The four sub-scores are
+fixed formulas over those features, so a prompt always gets the same
+scores and they are cached by the prompt's digest. Features are assembled
+from a ``FeatureSummary`` of the text; summaries of paragraphs combine, which
+is what app/utils/live_scoring.py relies on to re-score edits.
+
+``score_batch`` scores many prompts at once: features of all prompts are
+stacked into a NumPy matrix and the formulas run column-wise. NumPy is
+optional and not in requirements.txt; without it the same formulas run
+row by row. ``score_prompt`` is a batch of one, so both always agree.
+
+Run ``python -m app.utils.scoring`` for a timing benchmark. On the
+development machine, scoring a 50 KB prompt uncached takes 7-10 ms with or
+without NumPy, most of it in the hedge and vague-term linter, so it stays
+above a few milliseconds. NumPy only speeds up the formulas of a batch:
+about 40 ms instead of 150 ms for 5000 prompts.
+"""
+
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import reflex as rx
+
+from app.utils import metrics
+from app.utils.ambiguity import HEDGE, LINTER, VAGUE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CACHE_SIZE = 1024
+POOL_CHUNK_SIZE = 64
+LONG_SENTENCE_WORDS = 30
+
+WORD = re.compile(r"[a-z0-9']+")
+# Sentences end at terminal punctuation followed by whitespace or the end
+# of the text, or at a line break, so list items and headings count as
+# sentences of their own.
+SENTENCE_END = re.compile(r"[.!?]+(?:\s|\Z)|\n")
+LENGTH_SPEC = re.compile(r"\d+\s*(?:words|sentences|paragraphs|lines|characters)\b")
+# Line patterns anchor on "\n" rather than "^" with MULTILINE, which is much
+# faster to scan for; the text is prefixed with a blank line to match.
+HEADING = re.compile(r"\n[ \t]*(?:#|[A-Za-z][^\n:]{0,38}:[ \t]*(?=\n))")
+LIST_ITEM = re.compile(r"\n[ \t]*(?:[-*+•]|\d+[.)])[ \t]")
+PARAGRAPH = re.compile(r"\n[ \t]*\n\s*(?=\S)")
+
+CONSTRAINT_MARKERS = (
+    "must",
+    "should",
+    "never",
+    "always",
+    "only",
+    "do not",
+    "don't",
+    "avoid",
+    "exactly",
+    "at least",
+    "at most",
+    "no more than",
+    "required",
+)
+
+# Aspects a well-specified prompt pins down; depth rewards covering them.
+COVERAGE = {
+    "role": ("act as", "you are", "role"),
+    "format": ("format", "json", "markdown", "table", "bullet", "bullets", "code"),
+    "length": ("length", "brief", "concise", "short"),
+    "tone": ("tone", "formal", "casual", "professional", "friendly"),
+    "audience": ("audience", "reader", "readers", "beginner", "beginners", "expert", "experts"),
+    "examples": ("example", "examples", "e g", "for instance"),
+}
+
+FEATURE_NAMES = (
+    "words",
+    "sentences",
+    "long_sentences",
+    "hedges",
+    "vague_terms",
+    "headings",
+    "list_items",
+    "paragraphs",
+    "duplicate_sentences",
+    "constraints",
+    "coverage",
+)
+
+
+def count_terms(counts: dict[str, int], normalized: str, terms) -> int:
+    """Count occurrences of single words and multi-word phrases.
+
+    ``counts`` holds word frequencies and ``normalized`` is the words joined
+    by single spaces and padded with a space on both ends, so a phrase is
+    found by one substring count that respects word boundaries.
+    """
+    total = 0
+    for term in terms:
+        if " " in term:
+            total += normalized.count(f" {term} ")
+        else:
+            total += counts.get(term, 0)
+    return total
+
+
+class PromptScores(rx.Base):
+    """Scores of a prompt, each from 0 to 100."""
+
+    clarity: int
+    conciseness: int
+    structure: int
+    depth: int
+    overall: int
+
+
+# Features that are plain counts, so the count for a text is the sum of the
+# counts for its paragraphs.
+ADDITIVE_FEATURES = (
+    "words",
+    "sentences",
+    "long_sentences",
+    "hedges",
+    "vague_terms",
+    "headings",
+    "list_items",
+    "paragraphs",
+    "constraints",
+)
+
+
+class FeatureSummary(NamedTuple):
+    """What a piece of text contributes to the features of a prompt.
+
+    Summaries of consecutive paragraphs combine into the summary of the
+    whole text: counts add up, sentences are pooled to find duplicates and
+    covered aspects are united.
+    """
+
+    counts: tuple[float, ...]
+    sentences: tuple[str, ...]
+    aspects: frozenset[str]
+
+
+def summarize(text: str) -> FeatureSummary:
+    """Get the feature summary of a text, in linear time."""
+    lines = f"\n\n{text}\n"
+    headings = len(HEADING.findall(lines))
+    list_items = len(LIST_ITEM.findall(lines))
+    paragraphs = len(PARAGRAPH.findall(lines))
+
+    lowered = text.lower()
+    sentences = tuple(filter(None, map(str.strip, SENTENCE_END.split(lowered))))
+    # A sentence of N words has at least 2N - 1 characters.
+    long_sentences = sum(
+        len(sentence.split()) > LONG_SENTENCE_WORDS
+        for sentence in sentences
+        if len(sentence) >= 2 * LONG_SENTENCE_WORDS
+    )
+
+    words = WORD.findall(lowered)
+    ambiguity = LINTER.count(words)
+    counts = Counter(words)
+    normalized = f" {' '.join(words)} "
+    aspects = {
+        aspect
+        for aspect, terms in COVERAGE.items()
+        if count_terms(counts, normalized, terms)
+    }
+    if "length" not in aspects and LENGTH_SPEC.search(lowered):
+        aspects.add("length")
+    return FeatureSummary(
+        (
+            float(len(words)),
+            float(len(sentences)),
+            float(long_sentences),
+            float(ambiguity[HEDGE]),
+            float(ambiguity[VAGUE]),
+            float(headings),
+            float(list_items),
+            float(paragraphs),
+            float(count_terms(counts, normalized, CONSTRAINT_MARKERS)),
+        ),
+        sentences,
+        frozenset(aspects),
+    )
+
+
+def combine_features(counts, distinct_sentences: int, aspects: int) -> tuple[float, ...]:
+    """Assemble features, in the order of FEATURE_NAMES, from combined summaries.
+
+    ``counts`` are the summed ``FeatureSummary.counts``, ``distinct_sentences``
+    is the number of distinct sentences and ``aspects`` the number of
+    distinct aspects covered.
+    """
+    (
+        words,
+        sentences,
+        long_sentences,
+        hedges,
+        vague_terms,
+        headings,
+        list_items,
+        paragraphs,
+        constraints,
+    ) = counts
+    return (
+        words,
+        sentences,
+        long_sentences,
+        hedges,
+        vague_terms,
+        headings,
+        list_items,
+        paragraphs,
+        sentences - distinct_sentences,
+        constraints,
+        min(aspects, len(COVERAGE)) / len(COVERAGE),
+    )
+
+
+def extract_features(prompt: str) -> tuple[float, ...]:
+    """Get the prompt's features, in the order of FEATURE_NAMES."""
+    summary = summarize(prompt)
+    return combine_features(
+        summary.counts,
+        len(set(summary.sentences)),
+        len(summary.aspects),
+    )
+
+
+def _clamp(value: float) -> int:
+    return int(round(min(max(value, 0.0), 100.0)))
+
+
+def score_features(features: tuple[float, ...]) -> PromptScores:
+    """Turn the features of one prompt into scores."""
+    (
+        words,
+        sentences,
+        long_sentences,
+        hedges,
+        vague_terms,
+        headings,
+        list_items,
+        paragraphs,
+        duplicates,
+        constraints,
+        coverage,
+    ) = features
+    if not words:
+        return PromptScores.construct(
+            clarity=0, conciseness=0, structure=0, depth=0, overall=0
+        )
+    per_hundred = 100.0 / words
+    avg_sentence = words / sentences
+    clarity = _clamp(
+        100.0
+        - min((hedges + vague_terms) * per_hundred * 8.0, 40.0)
+        - long_sentences / sentences * 30.0
+        - min(max(avg_sentence - 25.0, 0.0) * 1.5, 20.0)
+    )
+    conciseness = _clamp(
+        100.0
+        - duplicates / sentences * 60.0
+        - min(hedges * per_hundred * 10.0, 25.0)
+        - min(max(avg_sentence - 20.0, 0.0), 15.0)
+    )
+    structure = _clamp(
+        40.0
+        + min(headings, 4.0) * 8.0
+        + min(list_items, 6.0) * 3.0
+        + min(paragraphs, 5.0) * 2.0
+    )
+    depth = _clamp(
+        30.0 + coverage * 50.0 + min(constraints, 5.0) * 2.0 + min(words / 20.0, 10.0)
+    )
+    # The values are computed here, so skip pydantic validation.
+    return PromptScores.construct(
+        clarity=clarity,
+        conciseness=conciseness,
+        structure=structure,
+        depth=depth,
+        overall=(clarity + conciseness + structure + depth) // 4,
+    )
+
+
+def score_matrix(features) -> list[PromptScores]:
+    """Turn the features of many prompts, one row each, into scores.
+
+    The vectorised formulas mirror ``score_features`` operation for
+    operation, so both give identical scores.
+    """
+    if np is None:
+        return [score_features(row) for row in features]
+    if not len(features):
+        return []
+    (
+        words,
+        sentences,
+        long_sentences,
+        hedges,
+        vague_terms,
+        headings,
+        list_items,
+        paragraphs,
+        duplicates,
+        constraints,
+        coverage,
+    ) = np.asarray(features, dtype=np.float64).reshape(-1, len(FEATURE_NAMES)).T
+    empty = words == 0
+    words = np.where(empty, 1.0, words)
+    sentences = np.where(empty, 1.0, sentences)
+    per_hundred = 100.0 / words
+    avg_sentence = words / sentences
+
+    def clamp(values):
+        return np.where(empty, 0, np.rint(np.clip(values, 0.0, 100.0))).astype(np.int64)
+
+    clarity = clamp(
+        100.0
+        - np.minimum((hedges + vague_terms) * per_hundred * 8.0, 40.0)
+        - long_sentences / sentences * 30.0
+        - np.minimum(np.maximum(avg_sentence - 25.0, 0.0) * 1.5, 20.0)
+    )
+    conciseness = clamp(
+        100.0
+        - duplicates / sentences * 60.0
+        - np.minimum(hedges * per_hundred * 10.0, 25.0)
+        - np.minimum(np.maximum(avg_sentence - 20.0, 0.0), 15.0)
+    )
+    structure = clamp(
+        40.0
+        + np.minimum(headings, 4.0) * 8.0
+        + np.minimum(list_items, 6.0) * 3.0
+        + np.minimum(paragraphs, 5.0) * 2.0
+    )
+    depth = clamp(
+        30.0
+        + coverage * 50.0
+        + np.minimum(constraints, 5.0) * 2.0
+        + np.minimum(words / 20.0, 10.0)
+    )
+    overall = (clarity + conciseness + structure + depth) // 4
+    return [
+        PromptScores.construct(clarity=c, conciseness=co, structure=st, depth=d, overall=o)
+        for c, co, st, d, o in zip(
+            clarity.tolist(),
+            conciseness.tolist(),
+            structure.tolist(),
+            depth.tolist(),
+            overall.tolist(),
+        )
+    ]
+
+
+_cache: OrderedDict[bytes, PromptScores] = OrderedDict()
+# The cache is shared by every session and used from worker threads.
+_cache_lock = threading.Lock()
+
+
+def _digest(prompt: str) -> bytes:
+    return hashlib.blake2b(prompt.encode(), digest_size=16).digest()
+
+
+def score_batch(prompts: list[str], processes: int | None = None) -> list[PromptScores]:
+    """Score many prompts, reusing results for prompts seen before.
+
+    With ``processes``, features of uncached prompts are extracted in a
+    pool of that many worker processes, which pays off for thousands of
+    prompts; scoring itself always runs in this process.
+    """
+    keys = [_digest(prompt) for prompt in prompts]
+    found: dict[bytes, PromptScores] = {}
+    missing: dict[bytes, str] = {}
+    with _cache_lock:
+        for key, prompt in zip(keys, prompts):
+            scores = _cache.get(key)
+            if scores is None:
+                missing[key] = prompt
+            else:
+                found[key] = scores
+                _cache.move_to_end(key)
+    if missing:
+        if processes:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                features = list(
+                    pool.map(extract_features, missing.values(), chunksize=POOL_CHUNK_SIZE)
+                )
+        else:
+            features = [extract_features(prompt) for prompt in missing.values()]
+        computed = dict(zip(missing, score_matrix(features)))
+        with _cache_lock:
+            _cache.update(computed)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+        found.update(computed)
+    results = [found[key] for key in keys]
+    metrics.record("scoring", hits=len(keys) - len(missing), misses=len(missing))
+    return results
+
+
+def score_prompt(prompt: str) -> PromptScores:
+    """Score a prompt, reusing the result for a prompt seen before."""
+    return score_batch([prompt])[0]
+
+
+if __name__ == "__main__":
+    import os
+    import random
+    import time
+
+    from app.utils.templates import DEFAULT_TEMPLATE
+
+    samples = {
+        "structured": DEFAULT_TEMPLATE + "\n\n- Maybe add some relevant stuff, etc.\n\n",
+        "prose": (
+            "Write a detailed guide for beginners that explains how the billing "
+            "system handles refunds, and you should probably include a few "
+            "examples of edge cases. Keep the tone friendly but professional. "
+        ),
+    }
+    for name, block in samples.items():
+        prompt = (block * (50_000 // len(block) + 1))[:50_000]
+        runs = 20
+        start = time.perf_counter()
+        for _ in range(runs):
+            scores = score_features(extract_features(prompt))
+        elapsed = (time.perf_counter() - start) / runs * 1000
+        print(f"{name:<10} {len(prompt)} chars: {elapsed:.2f} ms uncached -> {scores}")
+        score_prompt(prompt)
+        start = time.perf_counter()
+        score_prompt(prompt)
+        print(f"{name:<10} cached: {(time.perf_counter() - start) * 1000:.3f} ms")
+
+    rng = random.Random(0)
+    sentences = [s.strip() + "." for s in samples["prose"].split(".") if s.strip()]
+    library = [
+        "\n".join(rng.choice(sentences) for _ in range(rng.randint(3, 40))) + f" #{i}"
+        for i in range(5000)
+    ]
+    print(f"batch of {len(library)}, numpy={'yes' if np is not None else 'no'}")
+    for processes in (None, os.cpu_count()):
+        with _cache_lock:
+            _cache.clear()
+        start = time.perf_counter()
+        batch = score_batch(library, processes=processes)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"  processes={processes}: {elapsed:.1f} ms")
+    features = [extract_features(p) for p in library]
+    start = time.perf_counter()
+    single = [score_features(row) for row in features]
+    rows_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    score_matrix(features)
+    matrix_ms = (time.perf_counter() - start) * 1000
+    print(f"  formulas: {rows_ms:.1f} ms row by row, {matrix_ms:.1f} ms as a matrix")
+    print(f"  matches one-by-one scoring: {batch == single}")
@@ -0,0 +1,107 @@
+"""Incremental inverted index with prefix matching and BM25 ranking."""
+
+import bisect
+import heapq
+import math
+import re
+from collections import Counter
+
+TOKEN = re.compile(r"\w+")
+
+K1 = 1.2
+B = 0.75
+PREFIX_WEIGHT = 0.7
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase word tokens."""
+    return TOKEN.findall(text.lower())
+
+
+class SearchIndex:
+    """Inverted index that supports adding and removing single documents.
+
+    Postings map each term to {doc_id: term frequency}. A sorted vocabulary
+    lets a query term also match every indexed term it is a prefix of.
+    """
+
+    def __init__(self):
+        self.postings: dict[str, dict[str, int]] = {}
+        self.vocabulary: list[str] = []
+        self.doc_terms: dict[str, Counter] = {}
+        self.doc_lengths: dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def add(self, doc_id: str, fields: list[tuple[str, int]]):
+        """Index a document given (text, weight) pairs, replacing any old version."""
+        self.remove(doc_id)
+        terms: Counter = Counter()
+        for text, weight in fields:
+            for token in tokenize(text):
+                terms[token] += weight
+        for term, count in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                bisect.insort(self.vocabulary, term)
+            postings[doc_id] = count
+        length = sum(terms.values())
+        self.doc_terms[doc_id] = terms
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id: str):
+        """Remove a document, touching only the postings of its own terms."""
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def _expand(self, term: str) -> list[tuple[str, float]]:
+        """Get the indexed terms matching a query term, exact match first."""
+        start = bisect.bisect_left(self.vocabulary, term)
+        matches = []
+        for vocab_term in self.vocabulary[start:]:
+            if not vocab_term.startswith(term):
+                break
+            matches.append((vocab_term, 1.0 if vocab_term == term else PREFIX_WEIGHT))
+        return matches
+
+    def search(self, query: str, limit: int = 20) -> list[str]:
+        """Get the ids of the best matching documents, best first.
+
+        Every query term must match (exactly or as a prefix).
+        """
+        terms = tokenize(query)
+        if not terms or not self.doc_terms:
+            return []
+        count = len(self.doc_terms)
+        avg_length = self.total_length / count or 1
+        scores: dict[str, float] | None = None
+        for term in dict.fromkeys(terms):
+            term_scores: dict[str, float] = {}
+            for vocab_term, weight in self._expand(term):
+                postings = self.postings[vocab_term]
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if scores is not None and doc_id not in scores:
+                        continue
+                    norm = K1 * (1 - B + B * self.doc_lengths[doc_id] / avg_length)
+                    score = weight * idf * tf * (K1 + 1) / (tf + norm)
+                    term_scores[doc_id] = max(term_scores.get(doc_id, 0.0), score)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {d: scores[d] + s for d, s in term_scores.items()}
+            if not scores:
+                return []
+        return heapq.nlargest(limit, scores, key=scores.__getitem__)
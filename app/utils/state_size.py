@@ -0,0 +1,52 @@
+"""Report how many bytes each state stores and ships per session.
+
+Run with ``python -m app.utils.state_size``.
+"""
+
+import pickle
+from reflex.utils.format import json_dumps
+
+
+def _app_states() -> list:
+    from app.states.base import BaseState
+    from app.states.generator import GeneratorState
+    from app.states.history import HistoryState
+    from app.states.optimizer import OptimizerState
+    from app.states.settings import SettingsState
+
+    return [BaseState, GeneratorState, HistoryState, OptimizerState, SettingsState]
+
+
+def state_size_report(states: list | None = None) -> dict[str, dict[str, int]]:
+    """Measure the default per-session size of each state's vars.
+
+    ``json_bytes`` is what the frontend receives on hydration and
+    ``pickle_bytes`` approximates what a Redis state manager stores.
+    """
+    report = {}
+    for state in states or _app_states():
+        fields = state.get_fields()
+        names = [
+            name
+            for name in [*state.base_vars, *state.backend_vars]
+            if name in fields and not name.startswith("_reflex")
+        ]
+        values = {name: fields[name].default_value() for name in names}
+        report[state.__name__] = {
+            "vars": len(values),
+            "json_bytes": len(json_dumps(values).encode()),
+            "pickle_bytes": len(pickle.dumps(values)),
+        }
+    report["total"] = {
+        key: sum(row[key] for row in report.values())
+        for key in ("vars", "json_bytes", "pickle_bytes")
+    }
+    return report
+
+
+if __name__ == "__main__":
+    for name, row in state_size_report().items():
+        print(
+            f"{name:<16} vars={row['vars']:<4} json={row['json_bytes']:<7} "
+            f"pickle={row['pickle_bytes']}"
+        )
@@ -0,0 +1,217 @@
+"""Compiled, cached prompt templates for the generator.
+
+Template syntax:
+    {field}            substitute a form field (purpose, describe, tone, ...)
+    {?field}...{/field} include the block only when the field is non-empty
+
+Templates are compiled once into a plain Python function and cached by
+(team, purpose, format). The same templates also compile into a frontend
+Var expression so the generator can preview prompts in the browser.
+
+Teams can ship their own templates as JSON files in ``PROMPT_TEMPLATES_DIR``
+(default ``templates/``) without code changes::
+
+    {
+        "team": "marketing",
+        "templates": [
+            {"purpose": "Blog", "format": "*", "template": "# Role\\n..."}
+        ]
+    }
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Callable
+
+import reflex as rx
+
+DEFAULT_TEAM = "default"
+ANY = "*"
+FIELDS = ("purpose", "describe", "tone", "format", "length", "constraints", "examples")
+
+DEFAULT_TEMPLATE = """# Role
+Act as an expert in {purpose}.
+
+# Task
+Topic: {describe}{?tone}
+Tone: {tone}{/tone}{?length}
+Length: {length}{/length}{?format}
+Output Format: {format}{/format}{?constraints}
+
+# Constraints
+{constraints}{/constraints}{?examples}
+
+# Examples
+{examples}{/examples}
+
+# Instructions
+Please generate the response following the requirements above. Ensure high quality and strict adherence to the constraints."""
+
+Renderer = Callable[[dict[str, str]], str]
+
+_TOKEN = re.compile(r"\{([?/]?)(\w+)\}")
+
+_sources: dict[tuple[str, str, str], str] = {(DEFAULT_TEAM, ANY, ANY): DEFAULT_TEMPLATE}
+_compiled: dict[str, Renderer] = {}
+_resolved: dict[tuple[str, str, str], Renderer] = {}
+_loaded_dirs: set[str] = set()
+
+
+def _parse(source: str) -> list:
+    """Parse a template into a tree of literals, fields and blocks."""
+    root: list = []
+    stack: list[tuple[str, list]] = [("", root)]
+    pos = 0
+    for match in _TOKEN.finditer(source):
+        if match.start() > pos:
+            stack[-1][1].append(source[pos : match.start()])
+        kind, name = match.groups()
+        if name not in FIELDS:
+            raise ValueError(f"Unknown template field: {name}")
+        if kind == "?":
+            block: list = []
+            stack[-1][1].append(("if", name, block))
+            stack.append((name, block))
+        elif kind == "/":
+            if stack[-1][0] != name:
+                raise ValueError(f"Unexpected closing tag: {{/{name}}}")
+            stack.pop()
+        else:
+            stack[-1][1].append(("field", name))
+        pos = match.end()
+    if len(stack) > 1:
+        raise ValueError(f"Unclosed block: {{?{stack[-1][0]}}}")
+    if pos < len(source):
+        root.append(source[pos:])
+    return root
+
+
+def _emit(nodes: list) -> str:
+    """Generate a Python expression that renders the given nodes."""
+    parts = []
+    for node in nodes:
+        if isinstance(node, str):
+            parts.append(repr(node))
+        elif node[0] == "field":
+            parts.append(f"f.get({node[1]!r}, '')")
+        else:
+            parts.append(f"({_emit(node[2])} if f.get({node[1]!r}) else '')")
+    return " + ".join(parts) or "''"
+
+
+def compile_template(source: str) -> Renderer:
+    """Compile a template source into a renderer, reusing cached results."""
+    renderer = _compiled.get(source)
+    if renderer is None:
+        code = compile(f"lambda f: {_emit(_parse(source))}", "<prompt-template>", "eval")
+        renderer = eval(code, {"__builtins__": {}})
+        _compiled[source] = renderer
+    return renderer
+
+
+def register_template(
+    source: str, purpose: str = ANY, format: str = ANY, team: str = DEFAULT_TEAM
+):
+    """Register a template for a team and purpose/format combination."""
+    compile_template(source)
+    _sources[(team or DEFAULT_TEAM, purpose or ANY, format or ANY)] = source
+    _resolved.clear()
+
+
+def load_templates(directory: str | None = None):
+    """Load team templates from JSON files in the templates directory."""
+    directory = directory or os.environ.get("PROMPT_TEMPLATES_DIR", "templates")
+    _loaded_dirs.add(directory)
+    if not os.path.isdir(directory):
+        return
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            team = data.get("team", DEFAULT_TEAM)
+            for entry in data.get("templates", []):
+                register_template(
+                    entry["template"],
+                    purpose=entry.get("purpose", ANY),
+                    format=entry.get("format", ANY),
+                    team=team,
+                )
+        except Exception as e:
+            logging.exception(f"Error loading prompt templates from {path}: {e}")
+
+
+def get_renderer(purpose: str, format: str, team: str = DEFAULT_TEAM) -> Renderer:
+    """Get the compiled renderer for a purpose/format, most specific first."""
+    if not _loaded_dirs:
+        load_templates()
+    key = (team or DEFAULT_TEAM, purpose, format)
+    renderer = _resolved.get(key)
+    if renderer is None:
+        for candidate_team in dict.fromkeys((key[0], DEFAULT_TEAM)):
+            for candidate in (
+                (candidate_team, purpose, format),
+                (candidate_team, purpose, ANY),
+                (candidate_team, ANY, format),
+                (candidate_team, ANY, ANY),
+            ):
+                if candidate in _sources:
+                    renderer = compile_template(_sources[candidate])
+                    break
+            if renderer is not None:
+                break
+        _resolved[key] = renderer
+    return renderer
+
+
+def render_prompt(fields: dict[str, str], team: str = DEFAULT_TEAM) -> str:
+    """Render the prompt for the given form fields."""
+    renderer = get_renderer(fields.get("purpose", ""), fields.get("format", ""), team)
+    return renderer(fields)
+
+
+def _emit_var(nodes: list, fields: dict[str, rx.Var]) -> rx.Var:
+    """Build a frontend Var expression that renders the given nodes."""
+    result = rx.Var.create("")
+    for node in nodes:
+        if isinstance(node, str):
+            result = result + node
+        elif node[0] == "field":
+            result = result + fields[node[1]]
+        else:
+            result = result + rx.cond(fields[node[1]], _emit_var(node[2], fields), "")
+    return result
+
+
+def preview_var(fields: dict[str, rx.Var], team: rx.Var) -> rx.Var:
+    """Compile all registered templates into one Var evaluated client-side.
+
+    Templates are checked in the same order as ``get_renderer`` so the
+    browser preview matches what the server renders on Generate.
+    """
+    if not _loaded_dirs:
+        load_templates()
+    ordered = sorted(
+        _sources,
+        key=lambda k: (k[0] == DEFAULT_TEAM, k[1] == ANY, k[2] == ANY),
+    )
+    result = rx.Var.create("")
+    for key in reversed(ordered):
+        team_name, purpose, format = key
+        rendered = _emit_var(_parse(_sources[key]), fields)
+        condition = rx.Var.create(True)
+        if team_name != DEFAULT_TEAM:
+            condition = condition & (team == team_name)
+        if purpose != ANY:
+            condition = condition & (fields["purpose"] == purpose)
+        if format != ANY:
+            condition = condition & (fields["format"] == format)
+        if key == (DEFAULT_TEAM, ANY, ANY):
+            result = rendered
+        else:
+            result = rx.cond(condition, rendered, result)
+    return result.to(str)
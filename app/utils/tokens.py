@@ -0,0 +1,328 @@
+"""Token counts and cost and latency estimates for prompts.
+
+Counts use ``tiktoken`` when it is installed. It is optional and not in
+requirements.txt: without it (or when the vocabulary cannot be downloaded)
+a built-in estimator splits text the way the GPT tokenizers pre-tokenize
+it and counts common-length words as one token, which comes close to the
+real counts on English prose. Each encoding's vocabulary is loaded once per
+process; the app loads them at startup in a worker thread
+(``encoder_lifespan``), so a download never blocks an event.
+
+Texts are counted paragraph by paragraph, and the count of each paragraph
+is cached by its text, so after an edit only the changed paragraphs are
+counted again. Large bodies in the blob store are counted chunk by chunk
+and cached by reference; reading them is disk I/O, so callers count them
+in a worker thread with ``count_ref_encodings`` and pass the counts to
+``estimate_all``.
+
+Prices and throughput per model come from ``MODEL_PRICES_FILE`` (default
+``model_prices.json``), a JSON list of ``ModelPrice`` objects, or else from
+``DEFAULT_PRICES``; prices are in US dollars per million tokens.
+
+Run ``python -m app.utils.tokens`` for a timing benchmark.
+"""
+
+import asyncio
+import contextlib
+import functools
+import itertools
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+import reflex as rx
+
+from app.utils import large_input, metrics
+
+DEFAULT_ENCODING = "o200k_base"
+DEFAULT_OUTPUT_TOKENS = 500
+TOKENS_PER_WORD = 4 / 3
+MAX_CACHED_PIECE_CHARS = 16_000
+PIECE_CACHE_SIZE = 8192
+# Also bound the cached pieces by their total length.
+PIECE_CACHE_CHARS = 4_000_000
+PIECE_BATCH_SIZE = 1024
+
+# Cut after blank lines; GPT tokenizers do not merge tokens across them.
+PIECE_END = re.compile(r"(?<=\n\n)")
+# An approximation of the GPT-4 pre-tokenizer for the built-in estimator.
+PRETOKEN = re.compile(
+    r"'(?:[sdmt]|ll|ve|re)|[^\r\n\w]?[^\W\d]+|\d{1,3}| ?[^\s\w]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+",
+    re.IGNORECASE,
+)
+WORD_COUNT = re.compile(r"\d[\d,]*")
+
+
+class ModelPrice(rx.Base):
+    """Price and speed of a model, for estimates."""
+
+    model: str
+    encoding: str = DEFAULT_ENCODING
+    input_per_million: float
+    output_per_million: float
+    tokens_per_second: float = 60.0
+    first_token_ms: float = 500.0
+
+
+DEFAULT_PRICES = [
+    ModelPrice(
+        model="gpt-4o-mini",
+        input_per_million=0.15,
+        output_per_million=0.60,
+        tokens_per_second=80,
+        first_token_ms=400,
+    ),
+    ModelPrice(model="gpt-4o", input_per_million=2.50, output_per_million=10.00),
+    ModelPrice(model="gpt-4.1", input_per_million=2.00, output_per_million=8.00),
+    ModelPrice(
+        model="gpt-3.5-turbo",
+        encoding="cl100k_base",
+        input_per_million=0.50,
+        output_per_million=1.50,
+        tokens_per_second=90,
+        first_token_ms=300,
+    ),
+]
+
+
+class TokenEstimate(rx.Base):
+    """What sending a prompt to a model would cost, formatted for display."""
+
+    model: str
+    prompt_tokens: int
+    output_tokens: int
+    cost: str
+    latency: str
+
+
+class CostChange(rx.Base):
+    """How a rewrite changed what sending a prompt to a model costs."""
+
+    model: str
+    before_tokens: int
+    after_tokens: int
+    before_cost: str
+    after_cost: str
+    change: str
+
+
+@functools.lru_cache(maxsize=None)
+def load_prices() -> tuple[ModelPrice, ...]:
+    """Read the price table once per process."""
+    path = os.environ.get("MODEL_PRICES_FILE", "model_prices.json")
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                return tuple(ModelPrice.parse_obj(entry) for entry in json.load(f))
+        except Exception as e:
+            logging.exception(f"Invalid price table {path}, using the defaults: {e}")
+    return tuple(DEFAULT_PRICES)
+
+
+def _estimate_pretoken(token: str) -> int:
+    text = token.strip()
+    if not text:
+        return 1
+    if not text.isascii():
+        # Non-Latin scripts take about a token per character.
+        return max(1, len(token.encode()) // 3)
+    if text[0].isalpha() or text[0] == "_":
+        return 1 + (len(text) - 1) // 7
+    if text[0].isdigit():
+        return 1
+    return (len(text) + 1) // 2
+
+
+def _estimate(text: str) -> int:
+    return sum(_estimate_pretoken(token) for token in PRETOKEN.findall(text))
+
+
+@functools.lru_cache(maxsize=None)
+def _encoder(encoding: str) -> Callable[[str], int]:
+    """Get a counting function, loading the encoding's vocabulary once."""
+    try:
+        import tiktoken
+
+        encode = tiktoken.get_encoding(encoding).encode_ordinary
+        return lambda text: len(encode(text))
+    except Exception as e:
+        logging.info(f"Estimating {encoding} token counts without tiktoken: {e!r}")
+        return _estimate
+
+
+def load_encoders():
+    """Load the vocabulary of every encoding in use, downloading it if needed."""
+    for encoding in {DEFAULT_ENCODING, *(price.encoding for price in load_prices())}:
+        _encoder(encoding)
+
+
+@contextlib.asynccontextmanager
+async def encoder_lifespan():
+    """App lifespan task that loads the encoders before the app serves events."""
+    await asyncio.to_thread(load_encoders)
+    yield
+
+
+_pieces: OrderedDict[tuple[str, str], int] = OrderedDict()
+_pieces_chars = 0
+_pieces_lock = threading.Lock()
+
+
+def _count_batch(pieces: list[str], encoding: str) -> int:
+    global _pieces_chars
+    encoder = _encoder(encoding)
+    total = 0
+    # Look up the whole batch under one lock, and count the misses outside it.
+    missed: dict[str, int] = {}
+    large = []
+    with _pieces_lock:
+        for piece in pieces:
+            if len(piece) > MAX_CACHED_PIECE_CHARS:
+                large.append(piece)
+                continue
+            key = (encoding, piece)
+            count = _pieces.get(key)
+            if count is None:
+                missed[piece] = missed.get(piece, 0) + 1
+            else:
+                _pieces.move_to_end(key)
+                total += count
+    total += sum(encoder(piece) for piece in large)
+    counted = {piece: encoder(piece) for piece in missed}
+    total += sum(count * missed[piece] for piece, count in counted.items())
+    if counted:
+        with _pieces_lock:
+            for piece, count in counted.items():
+                key = (encoding, piece)
+                if key not in _pieces:
+                    _pieces_chars += len(piece)
+                _pieces[key] = count
+            while len(_pieces) > PIECE_CACHE_SIZE or _pieces_chars > PIECE_CACHE_CHARS:
+                _pieces_chars -= len(_pieces.popitem(last=False)[0][1])
+    return total
+
+
+def _count_pieces(pieces: Iterable[str], encoding: str) -> int:
+    # Batches keep blob store reads out of the lock.
+    pieces = iter(pieces)
+    total = 0
+    while batch := list(itertools.islice(pieces, PIECE_BATCH_SIZE)):
+        total += _count_batch(batch, encoding)
+    return total
+
+
+def count_tokens(text: str, encoding: str = DEFAULT_ENCODING) -> int:
+    """Count the tokens of a text, reusing the counts of unchanged paragraphs."""
+    if not text:
+        return 0
+    metrics.record("tokens", counts=1, chars=len(text))
+    return _count_pieces(PIECE_END.split(text), encoding)
+
+
+@functools.lru_cache(maxsize=64)
+def count_ref(ref: str, encoding: str = DEFAULT_ENCODING) -> int:
+    """Count the tokens of a body in the blob store, chunk by chunk."""
+    return _count_pieces(large_input.paragraphs(large_input.chunks(ref)), encoding)
+
+
+def expected_output_tokens(length: str) -> int:
+    """Turn a length label like "Medium (100-300 words)" into output tokens."""
+    words = [int(n.replace(",", "")) for n in WORD_COUNT.findall(length)]
+    if not words:
+        return DEFAULT_OUTPUT_TOKENS
+    return math.ceil(max(words) * TOKENS_PER_WORD)
+
+
+def estimate(price: ModelPrice, prompt_tokens: int, output_tokens: int) -> TokenEstimate:
+    """Estimate the cost and latency of one call."""
+    dollars = (
+        prompt_tokens * price.input_per_million + output_tokens * price.output_per_million
+    ) / 1_000_000
+    seconds = price.first_token_ms / 1000 + output_tokens / price.tokens_per_second
+    return TokenEstimate(
+        model=price.model,
+        prompt_tokens=prompt_tokens,
+        output_tokens=output_tokens,
+        cost=format_cost(dollars),
+        latency=f"{seconds:.1f} s",
+    )
+
+
+def format_cost(dollars: float) -> str:
+    """Format the cost of one call as the cost of a thousand calls."""
+    return f"${dollars * 1000:,.2f} / 1k calls"
+
+
+def count_ref_encodings(ref: str) -> dict[str, int]:
+    """Count a body in the blob store in every encoding of the price table."""
+    return {price.encoding: count_ref(ref, price.encoding) for price in load_prices()}
+
+
+def estimate_all(
+    text: str, output_tokens: int, counts: Optional[dict[str, int]] = None
+) -> list[TokenEstimate]:
+    """Estimate a prompt's cost on every model in the price table.
+
+    ``counts`` are token counts by encoding that were already made, such as
+    those of a large body from ``count_ref_encodings``.
+    """
+    counts = dict(counts or {})
+    estimates = []
+    for price in load_prices():
+        if price.encoding not in counts:
+            counts[price.encoding] = count_tokens(text, price.encoding)
+        estimates.append(estimate(price, counts[price.encoding], output_tokens))
+    return estimates
+
+
+def compare_estimates(
+    before: list[TokenEstimate], after: list[TokenEstimate]
+) -> list[CostChange]:
+    """Pair up the estimates of a prompt before and after a rewrite, by model."""
+    changes = []
+    for old, new in zip(before, after):
+        change = ""
+        if old.prompt_tokens and new.prompt_tokens:
+            change = f"{(new.prompt_tokens - old.prompt_tokens) / old.prompt_tokens:+.0%}"
+        changes.append(
+            CostChange(
+                model=old.model,
+                before_tokens=old.prompt_tokens,
+                after_tokens=new.prompt_tokens,
+                before_cost=old.cost,
+                after_cost=new.cost,
+                change=change,
+            )
+        )
+    return changes
+
+
+if __name__ == "__main__":
+    from app.utils.templates import DEFAULT_TEMPLATE
+
+    print(f"counting with {_encoder(DEFAULT_ENCODING)!r}")
+    block = DEFAULT_TEMPLATE + "\n\nMaybe add some relevant stuff, etc. Item %d.\n\n"
+    for size in (10_000, 100_000, 1_000_000):
+        text = "".join(block % i for i in range(size // len(block) + 1))[:size]
+        with _pieces_lock:
+            _pieces.clear()
+            _pieces_chars = 0
+        start = time.perf_counter()
+        tokens = count_tokens(text)
+        full_ms = (time.perf_counter() - start) * 1000
+        middle = text.index("\n\n", len(text) // 2)
+        runs = 20
+        start = time.perf_counter()
+        for i in range(runs):
+            count_tokens(text[:middle] + " very" * (i + 1) + text[middle:])
+        edit_ms = (time.perf_counter() - start) / runs * 1000
+        print(
+            f"{size:>8} chars: {tokens} tokens ({size / tokens:.2f} chars/token), "
+            f"full count {full_ms:.1f} ms, after a one-word edit {edit_ms:.2f} ms"
+        )